@@ -1,3 +1,4 @@
+-- Prefer `python3 main.py --rollback X` in etl/: it deletes in batches using the load_id indexes.
 DELETE FROM data.asn WHERE load_id = X;
 DELETE FROM data.country_stat WHERE load_id = X;
 DELETE FROM data.asn_neighbour WHERE load_id = X;
@@ -5,3 +6,5 @@ DELETE FROM data.country_traffic WHERE load_id = X;
 DELETE FROM data.country_internet_quality WHERE load_id = X;
 DELETE FROM data.etl_load WHERE load_id = X;
 
+-- Whole months of data.asn and data.asn_neighbour are faster removed by dropping their partition:
+DROP TABLE data.asn_neighbour_yYYYYmMM;
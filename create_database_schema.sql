@@ -110,6 +110,258 @@ $$;
 
 ALTER FUNCTION data.set_timestamps() OWNER TO ozi;
 
+--
+-- Name: create_month_partition(regclass, date); Type: FUNCTION; Schema: data; Owner: ozi
+--
+
+CREATE FUNCTION data.create_month_partition(parent regclass, month date) RETURNS boolean
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path = pg_catalog, pg_temp
+    AS $$
+DECLARE
+    first_day date := date_trunc('month', month)::date;
+    parent_schema name;
+    parent_name name;
+    partition_name text;
+BEGIN
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+      FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+     WHERE c.oid = parent;
+    partition_name := format('%I.%I', parent_schema, parent_name || to_char(first_day, '"_y"YYYY"m"MM'));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, first_day, (first_day + interval '1 month')::date
+    );
+    RETURN true;
+EXCEPTION WHEN duplicate_table THEN
+    -- Another loader created it first
+    RETURN false;
+END;
+$$;
+
+
+ALTER FUNCTION data.create_month_partition(parent regclass, month date) OWNER TO ozi;
+
+--
+-- Name: refresh_connectivity_index(timestamp without time zone[], character varying[]); Type: FUNCTION; Schema: data; Owner: ozi
+--
+
+CREATE FUNCTION data.refresh_connectivity_index(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, date) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || d::text) FROM unnest(countries) AS c, unnest(dates) AS d ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_connectivity_index'), lock_key);
+    END LOOP;
+
+    DELETE FROM data.connectivity_index_by_asn WHERE an_date = ANY (dates) AND asn_country = ANY (countries);
+    -- An ASN that moved here from a country not refreshed now still has its row under the old country
+    INSERT INTO data.connectivity_index_by_asn (
+        an_asn, an_date, asn_country, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share, rn
+    )
+    SELECT an_asn,
+        an_date,
+        asn_country,
+        foreign_neighbour_count,
+        local_neighbour_count,
+        total_neighbour_count,
+        foreign_neighbours_share,
+        row_number() OVER (PARTITION BY asn_country, an_date ORDER BY total_neighbour_count DESC)
+      FROM data.v_connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+    ON CONFLICT (an_date, an_asn) DO UPDATE
+       SET asn_country = EXCLUDED.asn_country,
+           foreign_neighbour_count = EXCLUDED.foreign_neighbour_count,
+           local_neighbour_count = EXCLUDED.local_neighbour_count,
+           total_neighbour_count = EXCLUDED.total_neighbour_count,
+           foreign_neighbours_share = EXCLUDED.foreign_neighbours_share,
+           rn = EXCLUDED.rn;
+
+    -- Country totals are added up from the ASN rows instead of scanning the neighbours again
+    DELETE FROM data.connectivity_index_by_country WHERE date = ANY (dates) AND asn_country = ANY (countries);
+    INSERT INTO data.connectivity_index_by_country (
+        asn_country, date, asn_count, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share
+    )
+    SELECT asn_country,
+        an_date,
+        count(*),
+        sum(foreign_neighbour_count),
+        sum(local_neighbour_count),
+        sum(total_neighbour_count),
+        (sum(foreign_neighbour_count))::double precision / (sum(total_neighbour_count))::double precision
+      FROM data.connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+     GROUP BY asn_country, an_date;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+
+ALTER FUNCTION data.refresh_connectivity_index(dates timestamp without time zone[], countries character varying[]) OWNER TO ozi;
+
+--
+-- Name: refresh_country_internet_quality_rollups(timestamp without time zone[], character varying[]); Type: FUNCTION; Schema: data; Owner: ozi
+--
+
+CREATE FUNCTION data.refresh_country_internet_quality_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_internet_quality_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_internet_quality_rollup WHERE cir_period = rollup_period AND cir_date = ANY (starts)
+           AND cir_country_iso2 = ANY (countries);
+        INSERT INTO data.country_internet_quality_rollup (
+            cir_period, cir_country_iso2, cir_date, cir_samples, cir_p75, cir_p50, cir_p25
+        )
+        SELECT rollup_period,
+            ci_country_iso2,
+            p.start,
+            count(*),
+            avg(ci_p75),
+            avg(ci_p50),
+            avg(ci_p25)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_internet_quality
+            ON ci_date >= p.start AND ci_date < p.start + ('1 ' || rollup_period)::interval
+         WHERE ci_country_iso2 = ANY (countries)
+         GROUP BY ci_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+
+ALTER FUNCTION data.refresh_country_internet_quality_rollups(dates timestamp without time zone[], countries character varying[]) OWNER TO ozi;
+
+--
+-- Name: refresh_country_stat_rollups(timestamp without time zone[], character varying[]); Type: FUNCTION; Schema: data; Owner: ozi
+--
+
+CREATE FUNCTION data.refresh_country_stat_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_stat_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_stat_rollup WHERE csr_period = rollup_period AND csr_date = ANY (starts)
+           AND csr_country_iso2 = ANY (countries);
+        INSERT INTO data.country_stat_rollup (
+            csr_period, csr_country_iso2, csr_date, csr_days,
+            csr_v4_prefixes_ris, csr_v6_prefixes_ris, csr_asns_ris, csr_v4_prefixes_stats, csr_v6_prefixes_stats, csr_asns_stats
+        )
+        SELECT rollup_period,
+            cs_country_iso2,
+            p.start,
+            count(*),
+            avg(cs_v4_prefixes_ris),
+            avg(cs_v6_prefixes_ris),
+            avg(cs_asns_ris),
+            avg(cs_v4_prefixes_stats),
+            avg(cs_v6_prefixes_stats),
+            avg(cs_asns_stats)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_stat
+            ON cs_stats_timestamp >= p.start AND cs_stats_timestamp < p.start + ('1 ' || rollup_period)::interval
+         WHERE cs_stats_resolution = '1d' AND cs_country_iso2 = ANY (countries)
+         GROUP BY cs_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+
+ALTER FUNCTION data.refresh_country_stat_rollups(dates timestamp without time zone[], countries character varying[]) OWNER TO ozi;
+
+--
+-- Name: refresh_country_traffic_rollups(timestamp without time zone[], character varying[]); Type: FUNCTION; Schema: data; Owner: ozi
+--
+
+CREATE FUNCTION data.refresh_country_traffic_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_traffic_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_traffic_rollup WHERE crr_period = rollup_period AND crr_date = ANY (starts)
+           AND crr_country_iso2 = ANY (countries);
+        INSERT INTO data.country_traffic_rollup (
+            crr_period, crr_country_iso2, crr_date, crr_samples,
+            crr_traffic_avg, crr_traffic_min, crr_traffic_max
+        )
+        SELECT rollup_period,
+            cr_country_iso2,
+            p.start,
+            count(*),
+            avg(cr_traffic),
+            min(cr_traffic),
+            max(cr_traffic)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_traffic
+            ON cr_date >= p.start AND cr_date < p.start + ('1 ' || rollup_period)::interval
+         WHERE cr_country_iso2 = ANY (countries)
+         GROUP BY cr_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+
+ALTER FUNCTION data.refresh_country_traffic_rollups(dates timestamp without time zone[], countries character varying[]) OWNER TO ozi;
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
@@ -127,7 +379,8 @@ CREATE TABLE data.asn (
     a_ripe_id integer NOT NULL,
     a_is_routed boolean NOT NULL,
     load_id integer
-);
+)
+PARTITION BY RANGE (a_date);
 
 
 ALTER TABLE data.asn OWNER TO ozi;
@@ -154,6 +407,20 @@ ALTER SEQUENCE data.asn_a_id_seq OWNER TO ozi;
 ALTER SEQUENCE data.asn_a_id_seq OWNED BY data.asn.a_id;
 
 
+--
+-- Name: asn_current; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.asn_current (
+    ac_asn integer NOT NULL,
+    ac_country_id smallint NOT NULL,
+    ac_date timestamp without time zone NOT NULL
+);
+
+
+ALTER TABLE data.asn_current OWNER TO ozi;
+
+
 --
 -- Name: asn_neighbour; Type: TABLE; Schema: data; Owner: ozi
 --
@@ -170,7 +437,8 @@ CREATE TABLE data.asn_neighbour (
     an_v4_peers integer,
     an_v6_peers integer,
     load_id integer
-);
+)
+PARTITION BY RANGE (an_date);
 
 
 ALTER TABLE data.asn_neighbour OWNER TO ozi;
@@ -276,6 +544,23 @@ ALTER SEQUENCE data.country_internet_quality_ci_id_seq OWNER TO ozi;
 ALTER SEQUENCE data.country_internet_quality_ci_id_seq OWNED BY data.country_internet_quality.ci_id;
 
 
+--
+-- Name: country_internet_quality_rollup; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.country_internet_quality_rollup (
+    cir_period character varying(5) NOT NULL,
+    cir_country_iso2 character varying(2) NOT NULL,
+    cir_date timestamp without time zone NOT NULL,
+    cir_samples integer NOT NULL,
+    cir_p75 numeric,
+    cir_p50 numeric,
+    cir_p25 numeric
+);
+
+
+ALTER TABLE data.country_internet_quality_rollup OWNER TO ozi;
+
 --
 -- Name: country_stat; Type: TABLE; Schema: data; Owner: ozi
 --
@@ -321,6 +606,26 @@ ALTER SEQUENCE data.country_stat_cs_id_seq OWNER TO ozi;
 ALTER SEQUENCE data.country_stat_cs_id_seq OWNED BY data.country_stat.cs_id;
 
 
+--
+-- Name: country_stat_rollup; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.country_stat_rollup (
+    csr_period character varying(5) NOT NULL,
+    csr_country_iso2 character varying(2) NOT NULL,
+    csr_date timestamp without time zone NOT NULL,
+    csr_days integer NOT NULL,
+    csr_v4_prefixes_ris numeric,
+    csr_v6_prefixes_ris numeric,
+    csr_asns_ris numeric,
+    csr_v4_prefixes_stats numeric,
+    csr_v6_prefixes_stats numeric,
+    csr_asns_stats numeric
+);
+
+
+ALTER TABLE data.country_stat_rollup OWNER TO ozi;
+
 --
 -- Name: country_tag; Type: TABLE; Schema: data; Owner: ozi
 --
@@ -374,6 +679,23 @@ ALTER SEQUENCE data.country_traffic_cr_id_seq OWNER TO ozi;
 ALTER SEQUENCE data.country_traffic_cr_id_seq OWNED BY data.country_traffic.cr_id;
 
 
+--
+-- Name: country_traffic_rollup; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.country_traffic_rollup (
+    crr_period character varying(5) NOT NULL,
+    crr_country_iso2 character varying(2) NOT NULL,
+    crr_date timestamp without time zone NOT NULL,
+    crr_samples integer NOT NULL,
+    crr_traffic_avg numeric,
+    crr_traffic_min numeric,
+    crr_traffic_max numeric
+);
+
+
+ALTER TABLE data.country_traffic_rollup OWNER TO ozi;
+
 --
 -- Name: etl_load; Type: TABLE; Schema: data; Owner: ozi
 --
@@ -384,12 +706,27 @@ CREATE TABLE data.etl_load (
     finish_time timestamp without time zone,
     command text NOT NULL,
     status character varying(20),
+    row_counts jsonb,
     CONSTRAINT etl_load_status_check CHECK (((status)::text = ANY (ARRAY[('running'::character varying)::text, ('completed'::character varying)::text, ('failed'::character varying)::text])))
 );
 
 
 ALTER TABLE data.etl_load OWNER TO ozi;
 
+--
+-- Name: etl_load_date; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.etl_load_date (
+    ld_task character varying(32) NOT NULL,
+    ld_country_iso2 character varying(2) NOT NULL,
+    ld_date timestamp without time zone NOT NULL,
+    load_id integer
+);
+
+
+ALTER TABLE data.etl_load_date OWNER TO ozi;
+
 --
 -- Name: etl_load_load_id_seq; Type: SEQUENCE; Schema: data; Owner: ozi
 --
@@ -431,29 +768,15 @@ ALTER VIEW data.v_asn_count OWNER TO ozi;
 --
 
 CREATE VIEW data.v_current_asn AS
- SELECT DISTINCT ON (a_ripe_id) a_ripe_id AS asn_id,
-    a_date AS last_updated,
-    a_country_iso2 AS asn_country
-   FROM data.asn
-  ORDER BY a_ripe_id, a_date DESC;
+ SELECT ac.ac_asn AS asn_id,
+    ac.ac_date AS last_updated,
+    country.c_iso2 AS asn_country
+   FROM (data.asn_current ac
+     JOIN data.country ON ((country.c_id = ac.ac_country_id)));
 
 
 ALTER VIEW data.v_current_asn OWNER TO ozi;
 
---
--- Name: vm_current_asn; Type: MATERIALIZED VIEW; Schema: data; Owner: ozi
---
-
-CREATE MATERIALIZED VIEW data.vm_current_asn AS
- SELECT asn_id,
-    last_updated,
-    asn_country
-   FROM data.v_current_asn
-  WITH NO DATA;
-
-
-ALTER MATERIALIZED VIEW data.vm_current_asn OWNER TO ozi;
-
 --
 -- Name: v_asn_neighbour; Type: VIEW; Schema: data; Owner: ozi
 --
@@ -461,20 +784,22 @@ ALTER MATERIALIZED VIEW data.vm_current_asn OWNER TO ozi;
 CREATE VIEW data.v_asn_neighbour AS
  SELECT n.an_date,
     n.an_asn,
-    a1.asn_country,
+    c1.c_iso2 AS asn_country,
     n.an_neighbour,
-    COALESCE(a2.asn_country, 'UNKNOWN'::character varying) AS neighbour_country,
+    COALESCE(c2.c_iso2, 'UNKNOWN'::character varying) AS neighbour_country,
         CASE
-            WHEN ((a1.asn_country)::text <> (COALESCE(a2.asn_country, 'UNKNOWN'::character varying))::text) THEN true
+            WHEN ((c1.c_iso2)::text <> (COALESCE(c2.c_iso2, 'UNKNOWN'::character varying))::text) THEN true
             ELSE false
         END AS is_foreign_neighbour,
     n.an_type,
     n.an_power,
     n.an_v4_peers,
     n.an_v6_peers
-   FROM ((data.asn_neighbour n
-     LEFT JOIN data.vm_current_asn a1 ON ((a1.asn_id = n.an_asn)))
-     LEFT JOIN data.vm_current_asn a2 ON ((a2.asn_id = n.an_neighbour)))
+   FROM ((((data.asn_neighbour n
+     LEFT JOIN data.asn_current a1 ON ((a1.ac_asn = n.an_asn)))
+     LEFT JOIN data.country c1 ON ((c1.c_id = a1.ac_country_id)))
+     LEFT JOIN data.asn_current a2 ON ((a2.ac_asn = n.an_neighbour)))
+     LEFT JOIN data.country c2 ON ((c2.c_id = a2.ac_country_id)))
   WHERE ((n.an_type)::text = ANY (ARRAY[('left'::character varying)::text, ('right'::character varying)::text]));
 
 
@@ -486,19 +811,18 @@ ALTER VIEW data.v_asn_neighbour OWNER TO ozi;
 
 CREATE VIEW data.v_asn_with_neighbours AS
  WITH asn_with_neighbours AS (
-         SELECT asn.a_id,
-            asn.a_date,
+         SELECT asn.a_date,
             asn.a_country_iso2,
             (EXISTS ( SELECT 1
                    FROM data.asn_neighbour
-                  WHERE ((asn_neighbour.an_asn = asn.a_id) AND (asn_neighbour.an_date = asn.a_date)))) AS has_neighbours
+                  WHERE ((asn_neighbour.an_asn = asn.a_ripe_id) AND (asn_neighbour.an_date = asn.a_date)))) AS has_neighbours
            FROM data.asn
         )
  SELECT a_country_iso2,
     a_date,
     count(*) AS total_asns,
-    count(has_neighbours) AS asns_with_neighbours,
-    ((count(has_neighbours))::double precision / (count(*))::double precision) AS share_asns_with_neighbours
+    count(*) FILTER (WHERE has_neighbours) AS asns_with_neighbours,
+    ((count(*) FILTER (WHERE has_neighbours))::double precision / (count(*))::double precision) AS share_asns_with_neighbours
    FROM asn_with_neighbours
   GROUP BY a_country_iso2, a_date;
 
@@ -649,30 +973,36 @@ ALTER VIEW data.v_country_stat_5m OWNER TO ozi;
 --
 
 CREATE VIEW data.v_country_stat_last AS
- WITH last_dates AS (
-         SELECT country_stat_1.cs_country_iso2 AS country,
-            max(country_stat_1.cs_stats_timestamp) AS last_date
-           FROM data.country_stat country_stat_1
-          WHERE ((country_stat_1.cs_stats_resolution)::text = '1d'::text)
-          GROUP BY country_stat_1.cs_country_iso2
-        )
  SELECT country.c_name,
-    country_stat.created,
-    country_stat.updated,
-    country_stat.cs_id,
-    country_stat.cs_country_iso2,
-    country_stat.cs_stats_timestamp,
-    country_stat.cs_stats_resolution,
-    country_stat.cs_v4_prefixes_ris,
-    country_stat.cs_v6_prefixes_ris,
-    country_stat.cs_asns_ris,
-    country_stat.cs_v4_prefixes_stats,
-    country_stat.cs_v6_prefixes_stats,
-    country_stat.cs_asns_stats
-   FROM ((data.country_stat
-     JOIN last_dates ON (((last_dates.last_date = country_stat.cs_stats_timestamp) AND ((last_dates.country)::text = (country_stat.cs_country_iso2)::text))))
-     JOIN data.country ON (((country.c_iso2)::text = (country_stat.cs_country_iso2)::text)))
-  WHERE ((country_stat.cs_stats_resolution)::text = '1d'::text);
+    last_stat.created,
+    last_stat.updated,
+    last_stat.cs_id,
+    last_stat.cs_country_iso2,
+    last_stat.cs_stats_timestamp,
+    last_stat.cs_stats_resolution,
+    last_stat.cs_v4_prefixes_ris,
+    last_stat.cs_v6_prefixes_ris,
+    last_stat.cs_asns_ris,
+    last_stat.cs_v4_prefixes_stats,
+    last_stat.cs_v6_prefixes_stats,
+    last_stat.cs_asns_stats
+   FROM (data.country
+     CROSS JOIN LATERAL ( SELECT country_stat.created,
+            country_stat.updated,
+            country_stat.cs_id,
+            country_stat.cs_country_iso2,
+            country_stat.cs_stats_timestamp,
+            country_stat.cs_stats_resolution,
+            country_stat.cs_v4_prefixes_ris,
+            country_stat.cs_v6_prefixes_ris,
+            country_stat.cs_asns_ris,
+            country_stat.cs_v4_prefixes_stats,
+            country_stat.cs_v6_prefixes_stats,
+            country_stat.cs_asns_stats
+           FROM data.country_stat
+          WHERE (((country_stat.cs_country_iso2)::text = (country.c_iso2)::text) AND ((country_stat.cs_stats_resolution)::text = '1d'::text))
+          ORDER BY country_stat.cs_stats_timestamp DESC
+         LIMIT 1) last_stat);
 
 
 ALTER VIEW data.v_country_stat_last OWNER TO ozi;
@@ -682,7 +1012,7 @@ ALTER VIEW data.v_country_stat_last OWNER TO ozi;
 --
 
 CREATE VIEW data.v_data_overview AS
- WITH date_range AS (
+ WITH RECURSIVE date_range AS (
          SELECT date_trunc('day'::text, min(asn.a_date)) AS start_date,
             date_trunc('day'::text, max(asn.a_date)) AS end_date
            FROM data.asn
@@ -690,56 +1020,35 @@ CREATE VIEW data.v_data_overview AS
          SELECT generate_series(date_range.start_date, date_range.end_date, '1 day'::interval) AS date
            FROM date_range
         ), countries AS (
-         SELECT DISTINCT asn.a_country_iso2 AS country_iso2
+         SELECT min((asn.a_country_iso2)::text) AS country_iso2
            FROM data.asn
+        UNION ALL
+         SELECT ( SELECT min((asn.a_country_iso2)::text) AS min
+                   FROM data.asn
+                  WHERE ((asn.a_country_iso2)::text > countries_1.country_iso2)) AS country_iso2
+           FROM countries countries_1
+          WHERE (countries_1.country_iso2 IS NOT NULL)
         )
  SELECT d.date,
-    c.country_iso2,
-        CASE
-            WHEN (a.cnt > 0) THEN true
-            ELSE false
-        END AS has_asn_records,
-        CASE
-            WHEN (n.cnt > 0) THEN true
-            ELSE false
-        END AS has_neighbour_records,
-        CASE
-            WHEN (q.cnt > 0) THEN true
-            ELSE false
-        END AS has_quality_records,
-        CASE
-            WHEN (cs.cnt > 0) THEN true
-            ELSE false
-        END AS has_country_stat_records,
-        CASE
-            WHEN (ct.cnt > 0) THEN true
-            ELSE false
-        END AS has_country_traffic_records
-   FROM ((((((dates d
-     CROSS JOIN countries c)
-     LEFT JOIN ( SELECT asn.a_date,
-            count(*) AS cnt
+    (c.country_iso2)::character varying(2) AS country_iso2,
+    (EXISTS ( SELECT 1
            FROM data.asn
-          GROUP BY asn.a_date) a ON ((d.date = a.a_date)))
-     LEFT JOIN ( SELECT asn_neighbour.an_date,
-            count(*) AS cnt
+          WHERE (((asn.a_country_iso2)::text = c.country_iso2) AND (asn.a_date = d.date)))) AS has_asn_records,
+    (EXISTS ( SELECT 1
            FROM data.asn_neighbour
-          GROUP BY asn_neighbour.an_date) n ON ((d.date = n.an_date)))
-     LEFT JOIN ( SELECT country_internet_quality.ci_date,
-            country_internet_quality.ci_country_iso2,
-            count(*) AS cnt
+          WHERE (asn_neighbour.an_date = d.date))) AS has_neighbour_records,
+    (EXISTS ( SELECT 1
            FROM data.country_internet_quality
-          GROUP BY country_internet_quality.ci_date, country_internet_quality.ci_country_iso2) q ON (((d.date = q.ci_date) AND ((c.country_iso2)::text = (q.ci_country_iso2)::text))))
-     LEFT JOIN ( SELECT (country_stat.cs_stats_timestamp)::date AS cs_stats_timestamp,
-            country_stat.cs_country_iso2,
-            count(*) AS cnt
+          WHERE (((country_internet_quality.ci_country_iso2)::text = c.country_iso2) AND (country_internet_quality.ci_date = d.date)))) AS has_quality_records,
+    (EXISTS ( SELECT 1
            FROM data.country_stat
-          GROUP BY ((country_stat.cs_stats_timestamp)::date), country_stat.cs_country_iso2) cs ON (((d.date = cs.cs_stats_timestamp) AND ((c.country_iso2)::text = (cs.cs_country_iso2)::text))))
-     LEFT JOIN ( SELECT country_traffic.cr_date,
-            country_traffic.cr_country_iso2,
-            count(*) AS cnt
+          WHERE (((country_stat.cs_country_iso2)::text = c.country_iso2) AND (country_stat.cs_stats_timestamp >= d.date) AND (country_stat.cs_stats_timestamp < (d.date + '1 day'::interval))))) AS has_country_stat_records,
+    (EXISTS ( SELECT 1
            FROM data.country_traffic
-          GROUP BY country_traffic.cr_date, country_traffic.cr_country_iso2) ct ON (((d.date = ct.cr_date) AND ((c.country_iso2)::text = (ct.cr_country_iso2)::text))))
+          WHERE (((country_traffic.cr_country_iso2)::text = c.country_iso2) AND (country_traffic.cr_date = d.date)))) AS has_country_traffic_records
+   FROM (dates d
+     CROSS JOIN countries c)
+  WHERE (c.country_iso2 IS NOT NULL)
   ORDER BY d.date, c.country_iso2;
 
 
@@ -781,10 +1090,45 @@ CREATE MATERIALIZED VIEW data.vm_asn_neighbour AS
 ALTER MATERIALIZED VIEW data.vm_asn_neighbour OWNER TO ozi;
 
 --
--- Name: vm_connectivity_index_by_asn_top10; Type: MATERIALIZED VIEW; Schema: data; Owner: ozi
+-- Name: connectivity_index_by_asn; Type: TABLE; Schema: data; Owner: ozi
 --
 
-CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10 AS
+CREATE TABLE data.connectivity_index_by_asn (
+    an_asn bigint NOT NULL,
+    an_date timestamp without time zone NOT NULL,
+    asn_country character varying(2) NOT NULL,
+    foreign_neighbour_count bigint NOT NULL,
+    local_neighbour_count bigint NOT NULL,
+    total_neighbour_count bigint NOT NULL,
+    foreign_neighbours_share double precision NOT NULL,
+    rn bigint NOT NULL
+);
+
+
+ALTER TABLE data.connectivity_index_by_asn OWNER TO ozi;
+
+--
+-- Name: connectivity_index_by_country; Type: TABLE; Schema: data; Owner: ozi
+--
+
+CREATE TABLE data.connectivity_index_by_country (
+    asn_country character varying(2) NOT NULL,
+    date timestamp without time zone NOT NULL,
+    asn_count bigint NOT NULL,
+    foreign_neighbour_count bigint NOT NULL,
+    local_neighbour_count bigint NOT NULL,
+    total_neighbour_count bigint NOT NULL,
+    foreign_neighbours_share double precision NOT NULL
+);
+
+
+ALTER TABLE data.connectivity_index_by_country OWNER TO ozi;
+
+--
+-- Name: vm_connectivity_index_by_asn_top10; Type: VIEW; Schema: data; Owner: ozi
+--
+
+CREATE VIEW data.vm_connectivity_index_by_asn_top10 AS
  SELECT an_asn,
     an_date,
     asn_country,
@@ -793,17 +1137,17 @@ CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10 AS
     total_neighbour_count,
     foreign_neighbours_share,
     rn
-   FROM data.v_connectivity_index_by_asn_top10
-  WITH NO DATA;
+   FROM data.connectivity_index_by_asn
+  WHERE (rn <= 10);
 
 
-ALTER MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10 OWNER TO ozi;
+ALTER VIEW data.vm_connectivity_index_by_asn_top10 OWNER TO ozi;
 
 --
--- Name: vm_connectivity_index_by_country; Type: MATERIALIZED VIEW; Schema: data; Owner: ozi
+-- Name: vm_connectivity_index_by_country; Type: VIEW; Schema: data; Owner: ozi
 --
 
-CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_country AS
+CREATE VIEW data.vm_connectivity_index_by_country AS
  SELECT asn_country,
     date,
     asn_count,
@@ -811,11 +1155,10 @@ CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_country AS
     local_neighbour_count,
     total_neighbour_count,
     foreign_neighbours_share
-   FROM data.v_connectivity_index_by_country
-  WITH NO DATA;
+   FROM data.connectivity_index_by_country;
 
 
-ALTER MATERIALIZED VIEW data.vm_connectivity_index_by_country OWNER TO ozi;
+ALTER VIEW data.vm_connectivity_index_by_country OWNER TO ozi;
 
 --
 -- Name: api_response; Type: TABLE; Schema: source; Owner: ozi
@@ -859,14 +1202,14 @@ ALTER SEQUENCE source.api_response_ar_id_seq OWNED BY source.api_response.ar_id;
 -- Name: asn a_id; Type: DEFAULT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn ALTER COLUMN a_id SET DEFAULT nextval('data.asn_a_id_seq'::regclass);
+ALTER TABLE data.asn ALTER COLUMN a_id SET DEFAULT nextval('data.asn_a_id_seq'::regclass);
 
 
 --
 -- Name: asn_neighbour an_id; Type: DEFAULT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn_neighbour ALTER COLUMN "an_id" SET DEFAULT nextval('data."asn_neighbour_an_id_seq"'::regclass);
+ALTER TABLE data.asn_neighbour ALTER COLUMN "an_id" SET DEFAULT nextval('data."asn_neighbour_an_id_seq"'::regclass);
 
 
 --
@@ -915,16 +1258,40 @@ ALTER TABLE ONLY source.api_response ALTER COLUMN ar_id SET DEFAULT nextval('sou
 -- Name: asn_neighbour asn_neighbour_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn_neighbour
-    ADD CONSTRAINT asn_neighbour_pkey PRIMARY KEY ("an_id");
+ALTER TABLE data.asn_neighbour
+    ADD CONSTRAINT asn_neighbour_pkey PRIMARY KEY ("an_id", an_date);
+
+
+--
+-- Name: asn_current asn_current_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.asn_current
+    ADD CONSTRAINT asn_current_pkey PRIMARY KEY (ac_asn);
 
 
 --
 -- Name: asn asn_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn
-    ADD CONSTRAINT asn_pkey PRIMARY KEY (a_id);
+ALTER TABLE data.asn
+    ADD CONSTRAINT asn_pkey PRIMARY KEY (a_id, a_date);
+
+
+--
+-- Name: connectivity_index_by_asn connectivity_index_by_asn_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.connectivity_index_by_asn
+    ADD CONSTRAINT connectivity_index_by_asn_pkey PRIMARY KEY (an_date, an_asn);
+
+
+--
+-- Name: connectivity_index_by_country connectivity_index_by_country_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.connectivity_index_by_country
+    ADD CONSTRAINT connectivity_index_by_country_pkey PRIMARY KEY (asn_country, date);
 
 
 --
@@ -935,6 +1302,14 @@ ALTER TABLE ONLY data.country_internet_quality
     ADD CONSTRAINT country_internet_quality_pkey PRIMARY KEY (ci_id);
 
 
+--
+-- Name: country_internet_quality_rollup country_internet_quality_rollup_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.country_internet_quality_rollup
+    ADD CONSTRAINT country_internet_quality_rollup_pkey PRIMARY KEY (cir_period, cir_country_iso2, cir_date);
+
+
 --
 -- Name: country country_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
 --
@@ -951,6 +1326,14 @@ ALTER TABLE ONLY data.country_stat
     ADD CONSTRAINT country_stat_pkey PRIMARY KEY (cs_id);
 
 
+--
+-- Name: country_stat_rollup country_stat_rollup_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.country_stat_rollup
+    ADD CONSTRAINT country_stat_rollup_pkey PRIMARY KEY (csr_period, csr_country_iso2, csr_date);
+
+
 --
 -- Name: country_tag country_tag_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
 --
@@ -967,6 +1350,14 @@ ALTER TABLE ONLY data.country_traffic
     ADD CONSTRAINT country_traffic_pkey PRIMARY KEY (cr_id);
 
 
+--
+-- Name: country_traffic_rollup country_traffic_rollup_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.country_traffic_rollup
+    ADD CONSTRAINT country_traffic_rollup_pkey PRIMARY KEY (crr_period, crr_country_iso2, crr_date);
+
+
 --
 -- Name: etl_load etl_load_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
 --
@@ -975,6 +1366,14 @@ ALTER TABLE ONLY data.etl_load
     ADD CONSTRAINT etl_load_pkey PRIMARY KEY (load_id);
 
 
+--
+-- Name: etl_load_date etl_load_date_pkey; Type: CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.etl_load_date
+    ADD CONSTRAINT etl_load_date_pkey PRIMARY KEY (ld_task, ld_country_iso2, ld_date);
+
+
 --
 -- Name: api_response api_response_pkey; Type: CONSTRAINT; Schema: source; Owner: ozi
 --
@@ -990,6 +1389,13 @@ ALTER TABLE ONLY source.api_response
 CREATE INDEX idx_asn_country ON data.asn USING btree (a_country_iso2);
 
 
+--
+-- Name: idx_asn_current_country; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_asn_current_country ON data.asn_current USING btree (ac_country_id);
+
+
 --
 -- Name: idx_asn_date; Type: INDEX; Schema: data; Owner: ozi
 --
@@ -997,6 +1403,27 @@ CREATE INDEX idx_asn_country ON data.asn USING btree (a_country_iso2);
 CREATE INDEX idx_asn_date ON data.asn USING btree (a_date);
 
 
+--
+-- Name: idx_asn_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_asn_load_id ON data.asn USING btree (load_id);
+
+
+--
+-- Name: idx_asn_neighbour_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_asn_neighbour_date ON data.asn_neighbour USING btree (an_date);
+
+
+--
+-- Name: idx_asn_neighbour_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_asn_neighbour_load_id ON data.asn_neighbour USING btree (load_id);
+
+
 --
 -- Name: idx_asn_ripe_date; Type: INDEX; Schema: data; Owner: ozi
 --
@@ -1011,6 +1438,118 @@ CREATE INDEX idx_asn_ripe_date ON data.asn USING btree (a_ripe_id, a_date DESC);
 CREATE INDEX idx_asn_ripe_id ON data.asn USING btree (a_ripe_id);
 
 
+--
+-- Name: idx_connectivity_index_by_asn_country_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_connectivity_index_by_asn_country_date ON data.connectivity_index_by_asn USING btree (asn_country, an_date, rn);
+
+
+--
+-- Name: idx_connectivity_index_by_country_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_connectivity_index_by_country_date ON data.connectivity_index_by_country USING btree (date);
+
+
+--
+-- Name: idx_country_internet_quality_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_internet_quality_date ON data.country_internet_quality USING btree (ci_date);
+
+
+--
+-- Name: idx_country_internet_quality_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_internet_quality_load_id ON data.country_internet_quality USING btree (load_id);
+
+
+--
+-- Name: idx_country_stat_country_timestamp; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_stat_country_timestamp ON data.country_stat USING btree (cs_country_iso2, cs_stats_timestamp);
+
+
+--
+-- Name: idx_country_stat_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_stat_load_id ON data.country_stat USING btree (load_id);
+
+
+--
+-- Name: idx_country_stat_timestamp; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_stat_timestamp ON data.country_stat USING btree (cs_stats_timestamp);
+
+
+--
+-- Name: idx_country_traffic_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_traffic_date ON data.country_traffic USING btree (cr_date);
+
+
+--
+-- Name: idx_country_traffic_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_country_traffic_load_id ON data.country_traffic USING btree (load_id);
+
+
+--
+-- Name: idx_etl_load_date_load_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE INDEX idx_etl_load_date_load_id ON data.etl_load_date USING btree (load_id);
+
+
+--
+-- Name: uq_asn_country_date_ripe_id; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_asn_country_date_ripe_id ON data.asn USING btree (a_country_iso2, a_date, a_ripe_id);
+
+
+--
+-- Name: uq_asn_neighbour_asn_date_neighbour; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_asn_neighbour_asn_date_neighbour ON data.asn_neighbour USING btree (an_asn, an_date, an_neighbour);
+
+
+--
+-- Name: uq_country_internet_quality_country_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_country_internet_quality_country_date ON data.country_internet_quality USING btree (ci_country_iso2, ci_date);
+
+
+--
+-- Name: uq_country_iso2; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_country_iso2 ON data.country USING btree (c_iso2);
+
+
+--
+-- Name: uq_country_stat_country_resolution_timestamp; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_country_stat_country_resolution_timestamp ON data.country_stat USING btree (cs_country_iso2, cs_stats_resolution, cs_stats_timestamp);
+
+
+--
+-- Name: uq_country_traffic_country_date; Type: INDEX; Schema: data; Owner: ozi
+--
+
+CREATE UNIQUE INDEX uq_country_traffic_country_date ON data.country_traffic USING btree (cr_country_iso2, cr_date);
+
+
 --
 -- Name: asn trigger_set_timestamps_asn; Type: TRIGGER; Schema: data; Owner: ozi
 --
@@ -1064,15 +1603,23 @@ CREATE TRIGGER trigger_set_timestamps_api_response BEFORE INSERT OR UPDATE ON so
 -- Name: asn asn_load_id_fkey; Type: FK CONSTRAINT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn
+ALTER TABLE data.asn
     ADD CONSTRAINT asn_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id);
 
 
+--
+-- Name: asn_current asn_current_ac_country_id_fkey; Type: FK CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.asn_current
+    ADD CONSTRAINT asn_current_ac_country_id_fkey FOREIGN KEY (ac_country_id) REFERENCES data.country(c_id);
+
+
 --
 -- Name: asn_neighbour asn_neighbour_load_id_fkey; Type: FK CONSTRAINT; Schema: data; Owner: ozi
 --
 
-ALTER TABLE ONLY data.asn_neighbour
+ALTER TABLE data.asn_neighbour
     ADD CONSTRAINT asn_neighbour_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id);
 
 
@@ -1108,6 +1655,14 @@ ALTER TABLE ONLY data.country_traffic
     ADD CONSTRAINT country_traffic_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id);
 
 
+--
+-- Name: etl_load_date etl_load_date_load_id_fkey; Type: FK CONSTRAINT; Schema: data; Owner: ozi
+--
+
+ALTER TABLE ONLY data.etl_load_date
+    ADD CONSTRAINT etl_load_date_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id) ON DELETE CASCADE;
+
+
 --
 -- Name: DATABASE ozi_db2; Type: ACL; Schema: -; Owner: postgres
 --
@@ -1136,6 +1691,13 @@ GRANT USAGE ON SCHEMA public TO ozi;
 GRANT SELECT ON TABLE data.asn TO looker_user;
 
 
+--
+-- Name: TABLE asn_current; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.asn_current TO looker_user;
+
+
 --
 -- Name: SEQUENCE asn_a_id_seq; Type: ACL; Schema: data; Owner: ozi
 --
@@ -1143,6 +1705,20 @@ GRANT SELECT ON TABLE data.asn TO looker_user;
 GRANT SELECT ON SEQUENCE data.asn_a_id_seq TO looker_user;
 
 
+--
+-- Name: TABLE connectivity_index_by_asn; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.connectivity_index_by_asn TO looker_user;
+
+
+--
+-- Name: TABLE connectivity_index_by_country; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.connectivity_index_by_country TO looker_user;
+
+
 --
 -- Name: TABLE country; Type: ACL; Schema: data; Owner: ozi
 --
@@ -1171,6 +1747,13 @@ GRANT SELECT ON TABLE data.country_internet_quality TO looker_user;
 GRANT SELECT ON SEQUENCE data.country_internet_quality_ci_id_seq TO looker_user;
 
 
+--
+-- Name: TABLE country_internet_quality_rollup; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.country_internet_quality_rollup TO looker_user;
+
+
 --
 -- Name: TABLE country_stat; Type: ACL; Schema: data; Owner: ozi
 --
@@ -1185,6 +1768,13 @@ GRANT SELECT ON TABLE data.country_stat TO looker_user;
 GRANT SELECT ON SEQUENCE data.country_stat_cs_id_seq TO looker_user;
 
 
+--
+-- Name: TABLE country_stat_rollup; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.country_stat_rollup TO looker_user;
+
+
 --
 -- Name: TABLE country_tag; Type: ACL; Schema: data; Owner: ozi
 --
@@ -1206,6 +1796,13 @@ GRANT SELECT ON TABLE data.country_traffic TO looker_user;
 GRANT SELECT ON SEQUENCE data.country_traffic_cr_id_seq TO looker_user;
 
 
+--
+-- Name: TABLE country_traffic_rollup; Type: ACL; Schema: data; Owner: ozi
+--
+
+GRANT SELECT ON TABLE data.country_traffic_rollup TO looker_user;
+
+
 --
 -- Name: TABLE v_asn_count; Type: ACL; Schema: data; Owner: ozi
 --
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from extract_from_ripe_api import API_URL, SAVE_RESPONSES, failed_requests, ripe_retry_policy, save_api_response
+from http_session import HTTP_TIMEOUT
+from metrics import endpoint_label, record_api_response, timer
+from rate_limiter import get_limiter, parse_retry_after
+from response_cache import get_ripe_cache, is_historical
+
+ASYNC_CONCURRENCY = int(os.getenv("OZI_ASYNC_CONCURRENCY", "200"))
+CLOUDFLARE_API_URL = "https://api.cloudflare.com/client/v4/radar/{}"
+
+
+class AsyncExtractor:
+    """aiohttp counterpart of extract_from_ripe_api and extract_from_cloudflare_api.
+
+    One instance serves one event loop. A semaphore bounds the requests in
+    flight to `concurrency`; pacing, retries, the circuit breaker, the
+    response cache and failure recording are the same objects the blocking
+    extractors use. Use as `async with AsyncExtractor() as extractor:`.
+    """
+
+    def __init__(self, concurrency=ASYNC_CONCURRENCY):
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _get(self, upstream, url, params, headers=None):
+        limiter = get_limiter(upstream)
+        async with self._semaphore:
+            await limiter.acquire_async()
+            started = time.monotonic()
+            async with self._session.get(url, params=params, headers=headers) as response:
+                body = await response.read()
+                latency = time.monotonic() - started
+                await limiter.report_async(
+                    response.status, latency, parse_retry_after(response.headers.get("Retry-After"))
+                )
+                record_api_response(url, response.status, latency, len(body))
+                response.raise_for_status()
+        try:
+            with timer("json_decode_seconds", endpoint=endpoint_label(url)):
+                data = json.loads(body)
+        except json.JSONDecodeError:
+            raise ValueError(f"Could not parse response as JSON for URL: {url} with params: {params}")
+        if not data:
+            raise ValueError(f"Empty response for URL: {url} with params: {params}")
+        return data
+
+    async def ripe_api_call(self, url, params):
+        # The sqlite cache and the response sinks block, so they run on the loop's executor
+        loop = asyncio.get_running_loop()
+        cache = get_ripe_cache() if is_historical(params) else None
+        if cache:
+            data = await loop.run_in_executor(None, cache.get, url, params)
+            if data:
+                return data
+
+        try:
+            data = await ripe_retry_policy.acall(self._get, "ripe", url, params)
+        except Exception as e:
+            failed_requests.record(url, params, e)
+            return None
+        if cache and data:
+            await loop.run_in_executor(None, cache.put, url, params, data)
+        return data
+
+    async def _call_and_save(self, url, params):
+        data = await self.ripe_api_call(url, params)
+        if data and SAVE_RESPONSES:
+            await asyncio.get_running_loop().run_in_executor(
+                None, save_api_response, url, params, data, SAVE_RESPONSES
+            )
+        return data
+
+    async def get_country_asns(self, country_iso2, date):
+        params = {"resource": country_iso2, "query_time": date.isoformat(), "lod": 1}
+        return await self._call_and_save(API_URL.format("country-asns"), params)
+
+    async def get_country_resource_stats(self, country_iso2, resolution, date):
+        date_str = date.isoformat()
+        params = {
+            "resource": country_iso2,
+            "starttime": date_str,
+            "endtime": date_str,
+            "resolution": resolution,
+        }
+        return await self._call_and_save(API_URL.format("country-resource-stats"), params)
+
+    async def get_asn_neighbours(self, asn, date):
+        params = {"resource": asn, "query_time": date.isoformat()}
+        return await self._call_and_save(API_URL.format("asn-neighbours"), params)
+
+    async def _cloudflare_call(self, path, params, api_token):
+        headers = {"Authorization": f"Bearer {api_token}"}
+        try:
+            return await self._get("cloudflare", CLOUDFLARE_API_URL.format(path), params, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print("An error occurred during cloudflare API call:", e)
+            return None
+
+    async def get_cloudflare_traffic_for_country(self, country_iso2, api_token):
+        params = {"name": "main", "location": country_iso2, "dateRange": "52w"}
+        return await self._cloudflare_call("netflows/timeseries", params, api_token)
+
+    async def get_cloudflare_internet_quality_for_country(self, country_iso2, api_token):
+        params = {
+            "name": "main",
+            "location": country_iso2,
+            "dateRange": "52w",
+            "metric": "bandwidth",
+            "interpolation": "true",
+        }
+        return await self._cloudflare_call("quality/iqi/timeseries_groups", params, api_token)
+
+
+def iterate_async(async_iterable):
+    """Drive an async generator from synchronous code on a private event loop.
+
+    Used to feed AsyncExtractor crawls into the blocking loaders and the
+    pipeline's producer thread; the loop lives in the iterating thread.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        if hasattr(iterator, "aclose"):
+            loop.run_until_complete(iterator.aclose())
+        loop.close()
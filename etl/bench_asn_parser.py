@@ -0,0 +1,80 @@
+"""Micro-benchmark: split-based country-asns parsing vs. parse_country_asns.
+
+Usage:
+    python bench_asn_parser.py [response.json ...] [--repeat N]
+
+Without files a synthetic response with 20000 ASNs is used. Files are raw
+country-asns responses as written by save_api_response (data/*.json).
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+
+from etl_jobs import parse_country_asns
+
+DATE_STR = "2024-01-01"
+
+
+def legacy_parse(d, date):
+    """The parser get_list_of_asns_for_country used before the regex version."""
+    rows = []
+    routed_asns = d["data"]["countries"][0]["routed"]
+    non_routed_asns = d["data"]["countries"][0]["non_routed"]
+    routed_list = [
+        item.split("(")[1].split(")")[0]
+        for item in routed_asns.strip("{}").split(", ")
+        if item.startswith("AsnSingle")
+    ]
+    non_routed_list = [
+        item.split("(")[1].split(")")[0]
+        for item in non_routed_asns.strip("{}").split(", ")
+        if item.startswith("AsnSingle")
+    ]
+    for asn in routed_list:
+        rows.append({"asn": asn, "date": date.strftime("%Y-%m-%d"), "is_routed": True})
+    for asn in non_routed_list:
+        rows.append({"asn": asn, "date": date.strftime("%Y-%m-%d"), "is_routed": False})
+    return rows
+
+
+def synthetic_response(asn_count):
+    routed = ", ".join(f"AsnSingle({asn})" for asn in range(1, asn_count * 3 // 4))
+    non_routed = ", ".join(f"AsnSingle({asn})" for asn in range(asn_count * 3 // 4, asn_count + 1))
+    return {"data": {"countries": [{"routed": "{" + routed + "}", "non_routed": "{" + non_routed + "}"}]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="Recorded country-asns responses.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per parser (default: %(default)s).")
+    args = parser.parse_args()
+
+    if args.files:
+        responses = []
+        for filename in args.files:
+            with open(filename, encoding="utf-8") as f:
+                responses.append(json.load(f))
+    else:
+        responses = [synthetic_response(20000)]
+
+    date = datetime(2024, 1, 1)
+    total_asns = sum(len(legacy_parse(d, date)) for d in responses)
+
+    for d in responses:
+        legacy = [(int(row["asn"]), row["date"], row["is_routed"]) for row in legacy_parse(d, date)]
+        assert legacy == list(parse_country_asns(d, DATE_STR)), "parsers disagree"
+
+    legacy_time = timeit.timeit(lambda: [legacy_parse(d, date) for d in responses], number=args.repeat)
+    regex_time = timeit.timeit(
+        lambda: [list(parse_country_asns(d, date.strftime("%Y-%m-%d"))) for d in responses], number=args.repeat
+    )
+
+    print(f"{len(responses)} responses, {total_asns} ASNs, {args.repeat} runs")
+    print(f"split-based parser: {legacy_time / args.repeat * 1000:8.2f} ms/run")
+    print(f"regex parser:       {regex_time / args.repeat * 1000:8.2f} ms/run")
+    print(f"speed-up:           {legacy_time / regex_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
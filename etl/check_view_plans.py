@@ -0,0 +1,200 @@
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from load_to_database import ASN_NEIGHBOUR_TABLE, ASN_TABLE, db_transaction, ensure_partitions, get_db_connection
+
+# Tables smaller than this may be read with a sequential scan, the planner is right to do so
+CHECK_MIN_ROWS = 10000
+PARTITION_SUFFIX = re.compile(r"_y\d{4}m\d{2}$")
+
+# (view, query, tables the query must read through an index)
+VIEW_CHECKS = (
+    (
+        "v_asn_with_neighbours",
+        "SELECT * FROM data.v_asn_with_neighbours WHERE a_country_iso2 = :country AND a_date = :date",
+        ("asn", "asn_neighbour"),
+    ),
+    (
+        "v_asn_neighbour",
+        "SELECT * FROM data.v_asn_neighbour WHERE an_date = :date",
+        ("asn_neighbour", "asn_current"),
+    ),
+    (
+        "v_country_stat_last",
+        "SELECT * FROM data.v_country_stat_last",
+        ("country_stat",),
+    ),
+    (
+        "v_data_overview",
+        "SELECT * FROM data.v_data_overview"
+        " WHERE country_iso2 = :country AND date BETWEEN CAST(:date AS timestamp) - interval '7 days' AND :date",
+        ("asn", "asn_neighbour", "country_stat", "country_traffic", "country_internet_quality"),
+    ),
+    (
+        "vm_connectivity_index_by_country",
+        "SELECT * FROM data.vm_connectivity_index_by_country WHERE asn_country = :country AND date = :date",
+        ("connectivity_index_by_country",),
+    ),
+    (
+        "vm_connectivity_index_by_asn_top10",
+        "SELECT * FROM data.vm_connectivity_index_by_asn_top10 WHERE asn_country = :country AND an_date = :date",
+        ("connectivity_index_by_asn",),
+    ),
+)
+
+
+def parent_table(relation):
+    """Table a partition such as asn_neighbour_y2025m05 belongs to."""
+    return PARTITION_SUFFIX.sub("", relation)
+
+
+def seq_scans(plan):
+    """Relations read by a sequential scan anywhere in an EXPLAIN (FORMAT JSON) plan, subplans included."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+def offending_scans(plan, tables, row_estimates, min_rows=CHECK_MIN_ROWS):
+    """Sequential scans of the given tables (or their partitions) holding at least min_rows rows."""
+    return sorted(
+        relation
+        for relation in set(seq_scans(plan))
+        if parent_table(relation) in tables and row_estimates.get(relation, 0) >= min_rows
+    )
+
+
+def get_row_estimates(c):
+    query = text(
+        "SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace"
+        " WHERE n.nspname = 'data' AND c.relkind IN ('r', 'p')"
+    )
+    return {relname: reltuples for relname, reltuples in c.execute(query)}
+
+
+def get_sample(c):
+    """Country and date to filter the views by: the newest ASN row."""
+    return c.execute(text("SELECT a_country_iso2, a_date FROM data.asn ORDER BY a_date DESC LIMIT 1")).first()
+
+
+def check_views(country, date, min_rows=CHECK_MIN_ROWS):
+    """EXPLAIN every view query; returns {view: [relations read by seq scan]} for the failing ones."""
+    failures = {}
+    params = {"country": country, "date": date}
+    with get_db_connection() as c:
+        row_estimates = get_row_estimates(c)
+        for view, query, tables in VIEW_CHECKS:
+            plan = c.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = offending_scans(plan[0]["Plan"], tables, row_estimates, min_rows)
+            print(f"{'FAIL' if scans else 'ok':<6} {view}" + (f": seq scan on {', '.join(scans)}" if scans else ""))
+            if scans:
+                failures[view] = scans
+    return failures
+
+
+SEED_STATEMENTS = (
+    "INSERT INTO data.asn (a_date, a_country_iso2, a_ripe_id, a_is_routed)"
+    " SELECT d, c.iso2, c.n * 100000 + i, true"
+    " FROM generate_series(CAST(:start AS timestamp), CAST(:end AS timestamp), interval '1 day') AS d,"
+    " unnest(CAST(:countries AS text[])) WITH ORDINALITY AS c(iso2, n), generate_series(1, :asns) AS i"
+    " ON CONFLICT DO NOTHING",
+    "INSERT INTO data.asn_current (ac_asn, ac_country_id, ac_date)"
+    " SELECT DISTINCT ON (a_ripe_id) a_ripe_id, c_id, a_date FROM data.asn JOIN data.country ON c_iso2 = a_country_iso2"
+    " WHERE a_date BETWEEN :start AND :end ORDER BY a_ripe_id, a_date DESC"
+    " ON CONFLICT DO NOTHING",
+    "INSERT INTO data.asn_neighbour (an_asn, an_neighbour, an_date, an_type, an_power)"
+    " SELECT a_ripe_id, 100000 + (a_ripe_id * 31 + j * 7919) % (cardinality(CAST(:countries AS text[])) * 100000),"
+    " a_date, CASE WHEN j % 2 = 0 THEN 'left' ELSE 'right' END, j"
+    " FROM data.asn, generate_series(1, :neighbours) AS j WHERE a_date BETWEEN :start AND :end"
+    " ON CONFLICT DO NOTHING",
+    "INSERT INTO data.country_stat (cs_country_iso2, cs_stats_timestamp, cs_stats_resolution, cs_asns_ris, cs_asns_stats)"
+    " SELECT iso2, d, '1d', :asns, :asns FROM unnest(CAST(:countries AS text[])) AS iso2,"
+    " generate_series(CAST(:start AS timestamp), CAST(:end AS timestamp), interval '1 day') AS d"
+    " ON CONFLICT DO NOTHING",
+    "INSERT INTO data.country_traffic (cr_country_iso2, cr_date, cr_traffic)"
+    " SELECT iso2, d, 0.5 FROM unnest(CAST(:countries AS text[])) AS iso2,"
+    " generate_series(CAST(:start AS timestamp), CAST(:end AS timestamp) + interval '23 hours', interval '1 hour') AS d"
+    " ON CONFLICT DO NOTHING",
+    "INSERT INTO data.country_internet_quality (ci_country_iso2, ci_date, ci_p75, ci_p50, ci_p25)"
+    " SELECT iso2, d, 30, 20, 10 FROM unnest(CAST(:countries AS text[])) AS iso2,"
+    " generate_series(CAST(:start AS timestamp), CAST(:end AS timestamp), interval '1 day') AS d"
+    " ON CONFLICT DO NOTHING",
+)
+
+
+def seed(days, countries, asns, neighbours, end=None):
+    """Fill a scratch database with synthetic rows so the planner sees production-like table sizes.
+
+    Writes and commits real rows: only point this at a throwaway database.
+    """
+    end = end or datetime(datetime.now().year, 1, 1)
+    start = end - timedelta(days=days - 1)
+    dates = [start + timedelta(days=i) for i in range(days)]
+    with get_db_connection() as c:
+        iso2s = [row[0] for row in c.execute(
+            text("SELECT c_iso2 FROM data.country ORDER BY c_iso2 LIMIT :countries"), {"countries": countries}
+        )]
+    if not iso2s:
+        raise SystemExit("data.country is empty, load insert_countries.sql first")
+    ensure_partitions(ASN_TABLE, dates)
+    ensure_partitions(ASN_NEIGHBOUR_TABLE, dates)
+    params = {"start": start, "end": end, "countries": iso2s, "asns": asns, "neighbours": neighbours}
+    with db_transaction() as c:
+        for statement in SEED_STATEMENTS:
+            c.execute(text(statement), params)
+        c.execute(
+            text("SELECT data.refresh_connectivity_index(CAST(:dates AS timestamp[]), CAST(:countries AS varchar[]))"),
+            {"dates": dates, "countries": iso2s},
+        )
+        c.execute(text("ANALYZE"))
+    print(f"Seeded {days} days for {len(iso2s)} countries, {asns} ASNs each, {neighbours} neighbours per ASN")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fail if an analytic view is planned with sequential scans over large tables."
+    )
+    parser.add_argument("--country", help="Country to filter the views by (default: newest data.asn row).")
+    parser.add_argument("--date", help="Date to filter the views by, YYYY-MM-DD (default: newest data.asn row).")
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=CHECK_MIN_ROWS,
+        help="Ignore seq scans of tables or partitions with fewer rows (default: %(default)s).",
+    )
+    parser.add_argument("--seed", action="store_true", help="Insert synthetic rows first. Scratch databases only!")
+    parser.add_argument("--days", type=int, default=90, help="Days of synthetic data (default: %(default)s).")
+    parser.add_argument("--countries", type=int, default=5, help="Countries to seed (default: %(default)s).")
+    parser.add_argument("--asns", type=int, default=200, help="ASNs per country and day (default: %(default)s).")
+    parser.add_argument("--neighbours", type=int, default=10, help="Neighbours per ASN (default: %(default)s).")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.days, args.countries, args.asns, args.neighbours)
+
+    country, date = args.country, args.date
+    if country is None or date is None:
+        with get_db_connection() as c:
+            sample = get_sample(c)
+        if sample is None:
+            print("data.asn is empty, nothing to check (use --seed on a scratch database)")
+            sys.exit(1)
+        country, date = country or sample[0], date or sample[1]
+
+    failures = check_views(country, date, args.min_rows)
+    if failures:
+        print(f"{len(failures)} of {len(VIEW_CHECKS)} views fall back to sequential scans")
+        sys.exit(1)
+    print(f"All {len(VIEW_CHECKS)} views use indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+RESOLUTIONS = ("D", "W", "M")
+
+
+def _next_month(date):
+    year = date.year + (date.month // 12)
+    month = (date.month % 12) + 1
+    return datetime(year, month, 1)
+
+
+def iter_dates(date_from, date_to, resolution):
+    """Lazily yield the dates between date_from and date_to at the given resolution.
+
+    Weekly dates fall on Mondays and monthly dates on the 1st, starting from the
+    first such day on or after date_from. date_to=None yields an unbounded range.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError("Unsupported resolution. Use 'D', 'W', or 'M'.")
+
+    if resolution == "W":
+        date_from += timedelta(days=(7 - date_from.weekday()) % 7)
+    elif resolution == "M" and date_from.day != 1:
+        date_from = _next_month(date_from)
+
+    date = date_from
+    while date_to is None or date <= date_to:
+        yield date
+        if resolution == "D":
+            date += timedelta(days=1)
+        elif resolution == "W":
+            date += timedelta(days=7)
+        else:
+            date = _next_month(date)
+
+
+class DateRange:
+    """Re-iterable, sized view over iter_dates; nothing is materialised."""
+
+    def __init__(self, date_from, date_to, resolution):
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unsupported resolution. Use 'D', 'W', or 'M'.")
+        self.date_from = date_from
+        self.date_to = date_to
+        self.resolution = resolution
+
+    def __iter__(self):
+        return iter_dates(self.date_from, self.date_to, self.resolution)
+
+    def __len__(self):
+        if self.date_to is None:
+            raise TypeError("an unbounded DateRange has no length")
+        first = next(iter(self), None)
+        if first is None:
+            return 0
+        if self.resolution == "D":
+            return (self.date_to - first).days + 1
+        if self.resolution == "W":
+            return (self.date_to - first).days // 7 + 1
+        return (self.date_to.year - first.year) * 12 + self.date_to.month - first.month + 1
+
+    def __repr__(self):
+        return f"DateRange({self.date_from!r}, {self.date_to!r}, {self.resolution!r})"
@@ -1,4 +1,13 @@
-from load_to_database import BATCH_SIZE
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from load_to_database import BATCH_SIZE, get_country_asns_from_db
+from metrics import timer
 from extract_from_cloudflare_api import (
     get_cloudflare_traffic_for_country,
     get_cloudflare_internet_quality_for_country,
@@ -10,6 +19,32 @@ from extract_from_ripe_api import (
 )
 
 BAR_LENGTH = 50
+NEIGHBOURS_CONCURRENCY = int(os.getenv("OZI_RIPE_CONCURRENCY", "8"))
+# Dates whose ASN lists are looked up in data.asn with a single query
+ASN_LOOKUP_DATES = 366
+
+ASN_SINGLE_PATTERN = re.compile(r"AsnSingle\((\d+)\)")
+
+# (country_iso2, date) -> list of ASNs already resolved in this run_task call
+_country_asns_memo = {}
+
+
+def clear_country_asns_memo():
+    """Forget the resolved ASN lists; pool workers must not carry them from one task to the next."""
+    _country_asns_memo.clear()
+
+
+def remember_country_asns(country_iso2, date, d):
+    """Memoise the ASN list of a country-asns response.
+
+    A failed call is not memoised, so a later lookup of the date calls the API
+    again instead of taking it for a date without ASNs.
+    """
+    if d and d["data"]:
+        with timer("parse_seconds", endpoint="country-asns"):
+            _country_asns_memo[(country_iso2, date)] = [
+                asn for asn, _, _ in parse_country_asns(d, date.strftime("%Y-%m-%d"))
+            ]
 
 
 def display_progress(
@@ -22,6 +57,16 @@ def display_progress(
 ):
     date_str = processed_until_date.strftime("%Y-%m-%d")
 
+    if not total:
+        # Unbounded date stream: no bar, just how far we got
+        print(
+            f"\r{' ' * 12}{processed} dates, until {date_str} Received: {received_from_api}, "
+            f"Stored: {stored_to_database}   {custom_msg}",
+            end=" ",
+            flush=True,
+        )
+        return
+
     progress = float(processed) / total
     filled_length = int(BAR_LENGTH * progress)
     bar = "|" + "█" * filled_length
@@ -37,44 +82,53 @@ def display_progress(
     )
 
 
+def count_dates(dates):
+    """Number of dates for the progress bar, or None for unsized iterables."""
+    try:
+        return len(dates)
+    except TypeError:
+        return None
+
+
+def parse_country_asns(d, date_str):
+    """Yield (asn, date, is_routed) tuples from a country-asns response.
+
+    RIPE returns the lists as strings like "{AsnSingle(123), AsnRange(...)}";
+    only single ASNs are kept, as before.
+    """
+    country = d["data"]["countries"][0]
+    for match in ASN_SINGLE_PATTERN.finditer(country["routed"]):
+        yield int(match.group(1)), date_str, True
+    for match in ASN_SINGLE_PATTERN.finditer(country["non_routed"]):
+        yield int(match.group(1)), date_str, False
+
+
+def parse_asn_neighbours(d, asn, date_str):
+    """Yield the neighbour rows of an asn-neighbours response, tagged with the requested ASN and date."""
+    for row in d["data"]["neighbours"]:
+        row["asn_req"] = asn
+        row["date"] = date_str
+        yield row
+
+
 def get_list_of_asns_for_country(country_iso2, dates, batch_size, verbose=True):
-    total_number_of_dates = len(dates)
+    total_number_of_dates = count_dates(dates)
     asns_batch = []
     received_from_api = 0
 
-    if verbose:
-        display_progress(0, total_number_of_dates, dates[0], 0, 0)
+    for processed, date in enumerate(dates):
+        if verbose and processed == 0:
+            display_progress(0, total_number_of_dates, date, 0, 0)
 
-    while dates:
-        date = dates.pop(0)
         d = get_country_asns(country_iso2, date, save_mode=None)
 
-        if d["data"]:
-            routed_asns = d["data"]["countries"][0]["routed"]
-            non_routed_asns = d["data"]["countries"][0]["non_routed"]
-            routed_list = [
-                item.split("(")[1].split(")")[0]
-                for item in routed_asns.strip("{}").split(", ")
-                if item.startswith("AsnSingle")
-            ]
-            non_routed_list = [
-                item.split("(")[1].split(")")[0]
-                for item in non_routed_asns.strip("{}").split(", ")
-                if item.startswith("AsnSingle")
-            ]
-
-            for asn in routed_list:
-                asns_batch.append(
-                    {"asn": asn, "date": date.strftime("%Y-%m-%d"), "is_routed": True}
-                )
-            for asn in non_routed_list:
-                asns_batch.append(
-                    {"asn": asn, "date": date.strftime("%Y-%m-%d"), "is_routed": False}
-                )
+        if d and d["data"]:
+            with timer("parse_seconds", endpoint="country-asns"):
+                asns_batch.extend(parse_country_asns(d, date.strftime("%Y-%m-%d")))
 
             if verbose:
                 display_progress(
-                    total_number_of_dates - len(dates) - 1,
+                    processed,
                     total_number_of_dates,
                     date,
                     received_from_api + len(asns_batch),
@@ -96,7 +150,7 @@ def get_stats_for_country(country_iso2, date_from, date_to, resolution):
         end=" ... ",
     )
     d = get_country_resource_stats(
-        country_iso2, resolution, date_from, save_mode="file"
+        country_iso2, resolution, date_from, save_mode="archive"
     )
     if d:
         stats = d["data"].get("stats")
@@ -104,48 +158,188 @@ def get_stats_for_country(country_iso2, date_from, date_to, resolution):
         return stats
 
 
+def resolve_country_asns(country_iso2, dates):
+    """Look up the ASN list of every date, using data.asn before the API.
+
+    All dates are resolved against the in-process memo and then against the
+    database in one query. Dates still unknown fall back to a country-asns
+    API call. Returns a dict keyed by date; a date whose call failed maps to [].
+    """
+    missing = [date for date in dates if (country_iso2, date) not in _country_asns_memo]
+    if missing:
+        try:
+            stored = get_country_asns_from_db(country_iso2, missing)
+        except SQLAlchemyError as e:
+            print(f"\nCould not read ASN lists from the database, using the API: {e}")
+            stored = {}
+        for date, asns in stored.items():
+            _country_asns_memo[(country_iso2, date)] = asns
+
+    for date in dates:
+        if (country_iso2, date) not in _country_asns_memo:
+            remember_country_asns(country_iso2, date, get_country_asns(country_iso2, date, save_mode=None))
+
+    return {date: _country_asns_memo.get((country_iso2, date), []) for date in dates}
+
+
+async def resolve_country_asns_async(extractor, country_iso2, dates):
+    """resolve_country_asns for the event loop.
+
+    The database lookup runs on the loop's executor and the dates it does not
+    know are fetched through the extractor, so nothing blocks the loop.
+    """
+    missing = [date for date in dates if (country_iso2, date) not in _country_asns_memo]
+    if missing:
+        loop = asyncio.get_running_loop()
+        try:
+            stored = await loop.run_in_executor(None, get_country_asns_from_db, country_iso2, missing)
+        except SQLAlchemyError as e:
+            print(f"\nCould not read ASN lists from the database, using the API: {e}")
+            stored = {}
+        for date, asns in stored.items():
+            _country_asns_memo[(country_iso2, date)] = asns
+
+    unknown = [date for date in dates if (country_iso2, date) not in _country_asns_memo]
+    responses = await asyncio.gather(*(extractor.get_country_asns(country_iso2, date) for date in unknown))
+    for date, d in zip(unknown, responses):
+        remember_country_asns(country_iso2, date, d)
+
+    return {date: _country_asns_memo.get((country_iso2, date), []) for date in dates}
+
+
 def get_list_of_asn_neighbours_for_country(
-    country_iso2, dates, batch_size, verbose=True
+    country_iso2, dates, batch_size, verbose=True, concurrency=None
 ):
-    total_number_of_dates = len(dates)
+    total_number_of_dates = count_dates(dates)
     neighbours_batch = []
     received_from_api = 0
     stored_to_database = 0
+    processed = 0
+
+    dates = iter(dates)
+    # Requests are fanned out to a bounded pool; results are consumed in ASN
+    # order, so batches come out exactly as in the sequential crawl.
+    executor = ThreadPoolExecutor(max_workers=concurrency or NEIGHBOURS_CONCURRENCY)
+    try:
+        while True:
+            chunk = list(islice(dates, ASN_LOOKUP_DATES))
+            if not chunk:
+                break
+            if verbose and processed == 0:
+                display_progress(0, total_number_of_dates, chunk[0], 0, 0)
+            known_asns = resolve_country_asns(country_iso2, chunk)
+
+            for date in chunk:
+                date_str = date.strftime("%Y-%m-%d")
+                asn_list = known_asns[date]
+                for start in range(0, len(asn_list), BATCH_SIZE):
+                    asns = asn_list[start:start + BATCH_SIZE]
+                    responses = executor.map(get_asn_neighbours, asns, repeat(date))
+                    for counter, (asn, d) in enumerate(zip(asns, responses), start=start + 1):
+                        if verbose:
+                            display_progress(
+                                processed,
+                                total_number_of_dates,
+                                date,
+                                received_from_api + len(neighbours_batch),
+                                stored_to_database,
+                                f"    asn {counter}/{len(asn_list)}",
+                            )
+
+                        if d and d["data"]:
+                            with timer("parse_seconds", endpoint="asn-neighbours"):
+                                neighbours_batch.extend(parse_asn_neighbours(d, asn, date_str))
+
+                        if len(neighbours_batch) >= batch_size:
+                            yield neighbours_batch
+                            stored_to_database += len(neighbours_batch)
+                            received_from_api += len(neighbours_batch)
+                            neighbours_batch = []
+                processed += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if neighbours_batch:
+        yield neighbours_batch
+
 
-    if verbose:
-        display_progress(0, total_number_of_dates, dates[0], 0, 0)
-
-    while dates:
-        date = dates.pop(0)
-        for asn_list in get_list_of_asns_for_country(
-            country_iso2, [date], BATCH_SIZE, verbose=False
-        ):
-            counter = 0
-            for item in asn_list:
-                asn = item["asn"]
-                counter += 1
-                if verbose:
-                    display_progress(
-                        total_number_of_dates - len(dates) - 1,
-                        total_number_of_dates,
-                        date,
-                        received_from_api + len(neighbours_batch),
-                        stored_to_database,
-                        f"    asn {counter}/{len(asn_list)}",
-                    )
-
-                d = get_asn_neighbours(asn, date)
-                if d["data"]:
-                    for row in d["data"]["neighbours"]:
-                        row["asn_req"] = asn
-                        row["date"] = date.strftime("%Y-%m-%d")
-                        neighbours_batch.append(row)
+async def get_list_of_asns_for_country_async(extractor, country_iso2, dates, batch_size, verbose=True):
+    """get_list_of_asns_for_country with all dates of a chunk requested concurrently."""
+    total_number_of_dates = count_dates(dates)
+    asns_batch = []
+    received_from_api = 0
+    processed = 0
+
+    dates = iter(dates)
+    while True:
+        chunk = list(islice(dates, ASN_LOOKUP_DATES))
+        if not chunk:
+            break
+        responses = await asyncio.gather(
+            *(extractor.get_country_asns(country_iso2, date) for date in chunk)
+        )
+        for date, d in zip(chunk, responses):
+            processed += 1
+            if d and d["data"]:
+                with timer("parse_seconds", endpoint="country-asns"):
+                    asns_batch.extend(parse_country_asns(d, date.strftime("%Y-%m-%d")))
+            if len(asns_batch) >= batch_size:
+                yield asns_batch
+                received_from_api += len(asns_batch)
+                asns_batch = []
+        if verbose:
+            display_progress(
+                processed, total_number_of_dates, chunk[-1], received_from_api + len(asns_batch), received_from_api
+            )
+
+    if asns_batch:
+        yield asns_batch
+
+
+async def get_list_of_asn_neighbours_for_country_async(extractor, country_iso2, dates, batch_size, verbose=True):
+    """get_list_of_asn_neighbours_for_country on an AsyncExtractor.
+
+    (asn, date) requests of a whole chunk of dates are issued BATCH_SIZE at a
+    time, so the extractor's semaphore, not the date boundaries, decides how
+    many are in flight. Rows come out in the same order as in the sync crawl.
+    """
+    total_number_of_dates = count_dates(dates)
+    neighbours_batch = []
+    stored_to_database = 0
+    processed = 0
+
+    dates = iter(dates)
+    while True:
+        chunk = list(islice(dates, ASN_LOOKUP_DATES))
+        if not chunk:
+            break
+        known_asns = await resolve_country_asns_async(extractor, country_iso2, chunk)
+        pending = [(asn, date) for date in chunk for asn in known_asns[date]]
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            window = pending[start:start + BATCH_SIZE]
+            responses = await asyncio.gather(
+                *(extractor.get_asn_neighbours(asn, date) for asn, date in window)
+            )
+            for (asn, date), d in zip(window, responses):
+                if d and d["data"]:
+                    with timer("parse_seconds", endpoint="asn-neighbours"):
+                        neighbours_batch.extend(parse_asn_neighbours(d, asn, date.strftime("%Y-%m-%d")))
 
                 if len(neighbours_batch) >= batch_size:
                     yield neighbours_batch
                     stored_to_database += len(neighbours_batch)
-                    received_from_api += len(neighbours_batch)
                     neighbours_batch = []
+            if verbose:
+                display_progress(
+                    processed,
+                    total_number_of_dates,
+                    window[-1][1],
+                    stored_to_database + len(neighbours_batch),
+                    stored_to_database,
+                    f"    request {start + len(window)}/{len(pending)}",
+                )
+        processed += len(chunk)
 
     if neighbours_batch:
         yield neighbours_batch
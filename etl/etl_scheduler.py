@@ -1,13 +1,26 @@
+import argparse
+import multiprocessing
 import subprocess
 import threading
 import queue
+import tempfile
 import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
 from datetime import datetime
 import yaml
 import os
 import sys
 
+from metrics import METRICS_DIR, merge_snapshots, read_run_snapshots, summarize, write_metrics
+from rate_limiter import UPSTREAMS, start_rate_coordinator
+from task_journal import TaskJournal
+from task_splitter import SPLIT_KEYS, expand_tasks
+
 MAX_PARALLEL_JOBS = 250
+POOL_WORKERS = int(os.getenv("OZI_SCHEDULER_WORKERS", str(os.cpu_count() or 4)))
+RATE_LOG_INTERVAL = float(os.getenv("OZI_SCHEDULER_RATE_LOG_SECONDS", "60"))
 LOGS_DIR = "logs"
 SCHEDULER_LOG = "etl_scheduler.log"
 
@@ -42,15 +55,17 @@ def load_config(config_file):
     with open(config_file, 'r') as f:
         return yaml.safe_load(f)
 
-def save_config(config_file, config):
-    with open(config_file, 'w') as f:
-        yaml.dump(config, f, default_flow_style=False)
-
 def build_command(task):
     cmd_parts = ["python3 main.py"]
     # New structure doesn't have params wrapper
     for name, value in task.items():
-        if name == 'task':
+        if name in SPLIT_KEYS:
+            continue
+        if isinstance(value, bool):
+            # Flags such as skip-loaded and async
+            if value:
+                cmd_parts.append(f"--{name}")
+        elif name == 'task':
             cmd_parts.append(f"--{name} {value}")
         elif isinstance(value, list):
             cmd_parts.append(f"--{name} {' '.join(value)}")
@@ -58,29 +73,31 @@ def build_command(task):
             cmd_parts.append(f"--{name} {value}")
     return ' '.join(cmd_parts)
 
-def worker(job_id, task_queue, config, config_file):
+def task_log_file(task):
+    # Get process ID
+    process_id = os.getpid()
+
+    # Extract task parameters
+    task_code = task.get('task', 'unknown')
+    countries = '-'.join(task.get('countries', []))
+    date_from = task.get('date-from', '').replace('-', '')
+    date_to = task.get('date-to', '').replace('-', '')
+    resolution = task.get('date-resolution', '')
+
+    # Create log filename with the new pattern
+    log_filename = f"{process_id}_{task_code}_{countries}_{date_from}_{date_to}_{resolution}.log"
+    return os.path.join(LOGS_DIR, log_filename)
+
+def worker(job_id, task_queue, journal):
     while True:
         try:
             task = task_queue.get(block=False)
         except queue.Empty:
             break
 
-        # Get process ID
-        process_id = os.getpid()
-        
-        # Extract task parameters
-        task_code = task.get('task', 'unknown')
-        countries = '-'.join(task.get('countries', []))
-        date_from = task.get('date-from', '').replace('-', '')
-        date_to = task.get('date-to', '').replace('-', '')
-        resolution = task.get('date-resolution', '')
-        
-        # Create log filename with the new pattern
-        log_filename = f"{process_id}_{task_code}_{countries}_{date_from}_{date_to}_{resolution}.log"
-        log_file = os.path.join(LOGS_DIR, log_filename)
-        
+        log_file = task_log_file(task)
         command = build_command(task)
-        task_name = task_code
+        task_name = task.get('task', 'unknown')
         log_message(f"Process {job_id} starting task: {task_name}")
         
         done_task = task.copy()
@@ -102,54 +119,78 @@ def worker(job_id, task_queue, config, config_file):
             done_task['status'] = 'completed' if result.returncode == 0 else 'failed'
             status_msg = "✓ completed" if result.returncode == 0 else f"✗ failed (code {result.returncode})"
             log_message(f"Process {job_id} finished task: {task_name} - {status_msg}")
-            
-            if 'TASKS_QUEUE' in config and task in config['TASKS_QUEUE']:
-                config['TASKS_QUEUE'].remove(task)
-                if 'TASKS_DONE' not in config:
-                    config['TASKS_DONE'] = []
-                config['TASKS_DONE'].append(done_task)
-                save_config(config_file, config)
+            journal.record(task, done_task)
 
         except Exception as e:
             done_task['finished'] = datetime.now().isoformat()
             done_task['status'] = 'failed'
             done_task['error'] = str(e)
             log_message(f"Process {job_id} error in task {task_name}: {str(e)}")
-            
-            if 'TASKS_QUEUE' in config and task in config['TASKS_QUEUE']:
-                config['TASKS_QUEUE'].remove(task)
-                if 'TASKS_DONE' not in config:
-                    config['TASKS_DONE'] = []
-                config['TASKS_DONE'].append(done_task)
-                save_config(config_file, config)
+            journal.record(task, done_task)
             
         finally:
             task_queue.task_done()
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python etl_scheduler.py <config_file>")
-        sys.exit(1)
+def run_task_in_pool_worker(task):
+    """Run one task inside a long-lived pool worker, without a new interpreter.
 
-    config_file = sys.argv[1]
-    if not os.path.exists(config_file):
-        print(f"Config file not found: {config_file}")
-        sys.exit(1)
+    main and its HTTP session, DB engine and caches are imported once per
+    worker and stay warm between tasks. Returns the fields to merge into the
+    TASKS_DONE entry.
+    """
+    import main as etl_main
+    import load_to_database
 
-    setup_logging()
-    log_message(f"Starting ETL task scheduler using config: {config_file}")
-    ensure_logs_dir()
-    config = load_config(config_file)
-    
-    if 'TASKS_QUEUE' not in config or not config['TASKS_QUEUE']:
-        log_message("No tasks found in the TASKS_QUEUE section")
-        return
+    result = {'started': datetime.now().isoformat(), 'worker_pid': os.getpid()}
+    # The worker runs later tasks too, which must get the default mode like a new main.py would
+    default_load_mode = load_to_database.LOAD_MODE
+    with open(task_log_file(task), "w") as out, redirect_stdout(out), redirect_stderr(out):
+        try:
+            load_to_database.LOAD_MODE = task.get('load-mode', default_load_mode)
+            etl_main.run_task(
+                task['task'],
+                task['countries'],
+                datetime.strptime(task['date-from'], "%Y-%m-%d"),
+                datetime.strptime(task['date-to'], "%Y-%m-%d"),
+                task['date-resolution'],
+                skip_loaded=bool(task.get('skip-loaded', False)),
+                use_async=bool(task.get('async', False)),
+                pipeline=bool(task.get('pipeline', False)),
+                command=build_command(task),
+            )
+            result['status'] = 'completed'
+        except Exception as e:
+            traceback.print_exc()
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        finally:
+            load_to_database.LOAD_MODE = default_load_mode
+            out.flush()
+    result['finished'] = datetime.now().isoformat()
+    return result
 
-    total_tasks = len(config['TASKS_QUEUE'])
-    log_message(f"Found {total_tasks} tasks to process")
+def run_pool(tasks, journal, workers):
+    log_message(f"Starting {workers} pool worker processes")
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(run_task_in_pool_worker, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            task_name = task.get('task', 'unknown')
+            done_task = task.copy()
+            done_task['command'] = build_command(task)
+            try:
+                done_task.update(future.result())
+            except Exception as e:
+                # The worker process itself died
+                done_task.update({'finished': datetime.now().isoformat(), 'status': 'failed', 'error': str(e)})
+            status_msg = "✓ completed" if done_task['status'] == 'completed' else "✗ failed"
+            log_message(f"Worker {done_task.get('worker_pid', '?')} finished task: {task_name} - {status_msg}")
+            journal.record(task, done_task)
 
+def run_threads(tasks, journal):
     task_queue = queue.Queue()
-    for task in config['TASKS_QUEUE']:
+    for task in tasks:
         task_queue.put(task)
 
     threads = []
@@ -157,14 +198,118 @@ def main():
     log_message(f"Starting {thread_count} worker threads")
     
     for i in range(thread_count):
-        t = threading.Thread(target=worker, args=(i+1, task_queue, config, config_file))
+        t = threading.Thread(target=worker, args=(i+1, task_queue, journal))
         t.start()
         threads.append(t)
 
     for t in threads:
         t.join()
 
+def log_rates(coordinator):
+    rates = []
+    for upstream in UPSTREAMS:
+        stats = coordinator.limiter(upstream).stats()
+        rates.append(
+            f"{upstream} {stats['rate']} req/s ({stats['requests']} requests, "
+            f"{stats['throttled']} throttled, avg latency {stats['avg_latency']} s)"
+        )
+    log_message("Rate budget: " + "; ".join(rates))
+
+def monitor_rates(coordinator, stop):
+    while not stop.wait(RATE_LOG_INTERVAL):
+        log_rates(coordinator)
+
+def start_metrics_dir(config_file):
+    """Give this run its own metrics directory; every main.py run writes run_<load>_<pid>.json into it."""
+    name = os.path.splitext(os.path.basename(config_file))[0]
+    directory = os.path.join(METRICS_DIR, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}")
+    os.makedirs(directory, exist_ok=True)
+    os.environ["OZI_METRICS_DIR"] = directory
+    return directory
+
+def aggregate_metrics(directory, job):
+    """Merge the per-run metrics into scheduler.json / scheduler.prom and log the stage totals."""
+    snapshots = read_run_snapshots(directory)
+    merged = merge_snapshots(snapshots)
+    write_metrics(merged, "scheduler", directory, job=job)
+    summary = summarize(merged)
+    log_message(f"Metrics of {len(snapshots)} runs in {directory}: stage seconds {summary['seconds']}, "
+                f"rows {summary['rows']}, DB rows/s {summary['db_rows_per_second']}")
+
+def start_coordinator():
+    """Share one adaptive rate budget per upstream between all tasks of this run.
+
+    Children, both main.py subprocesses and pool workers, inherit the socket
+    path through OZI_RATE_COORDINATOR.
+    """
+    address = os.path.join(tempfile.gettempdir(), f"ozi_rate_{os.getpid()}.sock")
+    coordinator = start_rate_coordinator(address)
+    os.environ["OZI_RATE_COORDINATOR"] = address
+    log_message(f"Rate coordinator listening on {address}")
+    return coordinator
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ETL tasks listed in a job YAML file.")
+    parser.add_argument("config_file", help="Job YAML with a TASKS_QUEUE section.")
+    parser.add_argument(
+        "--mode",
+        choices=("subprocess", "pool"),
+        default="subprocess",
+        help="subprocess - one 'python3 main.py' per task (default), "
+             "pool - run tasks in a fixed set of long-lived worker processes.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=POOL_WORKERS,
+        help="Worker processes in pool mode (default: %(default)s).",
+    )
+    args = parser.parse_args()
+
+    config_file = args.config_file
+    if not os.path.exists(config_file):
+        print(f"Config file not found: {config_file}")
+        sys.exit(1)
+
+    setup_logging()
+    log_message(f"Starting ETL task scheduler using config: {config_file}")
+    ensure_logs_dir()
+    config = load_config(config_file)
+    # Units are only worth it in pool mode: in subprocess mode each one would start its own main.py
+    config['TASKS_QUEUE'], split_count = expand_tasks(config.get('TASKS_QUEUE') or [], split=args.mode == "pool")
+    journal = TaskJournal(config_file, config)
+    if journal.replayed:
+        log_message(f"Resumed from journal: {journal.replayed} tasks had already finished")
+    if split_count:
+        # Persist the units so TASKS_QUEUE in the YAML shows what is actually queued
+        journal.snapshot()
+        log_message(f"Split {split_count} tasks into (country, date) units, heaviest first")
+
+    tasks = journal.pending()
+    if not tasks:
+        log_message("No tasks found in the TASKS_QUEUE section")
+        journal.close()
+        return
+
+    log_message(f"Found {len(tasks)} tasks to process")
+
+    metrics_dir = start_metrics_dir(config_file)
+    coordinator = start_coordinator()
+    stop_monitor = threading.Event()
+    threading.Thread(target=monitor_rates, args=(coordinator, stop_monitor), daemon=True).start()
+    try:
+        if args.mode == "pool":
+            run_pool(tasks, journal, min(args.workers, len(tasks)))
+        else:
+            run_threads(tasks, journal)
+    finally:
+        journal.close()
+        stop_monitor.set()
+        log_rates(coordinator)
+        coordinator.shutdown()
+        aggregate_metrics(metrics_dir, os.path.basename(config_file))
+
     log_message("All tasks completed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
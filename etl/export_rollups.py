@@ -0,0 +1,141 @@
+import argparse
+import csv
+import os
+from decimal import Decimal
+from itertools import groupby
+
+from sqlalchemy import text
+
+from country_lists import REPORT_MAY25_COUNTRIES
+from load_to_database import get_db_connection
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+ROLLUP_PERIODS = ("week", "month")
+
+# Rollup table, its column prefix and the exported columns of each dataset, see
+# migrations/007_country_rollups.sql. The first column is called date_trunc
+# like in the files export_stats.sh used to write with psql.
+EXPORTS = {
+    "stats": (
+        "data.country_stat_rollup",
+        "csr",
+        (
+            "round(csr_v4_prefixes_ris) AS avg_cs_v4_prefixes_ris",
+            "round(csr_v6_prefixes_ris) AS avg_cs_v6_prefixes_ris",
+            "round(csr_asns_ris) AS avg_cs_asns_ris",
+            "round(csr_asns_stats) AS avg_cs_asns_stats",
+        ),
+    ),
+    "traffic": (
+        "data.country_traffic_rollup",
+        "crr",
+        (
+            "crr_traffic_avg AS avg_cr_traffic",
+            "crr_traffic_min AS min_cr_traffic",
+            "crr_traffic_max AS max_cr_traffic",
+        ),
+    ),
+    "quality": (
+        "data.country_internet_quality_rollup",
+        "cir",
+        ("cir_p75 AS avg_ci_p75", "cir_p50 AS avg_ci_p50", "cir_p25 AS avg_ci_p25"),
+    ),
+}
+
+
+def export_query(dataset, all_countries=False):
+    table, prefix, columns = EXPORTS[dataset]
+    where = f"{prefix}_period = :period"
+    if not all_countries:
+        where += f" AND {prefix}_country_iso2 = ANY(:countries)"
+    return text(
+        f"SELECT {prefix}_country_iso2, CAST({prefix}_date AS date) AS date_trunc, {', '.join(columns)}"
+        f" FROM {table} WHERE {where} ORDER BY {prefix}_country_iso2, {prefix}_date"
+    )
+
+
+def export_filename(outdir, iso2, dataset, period, export_format):
+    return os.path.join(outdir, f"{iso2.lower()}_{dataset}_{period}ly.{export_format}")
+
+
+def write_csv(filename, header, rows):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_parquet(filename, header, rows):
+    columns = {name: [] for name in header}
+    for row in rows:
+        for name, value in zip(header, row):
+            columns[name].append(float(value) if isinstance(value, Decimal) else value)
+    pyarrow.parquet.write_table(pyarrow.table(columns), filename)
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def export_rollups(dataset, period, countries, outdir, export_format="csv"):
+    """Write one file per country from a single query; returns {iso2: rows written}.
+
+    countries=None exports every country the rollup has rows for. Requested
+    countries without rows still get a file holding only the header.
+    """
+    if export_format == "parquet" and pyarrow is None:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+    params = {"period": period}
+    if countries is not None:
+        params["countries"] = [iso2.upper() for iso2 in countries]
+    os.makedirs(outdir, exist_ok=True)
+    write = WRITERS[export_format]
+
+    written = {}
+    with get_db_connection() as c:
+        result = c.execute(export_query(dataset, countries is None), params)
+        header = list(result.keys())[1:]
+        for iso2, rows in groupby(result, key=lambda row: row[0]):
+            rows = [tuple(row[1:]) for row in rows]
+            write(export_filename(outdir, iso2, dataset, period, export_format), header, rows)
+            written[iso2] = len(rows)
+    for iso2 in params.get("countries", ()):
+        if iso2 not in written:
+            write(export_filename(outdir, iso2, dataset, period, export_format), header, [])
+            written[iso2] = 0
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export weekly or monthly country rollups, one file per country, with a single query."
+    )
+    parser.add_argument("--dataset", choices=EXPORTS, default="stats", help="Rollup to export (default: %(default)s).")
+    parser.add_argument("--period", choices=ROLLUP_PERIODS, default="week", help="Default: %(default)s.")
+    parser.add_argument(
+        "-c",
+        "--countries",
+        nargs="+",
+        help="Country ISO2 codes, or ALL for every country (default: the report countries of export_stats.sh).",
+    )
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default="csv",
+                        help="Parquet needs pyarrow (default: %(default)s).")
+    parser.add_argument("-o", "--outdir", default="exports", help="Output directory (default: %(default)s).")
+    args = parser.parse_args()
+
+    countries = args.countries or list(REPORT_MAY25_COUNTRIES)
+    if [iso2.upper() for iso2 in countries] == ["ALL"]:
+        countries = None
+
+    written = export_rollups(args.dataset, args.period, countries, args.outdir, args.export_format)
+    print(f"{'Exported:':<12} {args.dataset} by {args.period}, {sum(written.values())} rows"
+          f" for {len(written)} countries to {args.outdir}")
+
+
+if __name__ == "__main__":
+    main()
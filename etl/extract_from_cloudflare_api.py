@@ -1,5 +1,22 @@
+import time
+
 import requests
 
+from http_session import get_session, HTTP_TIMEOUT
+from metrics import record_api_response
+from rate_limiter import get_limiter, parse_retry_after
+
+
+def cloudflare_get(url, params, headers):
+    limiter = get_limiter("cloudflare")
+    limiter.acquire()
+    started = time.monotonic()
+    response = get_session().get(url, params=params, headers=headers, timeout=HTTP_TIMEOUT)
+    latency = time.monotonic() - started
+    limiter.report(response.status_code, latency, parse_retry_after(response.headers.get("Retry-After")))
+    record_api_response(url, response.status_code, latency, len(response.content))
+    return response
+
 def get_cloudflare_traffic_for_country(country_iso2, api_token, copy_to_file=False):
     api_url = 'https://api.cloudflare.com/client/v4/radar/netflows/timeseries'
     params = {
@@ -12,7 +29,7 @@ def get_cloudflare_traffic_for_country(country_iso2, api_token, copy_to_file=Fal
     }
 
     try:
-        response = requests.get(api_url, params=params, headers=headers)
+        response = cloudflare_get(api_url, params, headers)
         response.raise_for_status()
         data = response.json()
 
@@ -35,7 +52,7 @@ def get_cloudflare_internet_quality_for_country(country_iso2, api_token, copy_to
     }
 
     try:
-        response = requests.get(api_url, params=params, headers=headers)
+        response = cloudflare_get(api_url, params, headers)
         response.raise_for_status()
         data = response.json()
 
@@ -6,16 +6,31 @@ from datetime import datetime
 from json import loads
 import requests
 
+from http_session import get_session, HTTP_TIMEOUT
+from metrics import endpoint_label, record_api_response, timer
+from rate_limiter import get_limiter, parse_retry_after
+from retry_policy import CircuitBreaker, FailedRequests, RetryPolicy
+from response_cache import get_ripe_cache, is_historical
+from response_archive import get_api_response_sink, get_response_archive
+
 API_URL = 'https://stat.ripe.net/data/{}/data.json'
 RETRIES = 5
+# Default save_mode for every RIPE response: "archive", "database", "file" or empty for none
+SAVE_RESPONSES = os.getenv("OZI_SAVE_RESPONSES", "")
+
+# Open breaker pauses every worker sharing the RIPE rate budget, not just this process.
+ripe_breaker = CircuitBreaker(on_open=lambda seconds: get_limiter("ripe").backoff(seconds))
+ripe_retry_policy = RetryPolicy(RETRIES, breaker=ripe_breaker, name="ripe")
+# Requests given up on after RETRIES attempts; main.py re-queues their dates.
+failed_requests = FailedRequests()
 
 def get_country_asns(country_iso2, date, save_mode=None):
     url = API_URL.format("country-asns")
     params = {"resource": country_iso2, "query_time": date.isoformat(), "lod": 1}
     data = ripe_api_call(url, params)
 
-    if save_mode:
-        save_api_response(url, params, data, save_mode)
+    if data and (save_mode or SAVE_RESPONSES):
+        save_api_response(url, params, data, save_mode or SAVE_RESPONSES)
     return data
 
 
@@ -30,8 +45,8 @@ def get_country_resource_stats(country_iso2, resolution, date, save_mode=None):
     }
     data = ripe_api_call(url, params)
 
-    if save_mode:
-        save_api_response(url, params, data, save_mode)
+    if data and (save_mode or SAVE_RESPONSES):
+        save_api_response(url, params, data, save_mode or SAVE_RESPONSES)
     return data
 
 
@@ -40,55 +55,56 @@ def get_asn_neighbours(asn, date, save_mode=None):
     params = {"resource": asn, "query_time": date.isoformat()}
     data = ripe_api_call(url, params)
 
-    if save_mode:
-        save_api_response(url, params, data, save_mode)
+    if data and (save_mode or SAVE_RESPONSES):
+        save_api_response(url, params, data, save_mode or SAVE_RESPONSES)
     return data
 
 
 def ripe_api_call(url, params):
-    attempts_left = RETRIES
-    while attempts_left > 0:
-        try:
-            response = requests.get(url, params)
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+    cache = get_ripe_cache() if is_historical(params) else None
+    if cache:
+        data = cache.get(url, params)
+        if data:
+            return data
+
+    try:
+        data = ripe_retry_policy.call(_ripe_api_request, url, params)
+    except Exception as e:
+        failed_requests.record(url, params, e)
+        return None
+    if cache and data:
+        cache.put(url, params, data)
+    return data
+
+
+def _ripe_api_request(url, params):
+    """One attempt; any exception makes ripe_retry_policy try again."""
+    limiter = get_limiter("ripe")
+    limiter.acquire()
+    started = time.monotonic()
+    response = get_session().get(url, params=params, timeout=HTTP_TIMEOUT)
+    latency = time.monotonic() - started
+    limiter.report(response.status_code, latency, parse_retry_after(response.headers.get("Retry-After")))
+    record_api_response(url, response.status_code, latency, len(response.content))
+    response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+    try:
+        with timer("json_decode_seconds", endpoint=endpoint_label(url)):
             data = loads(response.text)
-            if data:
-                return data
-        except requests.exceptions.HTTPError as e:
-            print(f"\nHTTP Error during API request: {e}")
-            attempts_left -= 1
-            if attempts_left > 0:
-                if e.response.status_code == 429: # Too Many Requests
-                    print("Rate limit hit. Waiting longer before retrying.")
-                    time.sleep(10) # Wait longer for rate limiting
-                else:
-                    print(f"... RETRYING ({attempts_left} attempts left)")
-                    time.sleep(5) # Standard wait for other HTTP errors
-            else:
-                print("... STOP")
-        except json.JSONDecodeError:
-            print(f"\nJSON Decode Error: Could not parse response as JSON for URL: {url} with params: {params}")
-            attempts_left -= 1
-            if attempts_left > 0:
-                print(f"... RETRYING ({attempts_left} attempts left)")
-                time.sleep(5) # Wait before retrying for JSON decode errors
-            else:
-                print("... STOP")
-        except Exception as e:
-            print(f"\nException during API request: {e}")
-            attempts_left -= 1
-            if attempts_left > 0:
-                print(f"... RETRYING ({attempts_left} attempts left)")
-                time.sleep(5) # Wait for 5 seconds before retrying on other exceptions
-            else:
-                print("... STOP")
-    return None
+    except json.JSONDecodeError:
+        raise ValueError(f"Could not parse response as JSON for URL: {url} with params: {params}")
+    if not data:
+        raise ValueError(f"Empty response for URL: {url} with params: {params}")
+    return data
 
 def sanitize_filename(s: str) -> str:
     return re.sub(r'[{},.<>:"/\\|?*]', '_', s)
 
 def save_api_response(url, params, response, save_mode=None):
-    if save_mode == 'file':
+    if save_mode == 'archive':
+        get_response_archive().append(url, params, response)
+    elif save_mode == 'database':
+        get_api_response_sink().append(url, params, response)
+    elif save_mode == 'file':
         params_clean = {
             k: v.isoformat() if isinstance(v, datetime) else v
             for k, v in params.items()
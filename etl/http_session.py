@@ -0,0 +1,44 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("OZI_HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_SIZE = int(os.getenv("OZI_HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.getenv("OZI_HTTP_TIMEOUT", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_connections=HTTP_POOL_CONNECTIONS, pool_size=HTTP_POOL_SIZE):
+    """requests.Session with keep-alive connection pools for every upstream host.
+
+    pool_connections is the number of hosts whose pools are cached,
+    pool_size the number of kept-alive connections per host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def get_session():
+    """Return the process-wide session shared by the RIPE and Cloudflare extractors."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -1,116 +1,591 @@
+import io
+import json
 import os
+import threading
+import time
 import urllib
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.sql.functions import current_date
 from sqlalchemy import text
 
+from metrics import ROW_BUCKETS, inc, observe
+
 USER = os.getenv("OZI_DATABASE_USER", 'asn_stats')
 PASSWORD = os.getenv("OZI_DATABASE_PASSWORD", None)
 DBNAME = os.getenv("OZI_DATABASE_NAME", 'asn_stats')
 PORT = os.getenv("OZI_DATABASE_PORT", '5432')
 HOST = os.getenv("OZI_DATABASE_HOST", '34.32.74.250')
 
+POOL_SIZE = int(os.getenv("OZI_DATABASE_POOL_SIZE", '5'))
+POOL_MAX_OVERFLOW = int(os.getenv("OZI_DATABASE_POOL_MAX_OVERFLOW", '5'))
+POOL_RECYCLE = int(os.getenv("OZI_DATABASE_POOL_RECYCLE", '1800'))
+
+# insert - plain COPY, skip - ON CONFLICT DO NOTHING, update - ON CONFLICT DO UPDATE
+LOAD_MODES = ("insert", "skip", "update")
+LOAD_MODE = os.getenv("OZI_LOAD_MODE", 'skip')
+
 BATCH_SIZE = 1000
 
-def get_db_connection():
+_engine = None
+_engine_lock = threading.Lock()
+_pool_stats = {"opened": 0, "checkouts": 0}
+_pool_stats_lock = threading.Lock()
+
+
+def get_connection_string():
     encoded_password = urllib.parse.quote(str(PASSWORD))
-    connection_string = f"postgresql://{USER}:{encoded_password}@{HOST}:{PORT}/{DBNAME}"
-    # print(connection_string)
-    engine = create_engine(connection_string)
-    return engine.connect()
+    return f"postgresql://{USER}:{encoded_password}@{HOST}:{PORT}/{DBNAME}"
 
-def insert_country_asns_to_db(country_iso2, list_of_asns, save_sql_to_file=False, load_to_database=True):
-    sql= "INSERT INTO data.asn(a_country_iso2, a_date, a_ripe_id, a_is_routed)\nVALUES"
 
-    for item in list_of_asns:
-        sql += f"\n('{country_iso2}', '{item['date']}', {item['asn']}, {item['is_routed']}),"
-    sql = sql[:-1] + ";\n"
+def _count_connect(dbapi_connection, connection_record):
+    with _pool_stats_lock:
+        _pool_stats["opened"] += 1
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _pool_stats_lock:
+        _pool_stats["checkouts"] += 1
+
+
+def get_engine():
+    """Return the process-wide pooled engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    get_connection_string(),
+                    pool_size=POOL_SIZE,
+                    max_overflow=POOL_MAX_OVERFLOW,
+                    pool_recycle=POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+                event.listen(engine, "connect", _count_connect)
+                event.listen(engine, "checkout", _count_checkout)
+                _engine = engine
+    return _engine
+
+
+def dispose_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def get_pool_stats():
+    """Connections physically opened vs. checkouts served from the pool."""
+    opened = _pool_stats["opened"]
+    checkouts = _pool_stats["checkouts"]
+    return {"opened": opened, "reused": max(checkouts - opened, 0), "checkouts": checkouts}
+
+
+@contextmanager
+def get_db_connection():
+    """Check a connection out of the pool and return it when done."""
+    with get_engine().connect() as connection:
+        yield connection
+
+
+@contextmanager
+def db_transaction():
+    """Pooled connection wrapped in a transaction: commit on success, rollback on error."""
+    with get_engine().begin() as connection:
+        yield connection
+
+def get_country_asns_from_db(country_iso2, dates):
+    """ASN ids already stored in data.asn for the country, grouped by date, in one query."""
+    query = text(
+        "SELECT a_date, a_ripe_id FROM data.asn"
+        " WHERE a_country_iso2 = :country AND a_date = ANY(:dates)"
+        " ORDER BY a_date, a_ripe_id"
+    )
+    asns_by_date = {}
+    with get_db_connection() as c:
+        for a_date, a_ripe_id in c.execute(query, {"country": country_iso2, "dates": list(dates)}):
+            asns_by_date.setdefault(a_date, []).append(a_ripe_id)
+    return asns_by_date
+
+
+def get_asn_counts_from_db(countries, date_from, date_to):
+    """Number of ASNs stored in data.asn per (country, date) in the range."""
+    query = text(
+        "SELECT a_country_iso2, a_date, COUNT(*) FROM data.asn"
+        " WHERE a_country_iso2 = ANY(:countries) AND a_date BETWEEN :date_from AND :date_to"
+        " GROUP BY a_country_iso2, a_date"
+    )
+    params = {"countries": list(countries), "date_from": date_from, "date_to": date_to}
+    with get_db_connection() as c:
+        return {(iso2, a_date): count for iso2, a_date, count in c.execute(query, params)}
+
+
+ASN_TABLE = "data.asn"
+ASN_COLUMNS = ("a_country_iso2", "a_date", "a_ripe_id", "a_is_routed")
+ASN_NEIGHBOUR_TABLE = "data.asn_neighbour"
+ASN_NEIGHBOUR_COLUMNS = (
+    "an_asn", "an_neighbour", "an_date", "an_type", "an_power", "an_v4_peers", "an_v6_peers"
+)
+COUNTRY_STAT_TABLE = "data.country_stat"
+COUNTRY_STAT_COLUMNS = (
+    "cs_country_iso2", "cs_stats_timestamp", "cs_stats_resolution", "cs_v4_prefixes_ris",
+    "cs_v6_prefixes_ris", "cs_asns_ris", "cs_v4_prefixes_stats", "cs_v6_prefixes_stats", "cs_asns_stats"
+)
+COUNTRY_TRAFFIC_TABLE = "data.country_traffic"
+COUNTRY_TRAFFIC_COLUMNS = ("cr_country_iso2", "cr_date", "cr_traffic")
+COUNTRY_INTERNET_QUALITY_TABLE = "data.country_internet_quality"
+COUNTRY_INTERNET_QUALITY_COLUMNS = ("ci_country_iso2", "ci_date", "ci_p75", "ci_p50", "ci_p25")
+API_RESPONSE_TABLE = "source.api_response"
+API_RESPONSE_COLUMNS = ("ar_url", "ar_params", "r_response")
+
+# Columns of the unique natural-key index of each table, used as ON CONFLICT targets
+NATURAL_KEYS = {
+    ASN_TABLE: ("a_country_iso2", "a_date", "a_ripe_id"),
+    ASN_NEIGHBOUR_TABLE: ("an_asn", "an_date", "an_neighbour"),
+    COUNTRY_STAT_TABLE: ("cs_country_iso2", "cs_stats_resolution", "cs_stats_timestamp"),
+    COUNTRY_TRAFFIC_TABLE: ("cr_country_iso2", "cr_date"),
+    COUNTRY_INTERNET_QUALITY_TABLE: ("ci_country_iso2", "ci_date"),
+}
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def build_copy_payload(rows):
+    """Render rows as PostgreSQL COPY text format (tab separated, \\N for NULL)."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_statement(table, columns):
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+
+
+def staging_table_name(table):
+    return f"staging_{table.split('.')[-1]}"
+
+
+def upsert_statement(table, columns, mode):
+    keys = NATURAL_KEYS[table]
+    column_list = ", ".join(columns)
+    sql = (
+        f"INSERT INTO {table} ({column_list})\n"
+        f"SELECT DISTINCT ON ({', '.join(keys)}) {column_list} FROM {staging_table_name(table)}\n"
+        f"ON CONFLICT ({', '.join(keys)}) "
+    )
+    # Rows that existed before keep their load_id, so rolling back this load does not delete them
+    updates = [column for column in columns if column not in keys and column != "load_id"]
+    if mode == "update" and updates:
+        return sql + "DO UPDATE SET " + ", ".join(f"{column} = EXCLUDED.{column}" for column in updates)
+    return sql + "DO NOTHING"
+
+
+def load_statements(table, columns, mode):
+    """SQL run before the COPY, the COPY itself and SQL run after it for a load mode.
+
+    Upserts COPY into a temporary staging table and move the rows over with
+    INSERT ... ON CONFLICT on the table's natural key.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}'. Use one of: {', '.join(LOAD_MODES)}.")
+    if mode == "insert":
+        return [], copy_statement(table, columns), []
+    staging = staging_table_name(table)
+    before = [f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"]
+    return before, copy_statement(staging, columns), [upsert_statement(table, columns, mode)]
+
+
+def copy_rows_to_db(table, columns, payload, mode=None):
+    """Stream a COPY payload into the table inside one pooled transaction.
+
+    Returns the number of rows written to the table.
+    """
+    before, copy_sql, after = load_statements(table, columns, mode or LOAD_MODE)
+    started = time.monotonic()
+    with db_transaction() as c:
+        cursor = c.connection.cursor()
+        try:
+            for sql in before:
+                cursor.execute(sql)
+            cursor.copy_expert(copy_sql, payload)
+            for sql in after:
+                cursor.execute(sql)
+            row_count = cursor.rowcount
+        finally:
+            cursor.close()
+    observe("db_copy_seconds", time.monotonic() - started, table=table)
+    observe("db_batch_rows", row_count, buckets=ROW_BUCKETS, table=table)
+    inc("db_rows_total", row_count, table=table)
+    count_loaded_rows(table, row_count)
+    return row_count
+
+
+def save_copy_to_file(filename, table, columns, payload, mode=None):
+    """Write the payload as a psql-compatible script using COPY ... FROM stdin."""
+    before, copy_sql, after = load_statements(table, columns, mode or LOAD_MODE)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as f:
+        if before:
+            f.write("BEGIN;\n")
+        for sql in before:
+            f.write(f"{sql};\n")
+        f.write(f"{copy_sql};\n")
+        f.write(payload.getvalue())
+        f.write("\\.\n")
+        for sql in after:
+            f.write(f"{sql};\n")
+        if before:
+            f.write("COMMIT;\n")
+    payload.seek(0)
+
+
+# Range-partitioned by month on their date column, see migrations/003_partition_asn_tables.sql
+PARTITIONED_TABLES = (ASN_TABLE, ASN_NEIGHBOUR_TABLE)
+
+# (table, first day of month) pairs this process knows a partition exists for
+_known_partitions = set()
+_known_partitions_lock = threading.Lock()
+
+
+def month_start(value):
+    """First day of the month of a date, datetime or ISO date string."""
+    year, month = str(value)[:7].split("-")
+    return datetime(int(year), int(month), 1).date()
+
+
+def ensure_partitions(table, dates):
+    """Create the monthly partitions rows with these dates go to, unless they exist.
+
+    Returns the months whose partition was created. Months already seen by this
+    process are not looked up again, so calling this for every batch is cheap.
+    """
+    months = {month_start(value) for value in dates}
+    with _known_partitions_lock:
+        missing = sorted(month for month in months if (table, month) not in _known_partitions)
+    if not missing:
+        return []
+    created = []
+    with db_transaction() as c:
+        for month in missing:
+            if c.execute(
+                text("SELECT data.create_month_partition(CAST(:table AS regclass), :month)"),
+                {"table": table, "month": month},
+            ).scalar():
+                created.append(month)
+    with _known_partitions_lock:
+        _known_partitions.update((table, month) for month in missing)
+    for month in created:
+        print(f"{'Partition:':<12} {table} {month:%Y-%m} created")
+    return created
+
+
+FACT_TABLES = (
+    ASN_TABLE,
+    ASN_NEIGHBOUR_TABLE,
+    COUNTRY_STAT_TABLE,
+    COUNTRY_TRAFFIC_TABLE,
+    COUNTRY_INTERNET_QUALITY_TABLE,
+)
+ROLLBACK_BATCH_SIZE = 50000
+
+# The data.etl_load row the rows written by this process are stamped with
+_current_load = {"load_id": None, "row_counts": {}}
+_current_load_lock = threading.Lock()
+
+
+def count_loaded_rows(table, row_count):
+    with _current_load_lock:
+        counts = _current_load["row_counts"]
+        counts[table] = counts.get(table, 0) + row_count
+
+
+def get_current_load_id():
+    return _current_load["load_id"]
+
+
+def start_etl_load(command):
+    """Register a load in data.etl_load; rows loaded from now on carry its load_id."""
+    with db_transaction() as c:
+        load_id = c.execute(
+            text(
+                "INSERT INTO data.etl_load (start_time, command, status)"
+                " VALUES (CURRENT_TIMESTAMP, :command, 'running') RETURNING load_id"
+            ),
+            {"command": command},
+        ).scalar()
+    with _current_load_lock:
+        _current_load["load_id"] = load_id
+        _current_load["row_counts"] = {}
+    return load_id
+
+
+def attach_etl_load(load_id):
+    """Stamp rows loaded by this process with a load registered by another process."""
+    with _current_load_lock:
+        _current_load["load_id"] = load_id
+        _current_load["row_counts"] = {}
+
+
+def detach_etl_load():
+    """Stop stamping rows with the attached load; returns the rows written per table."""
+    with _current_load_lock:
+        row_counts = dict(_current_load["row_counts"])
+        _current_load["load_id"] = None
+        _current_load["row_counts"] = {}
+    return row_counts
+
+
+def finish_etl_load(status):
+    """Close the current load with its status and the number of rows written per table."""
+    with _current_load_lock:
+        load_id = _current_load["load_id"]
+        row_counts = dict(_current_load["row_counts"])
+        _current_load["load_id"] = None
+    if load_id is None:
+        return None
+    with db_transaction() as c:
+        c.execute(
+            text(
+                "UPDATE data.etl_load SET finish_time = CURRENT_TIMESTAMP, status = :status,"
+                " row_counts = CAST(:row_counts AS jsonb) WHERE load_id = :load_id"
+            ),
+            {"status": status, "row_counts": json.dumps(row_counts), "load_id": load_id},
+        )
+    return row_counts
+
+
+def rollback_etl_load(load_id, batch_size=ROLLBACK_BATCH_SIZE):
+    """Delete every row stamped with load_id, in short batches, then the etl_load row itself.
+
+    Each batch of data.asn rows recomputes data.asn_current for its ASNs in the same transaction.
+    """
+    deleted = {}
+    for table in FACT_TABLES:
+        deleted[table] = 0
+        returning = " RETURNING a_ripe_id" if table == ASN_TABLE else ""
+        while True:
+            with db_transaction() as c:
+                result = c.execute(
+                    text(
+                        f"DELETE FROM {table} WHERE load_id = :load_id AND ctid = ANY(ARRAY("
+                        f"SELECT ctid FROM {table} WHERE load_id = :load_id LIMIT :batch_size)){returning}"
+                    ),
+                    {"load_id": load_id, "batch_size": batch_size},
+                )
+                row_count = result.rowcount
+                if returning and row_count:
+                    recompute_asn_current(c, sorted({row[0] for row in result}))
+            deleted[table] += row_count
+            if row_count < batch_size:
+                break
+        print(f"    {table}: {deleted[table]} rows deleted")
+    with db_transaction() as c:
+        c.execute(text("DELETE FROM data.etl_load WHERE load_id = :load_id"), {"load_id": load_id})
+    return deleted
+
+
+# Tasks that mark the (country, date) units they finished in data.etl_load_date,
+# see migrations/008_etl_load_dates.sql. A date only counts as loaded once it is
+# marked: its rows are committed batch by batch, so rows alone may be a crashed run.
+LOADED_DATE_TASKS = ("ASNS", "ASN_NEIGHBOURS", "STATS_1D")
+
+
+def mark_loaded_dates(task, country_iso2, dates):
+    """Record that the task wrote every row of these dates for the country.
+
+    A marker keeps the load that set it first, so rolling back a later load
+    that found the rows already there does not unmark the date.
+    """
+    dates = list(dates)
+    if not dates:
+        return
+    with db_transaction() as c:
+        c.execute(
+            text(
+                "INSERT INTO data.etl_load_date (ld_task, ld_country_iso2, ld_date, load_id)"
+                " SELECT :task, :country, d, :load_id FROM unnest(CAST(:dates AS timestamp[])) AS d"
+                " ON CONFLICT (ld_task, ld_country_iso2, ld_date) DO NOTHING"
+            ),
+            {"task": task, "country": country_iso2, "dates": dates, "load_id": _current_load["load_id"]},
+        )
+
+
+def get_loaded_dates(task, country_iso2, dates):
+    """Dates a finished run of the task has marked as loaded for the country.
+
+    Returns None for tasks that cannot be checked per date.
+    """
+    if task not in LOADED_DATE_TASKS:
+        return None
+    query = text(
+        "SELECT ld_date FROM data.etl_load_date"
+        " WHERE ld_task = :task AND ld_country_iso2 = :country AND ld_date = ANY(:dates)"
+    )
+    with get_db_connection() as c:
+        result = c.execute(query, {"task": task, "country": country_iso2, "dates": list(dates)})
+        return {row[0] for row in result}
+
+
+def load_rows(table, columns, rows, filename_prefix, country_iso2, save_sql_to_file=False, load_to_database=True):
+    load_id = _current_load["load_id"]
+    if load_id is not None:
+        columns = columns + ("load_id",)
+        rows = (row + (load_id,) for row in rows)
+    payload = build_copy_payload(rows)
 
     if save_sql_to_file:
-        filename = "sql/country_asns_{}_{}.sql".format(country_iso2, datetime.now().strftime('%Y%m%d_%H%M%S'))
-        with open(filename, 'w') as f:
-            print(sql, file=f)
+        filename = "sql/{}_{}_{}.sql".format(filename_prefix, country_iso2, datetime.now().strftime('%Y%m%d_%H%M%S'))
+        save_copy_to_file(filename, table, columns, payload)
 
     if load_to_database:
-        c = get_db_connection()
-        query = text(sql)
-        c.execute(query)
-        c.commit()
+        return copy_rows_to_db(table, columns, payload)
 
 
-def insert_country_stats_to_db(country_iso2, resolution, stats, save_sql_to_file=False, load_to_database=True):
-    sql= ("INSERT INTO data.country_stat(cs_country_iso2, cs_stats_timestamp, cs_stats_resolution, cs_v4_prefixes_ris,"
-          " cs_v6_prefixes_ris, cs_asns_ris, cs_v4_prefixes_stats, cs_v6_prefixes_stats, cs_asns_stats )\nVALUES ")
-    for item in stats:
-        sql +=  (f"\n('{country_iso2}', '{item['timeline'][0]['starttime']}', '{resolution}', "
-                f"{item['v4_prefixes_ris'] if item['v4_prefixes_ris'] else 'NULL'}, "
-                f"{item['v6_prefixes_ris'] if item['v6_prefixes_ris'] else 'NULL'}, "
-                f"{item['asns_ris'] if item['asns_ris'] else 'NULL'}, "
-                f"{item['v4_prefixes_stats'] if item['v4_prefixes_stats'] else 'NULL'}, "
-                f"{item['v6_prefixes_stats'] if item['v6_prefixes_stats'] else 'NULL'}, "
-                f"{item['asns_stats'] if item['asns_stats'] else 'NULL'} ),")
-    sql = sql[:-1] + ";"
+def insert_api_responses_to_db(records):
+    """Bulk-load raw responses into source.api_response; the table has no natural key, so always a plain COPY."""
+    rows = (
+        (record["url"], json.dumps(record["params"], sort_keys=True, default=str), json.dumps(record["response"]))
+        for record in records
+    )
+    return copy_rows_to_db(API_RESPONSE_TABLE, API_RESPONSE_COLUMNS, build_copy_payload(rows), mode="insert")
+
+
+# One row per ASN with the country of its newest data.asn row, see migrations/006_asn_current.sql.
+# Older dates never overwrite newer ones, so backfills leave the current country alone.
+# Returns the ASNs that moved to another country, with the country they were in before.
+ASN_CURRENT_TABLE = "data.asn_current"
+ASN_CURRENT_UPSERT = (
+    "WITH previous AS ("
+    " SELECT ac_asn, ac_country_id FROM data.asn_current WHERE ac_asn = ANY(CAST(:asns AS integer[])) FOR UPDATE"
+    "), upserted AS ("
+    " INSERT INTO data.asn_current (ac_asn, ac_country_id, ac_date)"
+    " SELECT a.asn, c.c_id, a.date"
+    " FROM unnest(CAST(:asns AS integer[]), CAST(:dates AS timestamp[])) AS a(asn, date)"
+    " JOIN data.country c ON c.c_iso2 = :country"
+    " ON CONFLICT (ac_asn) DO UPDATE SET ac_country_id = EXCLUDED.ac_country_id, ac_date = EXCLUDED.ac_date"
+    " WHERE EXCLUDED.ac_date >= data.asn_current.ac_date"
+    " RETURNING ac_asn, ac_country_id"
+    ")"
+    " SELECT u.ac_asn, pc.c_iso2 FROM upserted u"
+    " JOIN previous p ON p.ac_asn = u.ac_asn JOIN data.country pc ON pc.c_id = p.ac_country_id"
+    " WHERE p.ac_country_id <> u.ac_country_id"
+)
 
-    if save_sql_to_file:
-        filename = "sql/country_stats_{}_{}.sql".format(
-            country_iso2, datetime.now().strftime('%Y%m%d_%H%M%S')
-        )
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w') as f:
-            print(sql, file=f)
 
+# Rebuilds the rows of some ASNs from the data.asn rows left, e.g. after a rollback.
+# A load that upserted one of them in the meantime keeps its row if it is newer.
+ASN_CURRENT_RECOMPUTE = (
+    "INSERT INTO data.asn_current (ac_asn, ac_country_id, ac_date)"
+    " SELECT DISTINCT ON (a.a_ripe_id) a.a_ripe_id, c.c_id, a.a_date FROM data.asn a"
+    " JOIN data.country c ON c.c_iso2 = a.a_country_iso2"
+    " WHERE a.a_ripe_id = ANY(CAST(:asns AS integer[]))"
+    " ORDER BY a.a_ripe_id, a.a_date DESC"
+    " ON CONFLICT (ac_asn) DO UPDATE SET ac_country_id = EXCLUDED.ac_country_id, ac_date = EXCLUDED.ac_date"
+    " WHERE EXCLUDED.ac_date >= data.asn_current.ac_date"
+)
 
+
+def recompute_asn_current(c, asns):
+    """Recompute data.asn_current for these ASNs on the caller's connection, inside its transaction."""
+    c.execute(text("DELETE FROM data.asn_current WHERE ac_asn = ANY(CAST(:asns AS integer[]))"), {"asns": asns})
+    c.execute(text(ASN_CURRENT_RECOMPUTE), {"asns": asns})
+
+
+def update_asn_current(country_iso2, list_of_asns):
+    """Upsert the newest date of each loaded ASN into data.asn_current.
+
+    Returns {asn: previous country} for the ASNs that moved to country_iso2.
+    """
+    newest = {}
+    for asn, date, _ in list_of_asns:
+        if asn not in newest or str(date) > str(newest[asn]):
+            newest[asn] = date
+    if not newest:
+        return {}
+    params = {"country": country_iso2, "asns": list(newest), "dates": list(newest.values())}
+    started = time.monotonic()
+    with db_transaction() as c:
+        moved = {asn: previous for asn, previous in c.execute(text(ASN_CURRENT_UPSERT), params)}
+    observe("db_upsert_seconds", time.monotonic() - started, table=ASN_CURRENT_TABLE)
+    return moved
+
+
+def insert_country_asns_to_db(country_iso2, list_of_asns, save_sql_to_file=False, load_to_database=True):
     if load_to_database:
-        c = get_db_connection()
-        query = text(sql)
-        c.execute(query)
-        c.commit()
+        ensure_partitions(ASN_TABLE, {a_date for _, a_date, _ in list_of_asns})
+    rows = ((country_iso2, date, asn, is_routed) for asn, date, is_routed in list_of_asns)
+    load_rows(ASN_TABLE, ASN_COLUMNS, rows, "country_asns", country_iso2, save_sql_to_file, load_to_database)
+    if load_to_database:
+        moved = update_asn_current(country_iso2, list_of_asns)
+        if moved:
+            # Imported here because summaries imports this module
+            from summaries import refresh_moved_asn_summaries
 
-def insert_country_asn_neighbours_to_db(country_iso2, neighbours, save_sql_to_file=False, load_to_database=True):
-    # connection = get_db_connection(PASSWORD)
-    sql = "INSERT INTO data.asn_neighbour (an_asn, an_neighbour, an_date, an_type, an_power, an_v4_peers, an_v6_peers)\n VALUES "
-    for item in neighbours:
-        sql += f"\n({item['asn_req']}, {item['asn']}, '{item['date']}', '{item['type']}', {item['power']}, {item['v4_peers']}, {item['v6_peers']}),"
-    sql = sql[:-1] + ";"
+            refresh_moved_asn_summaries(country_iso2, moved)
+
+
+def insert_country_stats_to_db(country_iso2, resolution, stats, save_sql_to_file=False, load_to_database=True):
+    # Zero counters have always been stored as NULL
+    rows = (
+        (
+            country_iso2,
+            item['timeline'][0]['starttime'],
+            resolution,
+            item['v4_prefixes_ris'] or None,
+            item['v6_prefixes_ris'] or None,
+            item['asns_ris'] or None,
+            item['v4_prefixes_stats'] or None,
+            item['v6_prefixes_stats'] or None,
+            item['asns_stats'] or None,
+        )
+        for item in stats
+    )
+    load_rows(COUNTRY_STAT_TABLE, COUNTRY_STAT_COLUMNS, rows, "country_stats", country_iso2,
+              save_sql_to_file, load_to_database)
 
-    if save_sql_to_file:
-        filename = f"sql/asn_neighbours_{country_iso2}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.sql"
-        with open(filename, 'w') as f:
-            print(sql, file=f)
 
+def insert_country_asn_neighbours_to_db(country_iso2, neighbours, save_sql_to_file=False, load_to_database=True):
     if load_to_database:
-        # print(f'Loading data to the database', end='...')
-        c = get_db_connection()
-        query = text(sql)
-        c.execute(query)
-        c.commit()
-        # print(f'Done')
-
-def insert_traffic_for_country_to_db(country_iso2, traffic, save_sql_to_file=False):
-    # connection = get_db_connection(PASSWORD)
-    sql= "INSERT INTO data.country_traffic(cr_country_iso2, cr_date, cr_traffic)\nVALUES"
-    for timestamp, value in zip(traffic['timestamps'], traffic['values']):
-        sql += f"\n('{country_iso2}', '{timestamp}', {value}),"
-    sql = sql[:-1] + ";"
+        ensure_partitions(ASN_NEIGHBOUR_TABLE, {item['date'] for item in neighbours})
+    rows = (
+        (item['asn_req'], item['asn'], item['date'], item['type'], item['power'], item['v4_peers'], item['v6_peers'])
+        for item in neighbours
+    )
+    load_rows(ASN_NEIGHBOUR_TABLE, ASN_NEIGHBOUR_COLUMNS, rows, "asn_neighbours", country_iso2,
+              save_sql_to_file, load_to_database)
 
-    if save_sql_to_file:
-        filename = "sql/country_traffic_{}_{}.sql".format(country_iso2, datetime.now().strftime('%Y%m%d_%H%M%S'))
-        with open(filename, 'w') as f:
-            print(sql, file=f)
-    # connection.execute(sql)
-
-def insert_internet_quality_for_country_to_db(country_iso2, internet_quality, save_sql_to_file=False):
-    # connection = get_db_connection(PASSWORD)
-    sql= "INSERT INTO data.country_internet_quality(ci_country_iso2, ci_date, ci_p75, ci_p50, ci_p25)\nVALUES"
-    for timestamp, p75, p50, p25 in (
-            zip(internet_quality['timestamps'], internet_quality['p75'], internet_quality['p50'], internet_quality['p25'])):
-        sql += f"\n('{country_iso2}', '{timestamp}', {p75}, {p50}, {p25}),"
-    sql = sql[:-1] + ";"
 
-    if save_sql_to_file:
-        filename = "sql/country_internet_quality_{}_{}.sql".format(country_iso2, datetime.now().strftime('%Y%m%d_%H%M%S'))
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w') as f:
-            print(sql, file=f)
-    # connection.execute(sql)
+def insert_traffic_for_country_to_db(country_iso2, traffic, save_sql_to_file=False, load_to_database=True):
+    rows = (
+        (country_iso2, timestamp, value)
+        for timestamp, value in zip(traffic['timestamps'], traffic['values'])
+    )
+    load_rows(COUNTRY_TRAFFIC_TABLE, COUNTRY_TRAFFIC_COLUMNS, rows, "country_traffic", country_iso2,
+              save_sql_to_file, load_to_database)
+
+
+def insert_internet_quality_for_country_to_db(country_iso2, internet_quality, save_sql_to_file=False,
+                                              load_to_database=True):
+    rows = (
+        (country_iso2, timestamp, p75, p50, p25)
+        for timestamp, p75, p50, p25 in zip(
+            internet_quality['timestamps'], internet_quality['p75'], internet_quality['p50'], internet_quality['p25']
+        )
+    )
+    load_rows(COUNTRY_INTERNET_QUALITY_TABLE, COUNTRY_INTERNET_QUALITY_COLUMNS, rows, "country_internet_quality",
+              country_iso2, save_sql_to_file, load_to_database)
@@ -1,19 +1,40 @@
 import argparse
+import sys
+import yaml
+import load_to_database
 from load_to_database import *
+from response_cache import get_ripe_cache
+from response_archive import flush_response_sinks
+from rate_limiter import get_limiter
+from metrics import registry, summarize, write_metrics
 from country_lists import *
 from etl_jobs import get_internet_quality_for_country
-from datetime import datetime, timedelta
+from extract_from_ripe_api import failed_requests
+from datetime import datetime
+from date_ranges import DateRange, iter_dates
 
 from etl_jobs import (
+    clear_country_asns_memo,
     get_list_of_asns_for_country,
+    get_list_of_asns_for_country_async,
     get_stats_for_country,
     get_list_of_asn_neighbours_for_country,
+    get_list_of_asn_neighbours_for_country_async,
     get_traffic_for_country,
 )
+from async_extract import AsyncExtractor, iterate_async
+from pipeline import run_pipeline
+from replay import REPLAY_WORKERS, run_replay
+from summaries import get_load_dates, refresh_load_summaries, refresh_summaries
 
 CLOUDFLARE_API_TOKEN = os.getenv("OZI_CLOUDFLARE_API_TOKEN")
 
 RESOLUTION_DICT = {"D": "daily", "W": "weekly", "M": "Monthly"}
+# Tasks whose failed RIPE requests can be redone date by date
+PER_DATE_TASKS = ("ASNS", "ASN_NEIGHBOURS", "STATS_1D")
+# Tasks writing to a table partitioned by month
+PARTITIONED_TASK_TABLES = {"ASNS": ASN_TABLE, "ASN_NEIGHBOURS": ASN_NEIGHBOUR_TABLE}
+REQUEUE_DIR = "logs"
 
 
 def main():
@@ -23,33 +44,94 @@ def main():
     parser.add_argument(
         "-t",
         "--task",
-        required=True,
         help="ETL task to perform (e.g., 'asns', 'stats_1d').",
     )
     parser.add_argument(
         "-c",
         "--countries",
-        required=True,
         nargs="+",
         help="List of country ISO2 codes (e.g., 'US', 'DE').",
     )
     parser.add_argument(
-        "-df", "--date-from", required=True, help="Start date in YYYY-MM-DD format."
+        "-df", "--date-from", help="Start date in YYYY-MM-DD format."
     )
     parser.add_argument(
-        "-dt", "--date-to", required=True, help="End date in YYYY-MM-DD format."
+        "-dt", "--date-to", help="End date in YYYY-MM-DD format."
     )
     parser.add_argument(
         "-dr",
         "--date-resolution",
-        required=True,
         help="Required resolution: D - Daily, W - Weekly, M - Monthly",
     )
+    parser.add_argument(
+        "--load-mode",
+        choices=LOAD_MODES,
+        default=LOAD_MODE,
+        help="insert - plain COPY, skip - ignore rows already stored, "
+        "update - overwrite rows already stored (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--skip-loaded",
+        action="store_true",
+        help="Only fetch dates that have no rows in the database yet (ASNS, ASN_NEIGHBOURS, STATS_1D).",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Fetch with the asyncio extractor, many requests in flight from one process (ASNS, ASN_NEIGHBOURS).",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Fetch on a separate thread while the previous batch is stored (ASNS, ASN_NEIGHBOURS).",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="ARCHIVE",
+        help="Load an archive directory or segment of raw responses instead of calling the APIs, and exit.",
+    )
+    parser.add_argument(
+        "--replay-workers",
+        type=int,
+        default=REPLAY_WORKERS,
+        help="Segments replayed in parallel (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--rollback",
+        type=int,
+        metavar="LOAD_ID",
+        help="Delete every row written by the given data.etl_load load and exit.",
+    )
 
     args = parser.parse_args()
+
+    if args.rollback is not None:
+        print(f"{'Rollback:':<12} load {args.rollback}")
+        # The dates have to be read before their rows are gone
+        summary_dates = get_load_dates(args.rollback)
+        rollback_etl_load(args.rollback)
+        refresh_summaries(summary_dates)
+        print(f"{'Finished:':<12} rollback of load {args.rollback}")
+        return
+
+    if args.replay is not None:
+        load_to_database.LOAD_MODE = args.load_mode
+        run_replay(args.replay, " ".join(sys.argv), args.replay_workers)
+        return
+
+    required = ("task", "countries", "date_from", "date_to", "date_resolution")
+    missing = [name for name in required if getattr(args, name) is None]
+    if missing:
+        parser.error(
+            "the following arguments are required: "
+            + ", ".join("--" + name.replace("_", "-") for name in missing)
+        )
+
     task = args.task
     countries = args.countries
     resolution = args.date_resolution
+    load_to_database.LOAD_MODE = args.load_mode
     try:
         date_from = datetime.strptime(args.date_from, "%Y-%m-%d")
         date_to = datetime.strptime(args.date_to, "%Y-%m-%d")
@@ -57,18 +139,6 @@ def main():
         print("Error: Dates must be in YYYY-MM-DD format.")
         return
 
-    if countries[0] == "all":
-        countries = list(ALL_COUNTRIES.keys())
-
-    task_map = {
-        "ASNS": etl_load_asns,
-        "STATS_1D": etl_load_stats_1d,
-        "STATS_5M": etl_load_stats_5m,
-        "ASN_NEIGHBOURS": etl_load_asn_neighbours,
-        "TRAFFIC": etl_load_traffic,
-        "INTERNET_QUALITY": etl_load_internet_quality,
-    }
-
     if task not in task_map:
         print(f"Error: Unknown task '{task}'.")
         return
@@ -77,53 +147,157 @@ def main():
         print(f"Error: Unknown resolution '{resolution}'.")
         return
 
-    dates = generate_dates(date_from, date_to, resolution)
+    run_task(
+        task,
+        countries,
+        date_from,
+        date_to,
+        resolution,
+        skip_loaded=args.skip_loaded,
+        use_async=args.use_async,
+        pipeline=args.pipeline,
+        command=" ".join(sys.argv),
+    )
 
-    for iso2 in countries:
-        date_from_formatted = date_from.strftime("%Y-%m-%d")
-        date_to_formatted = date_to.strftime("%Y-%m-%d")
-        print(f"{'Started:':<12} {task}")
-        print(f"{'At:':<12} {datetime.now()}")
-        print(f"{'Country:':<12} {ALL_COUNTRIES[iso2]}")
-        print(f"{'Date From:':<12} {date_from_formatted}")
-        print(f"{'Date To:':<12} {date_to_formatted}")
-        print(f"{'Resolution:':<12} {RESOLUTION_DICT[resolution]}")
 
-        task_map[task](iso2, dates.copy())
+def run_task(
+    task, countries, date_from, date_to, resolution,
+    skip_loaded=False, use_async=False, pipeline=False, command=None,
+):
+    """Run one ETL task for a list of countries as a single tracked load.
 
-        # task_map[task](iso2, generate_dates(date_from, date_to, resolution))
-        # task_map[task](iso2, date_from, date_to, resolution)
+    This is what the command line runs; etl_scheduler's pool mode calls it
+    directly in long-lived worker processes.
+    """
+    if countries[0] == "all":
+        countries = list(ALL_COUNTRIES.keys())
 
-        print(f"\n{'At:':<12} {datetime.now()}")
-        print(f"{'Finished:':<12} {task}")
+    dates = DateRange(date_from, date_to, resolution)
+
+    load_id = start_etl_load(command or f"run_task {task} {' '.join(countries)} {date_from} {date_to} {resolution}")
+    print(f"{'Load:':<12} {load_id}")
+    status = "failed"
+    requeue = []
+    failed_requests.pop_all()
+    clear_country_asns_memo()
+    registry.reset()
+    try:
+        if task in PARTITIONED_TASK_TABLES:
+            ensure_partitions(PARTITIONED_TASK_TABLES[task], dates)
+        for iso2 in countries:
+            country_dates = dates
+            if skip_loaded:
+                country_dates = remove_loaded_dates(task, iso2, country_dates)
+                if not country_dates:
+                    print(f"{'Skipped:':<12} {task} {iso2}, all dates already loaded")
+                    continue
+
+            date_from_formatted = date_from.strftime("%Y-%m-%d")
+            date_to_formatted = date_to.strftime("%Y-%m-%d")
+            print(f"{'Started:':<12} {task}")
+            print(f"{'At:':<12} {datetime.now()}")
+            print(f"{'Country:':<12} {ALL_COUNTRIES[iso2]}")
+            print(f"{'Date From:':<12} {date_from_formatted}")
+            print(f"{'Date To:':<12} {date_to_formatted}")
+            print(f"{'Resolution:':<12} {RESOLUTION_DICT[resolution]}")
+
+            if (use_async or pipeline) and task in batch_task_map:
+                etl_load_batches(task, iso2, country_dates, use_async=use_async, pipeline=pipeline)
+            else:
+                task_map[task](iso2, country_dates)
+
+            failed = failed_requests.pop_all()
+            if task in PER_DATE_TASKS:
+                mark_loaded_dates(task, iso2, complete_dates(country_dates, failed))
+            if failed:
+                print(f"\n{'Failed:':<12} {len(failed)} RIPE requests gave up after retries")
+                requeue.extend(requeue_tasks(task, iso2, failed, date_from, date_to, resolution))
+
+            print(f"\n{'At:':<12} {datetime.now()}")
+            print(f"{'Finished:':<12} {task}")
+        flush_response_sinks()
+        status = "completed"
+    finally:
+        row_counts = finish_etl_load(status)
+        print(f"{'Load:':<12} {load_id} {status}, rows: {row_counts}")
+        if requeue:
+            print(f"{'Re-queue:':<12} {save_requeue_file(load_id, requeue)}")
+        snapshot = registry.snapshot()
+        print(f"{'Metrics:':<12} {write_metrics(snapshot, f'run_{load_id}_{os.getpid()}', load_id=load_id)}")
+
+    print(f"{'Stage time:':<12} {summarize(snapshot)['seconds']}")
+    refresh_load_summaries(load_id, row_counts)
+    pool_stats = get_pool_stats()
+    print(
+        f"{'DB pool:':<12} {pool_stats['opened']} connections opened, "
+        f"{pool_stats['reused']} reused"
+    )
+    cache = get_ripe_cache()
+    if cache:
+        cache_stats = cache.stats()
+        print(
+            f"{'RIPE cache:':<12} {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']} entries"
+        )
+    rate_stats = get_limiter("cloudflare" if task in ("TRAFFIC", "INTERNET_QUALITY") else "ripe").stats()
+    print(
+        f"{'API rate:':<12} {rate_stats['rate']} req/s, {rate_stats['requests']} requests, "
+        f"{rate_stats['throttled']} throttled"
+    )
+    return row_counts
+
+
+def failed_dates(failed):
+    """YYYY-MM-DD dates of failed RIPE requests; "" stands for a request without a date."""
+    return {str(f["params"].get("query_time") or f["params"].get("starttime", ""))[:10] for f in failed}
+
+
+def complete_dates(dates, failed):
+    """Dates none of the failed requests belonged to; none at all if a failure has no date."""
+    failed = failed_dates(failed)
+    if "" in failed:
+        return []
+    return [date for date in dates if date.strftime("%Y-%m-%d") not in failed]
+
+
+def requeue_tasks(task, iso2, failed, date_from, date_to, resolution):
+    """Job-file tasks redoing the work of one country's failed requests."""
+    if task in PER_DATE_TASKS:
+        dates = sorted(failed_dates(failed) - {""})
+        return [
+            {"task": task, "countries": [iso2], "date-from": date, "date-to": date, "date-resolution": resolution}
+            for date in dates
+        ]
+    return [{
+        "task": task,
+        "countries": [iso2],
+        "date-from": date_from.strftime("%Y-%m-%d"),
+        "date-to": date_to.strftime("%Y-%m-%d"),
+        "date-resolution": resolution,
+    }]
+
+
+def save_requeue_file(load_id, tasks):
+    """Write the tasks as a job YAML that etl_scheduler.py can run."""
+    os.makedirs(REQUEUE_DIR, exist_ok=True)
+    path = os.path.join(REQUEUE_DIR, f"requeue_load_{load_id}.yaml")
+    with open(path, "w") as f:
+        yaml.dump({"TASKS_QUEUE": tasks, "TASKS_DONE": []}, f, default_flow_style=False)
+    return path
 
 
 def generate_dates(date_from, date_to, resolution):
-    dates = []
-    if resolution == "W":
-        date_from += timedelta(days=(7 - date_from.weekday()) % 7)
-    elif resolution == "M":
-        if date_from.day != 1:
-            year = date_from.year + (date_from.month // 12)
-            month = (date_from.month % 12) + 1
-            date_from = datetime(year, month, 1)
-
-    date = date_from
-
-    while date <= date_to:
-        dates.append(date)
-        if resolution == "D":
-            date += timedelta(days=1)
-        elif resolution == "W":
-            date += timedelta(days=7)
-        elif resolution == "M":
-            year = date.year + (date.month // 12)
-            month = (date.month % 12) + 1
-            date = datetime(year, month, 1)
-        else:
-            raise ValueError("Unsupported resolution. Use 'D', 'W', or 'M'.")
-
-    return dates
+    return list(iter_dates(date_from, date_to, resolution))
+
+
+def remove_loaded_dates(task, iso2, dates):
+    dates = list(dates)
+    loaded = get_loaded_dates(task, iso2, dates)
+    if loaded is None:
+        return dates
+    missing = [date for date in dates if date not in loaded]
+    print(f"{'Pre-flight:':<12} {iso2} {len(dates) - len(missing)} of {len(dates)} dates already loaded")
+    return missing
 
 
 def etl_load_asns(iso2, dates):
@@ -170,5 +344,66 @@ def etl_load_internet_quality(iso2, dates):
             iso2, internet_quality, save_sql_to_file=True)
 
 
+task_map = {
+    "ASNS": etl_load_asns,
+    "STATS_1D": etl_load_stats_1d,
+    "STATS_5M": etl_load_stats_5m,
+    "ASN_NEIGHBOURS": etl_load_asn_neighbours,
+    "TRAFFIC": etl_load_traffic,
+    "INTERNET_QUALITY": etl_load_internet_quality,
+}
+
+
+def fetch_asns(iso2, dates):
+    return get_list_of_asns_for_country(iso2, dates, BATCH_SIZE)
+
+
+async def fetch_asns_async(iso2, dates):
+    async with AsyncExtractor() as extractor:
+        async for asns_batch in get_list_of_asns_for_country_async(extractor, iso2, dates, BATCH_SIZE):
+            yield asns_batch
+
+
+def fetch_asn_neighbours(iso2, dates):
+    return get_list_of_asn_neighbours_for_country(iso2, dates, BATCH_SIZE)
+
+
+async def fetch_asn_neighbours_async(iso2, dates):
+    async with AsyncExtractor() as extractor:
+        async for neighbours_batch in get_list_of_asn_neighbours_for_country_async(
+            extractor, iso2, dates, BATCH_SIZE
+        ):
+            yield neighbours_batch
+
+
+# Batch source (sync, async) and sink of the tasks that support --async and --pipeline
+batch_task_map = {
+    "ASNS": (fetch_asns, fetch_asns_async, insert_country_asns_to_db),
+    "ASN_NEIGHBOURS": (fetch_asn_neighbours, fetch_asn_neighbours_async, insert_country_asn_neighbours_to_db),
+}
+
+
+def etl_load_batches(task, iso2, dates, use_async=False, pipeline=False):
+    fetch, fetch_async, insert = batch_task_map[task]
+    print(
+        "Getting data from the API"
+        + (" asynchronously" if use_async else "")
+        + (" and storing to DB in parallel..." if pipeline else " and storing to DB...")
+    )
+    batches = iterate_async(fetch_async(iso2, dates)) if use_async else fetch(iso2, dates)
+    if not pipeline:
+        for batch in batches:
+            insert(iso2, batch)
+        return
+
+    stats = run_pipeline(batches, lambda batch: insert(iso2, batch))
+    print(
+        f"\n{'Pipeline:':<12} {stats['rows']} rows in {stats['batches']} batches, "
+        f"fetch {stats['fetch_rows_per_s']} rows/s, load {stats['load_rows_per_s']} rows/s, "
+        f"queue depth avg {stats['queue_depth_avg']} max {stats['queue_depth_max']}, "
+        f"fetch blocked {stats['fetch_blocked_s']} s, load idle {stats['load_idle_s']} s"
+    )
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,211 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("OZI_METRICS_DIR", "logs/metrics")
+PROMETHEUS_PREFIX = "ozi_etl_"
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": list(buckets), "counts": [0] * len(buckets), "count": 0, "sum": 0.0
+                }
+            histogram["count"] += 1
+            histogram["sum"] += value
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        """Plain-data copy of all metrics, the format written to and merged from JSON files."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": list(h["buckets"]),
+                    "counts": list(h["counts"]),
+                    "count": h["count"],
+                    "sum": h["sum"],
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+
+
+def endpoint_label(url):
+    """Short endpoint name: "asn-neighbours" for RIPEstat, "netflows/timeseries" for Radar."""
+    parts = url.split("?")[0].rstrip("/").split("/")
+    if parts[-1] == "data.json":
+        return parts[-2]
+    return "/".join(parts[-2:])
+
+
+def record_api_response(url, status, latency, size):
+    endpoint = endpoint_label(url)
+    observe("api_request_seconds", latency, endpoint=endpoint)
+    inc("api_requests_total", endpoint=endpoint, status=status)
+    inc("api_response_bytes_total", size, endpoint=endpoint)
+    if status == 429:
+        inc("api_throttled_total", endpoint=endpoint)
+
+
+def merge_snapshots(snapshots):
+    """Add up counters and histograms with the same name and labels."""
+    merged = MetricsRegistry()
+    for snapshot in snapshots:
+        for counter in snapshot["counters"]:
+            merged.inc(counter["name"], counter["value"], **counter["labels"])
+        for h in snapshot["histograms"]:
+            key = (h["name"], _label_key(h["labels"]))
+            with merged._lock:
+                target = merged._histograms.setdefault(
+                    key, {"buckets": list(h["buckets"]), "counts": [0] * len(h["buckets"]), "count": 0, "sum": 0.0}
+                )
+                target["count"] += h["count"]
+                target["sum"] += h["sum"]
+                target["counts"] = [a + b for a, b in zip(target["counts"], h["counts"])]
+    return merged.snapshot()
+
+
+def summarize(snapshot):
+    """Totals that answer "network, CPU or database bound?" for one run or a whole schedule."""
+    seconds = {}
+    for h in snapshot["histograms"]:
+        stage = h["name"].replace("_seconds", "")
+        if h["name"].endswith("_seconds"):
+            seconds[stage] = round(seconds.get(stage, 0) + h["sum"], 3)
+
+    rows = {}
+    for counter in snapshot["counters"]:
+        if counter["name"] == "db_rows_total":
+            table = counter["labels"].get("table")
+            rows[table] = rows.get(table, 0) + counter["value"]
+    copy_seconds = {
+        h["labels"].get("table"): h["sum"] for h in snapshot["histograms"] if h["name"] == "db_copy_seconds"
+    }
+    rows_per_second = {
+        table: round(count / copy_seconds[table]) for table, count in rows.items() if copy_seconds.get(table)
+    }
+
+    latency = {
+        h["labels"]["endpoint"]: round(h["sum"] / h["count"], 3)
+        for h in snapshot["histograms"]
+        if h["name"] == "api_request_seconds" and h["count"]
+    }
+    return {"seconds": seconds, "rows": rows, "db_rows_per_second": rows_per_second, "api_mean_latency": latency}
+
+
+def _prometheus_labels(labels, **extra):
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    rendered = ",".join(f'{name}="{str(value)}"' for name, value in sorted(items.items()))
+    return "{" + rendered + "}"
+
+
+def to_prometheus(snapshot, **const_labels):
+    lines = []
+    typed = set()
+    for counter in snapshot["counters"]:
+        name = PROMETHEUS_PREFIX + counter["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_prometheus_labels({**const_labels, **counter['labels']})} {counter['value']}")
+    for h in snapshot["histograms"]:
+        name = PROMETHEUS_PREFIX + h["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        labels = {**const_labels, **h["labels"]}
+        cumulative = 0
+        for bound, count in zip(h["buckets"], h["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_prometheus_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_prometheus_labels(labels, le='+Inf')} {h['count']}")
+        lines.append(f"{name}_sum{_prometheus_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{_prometheus_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(snapshot, name, directory=None, **const_labels):
+    """Write <name>.json (snapshot plus summary) and <name>.prom for the node_exporter textfile collector.
+
+    const_labels are added to every Prometheus series so files of different
+    runs can sit in one textfile directory without clashing.
+    """
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"{name}.json")
+    _write_atomic(json_path, json.dumps({**snapshot, "summary": summarize(snapshot)}, indent=1))
+    _write_atomic(os.path.join(directory, f"{name}.prom"), to_prometheus(snapshot, **const_labels))
+    return json_path
+
+
+def read_run_snapshots(directory):
+    """Snapshots of every main.py run written into a metrics directory."""
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory, "run_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        snapshots.append({"counters": data["counters"], "histograms": data["histograms"]})
+    return snapshots
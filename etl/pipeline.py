@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+import time
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("OZI_PIPELINE_QUEUE_SIZE", "4"))
+# How long a blocked put waits before checking whether the loader gave up
+PUT_TIMEOUT = 0.5
+
+_DONE = object()
+
+
+class PipelineStats:
+    """Per-stage counters of one run_pipeline call."""
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.fetch_seconds = 0.0
+        self.load_seconds = 0.0
+        self.fetch_blocked_seconds = 0.0
+        self.load_idle_seconds = 0.0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def summary(self):
+        def rate(seconds):
+            return round(self.rows / seconds) if seconds else None
+
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "fetch_rows_per_s": rate(self.fetch_seconds),
+            "load_rows_per_s": rate(self.load_seconds),
+            "fetch_blocked_s": round(self.fetch_blocked_seconds, 1),
+            "load_idle_s": round(self.load_idle_seconds, 1),
+            "queue_depth_avg": round(self.depth_total / self.batches, 1) if self.batches else 0,
+            "queue_depth_max": self.depth_max,
+        }
+
+
+def run_pipeline(batches, load, queue_size=PIPELINE_QUEUE_SIZE):
+    """Fetch batches on a producer thread while the calling thread loads them.
+
+    `batches` is iterated on the producer thread only and `load` is called on
+    the calling thread, so database connections stay where they were. The
+    queue holds at most queue_size batches: a slow database blocks the
+    fetcher (backpressure) instead of buffering the whole crawl in memory.
+    An exception on either side stops both stages and is re-raised here.
+    Returns the PipelineStats summary.
+    """
+    batch_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    stats = PipelineStats()
+    failure = []
+
+    def put(item):
+        started = time.monotonic()
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=PUT_TIMEOUT)
+                break
+            except queue.Full:
+                continue
+        stats.fetch_blocked_seconds += time.monotonic() - started
+
+    def produce():
+        iterator = iter(batches)
+        try:
+            while not stop.is_set():
+                started = time.monotonic()
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    break
+                stats.fetch_seconds += time.monotonic() - started
+                put(batch)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="pipeline-fetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            started = time.monotonic()
+            batch = batch_queue.get()
+            stats.load_idle_seconds += time.monotonic() - started
+            if batch is _DONE:
+                break
+            depth = batch_queue.qsize()
+            stats.depth_total += depth
+            stats.depth_max = max(stats.depth_max, depth)
+
+            started = time.monotonic()
+            load(batch)
+            stats.load_seconds += time.monotonic() - started
+            stats.batches += 1
+            stats.rows += len(batch)
+    finally:
+        stop.set()
+        producer.join()
+
+    if failure:
+        raise failure[0]
+    return stats.summary()
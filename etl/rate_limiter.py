@@ -0,0 +1,206 @@
+import asyncio
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+RIPE_REQUESTS_PER_SECOND = float(os.getenv("OZI_RIPE_REQUESTS_PER_SECOND", "8"))
+RIPE_MAX_REQUESTS_PER_SECOND = float(os.getenv("OZI_RIPE_MAX_REQUESTS_PER_SECOND", "40"))
+RIPE_BACKOFF_SECONDS = float(os.getenv("OZI_RIPE_BACKOFF_SECONDS", "10"))
+CLOUDFLARE_REQUESTS_PER_SECOND = float(os.getenv("OZI_CLOUDFLARE_REQUESTS_PER_SECOND", "2"))
+CLOUDFLARE_MAX_REQUESTS_PER_SECOND = float(os.getenv("OZI_CLOUDFLARE_MAX_REQUESTS_PER_SECOND", "10"))
+CLOUDFLARE_BACKOFF_SECONDS = float(os.getenv("OZI_CLOUDFLARE_BACKOFF_SECONDS", "10"))
+LATENCY_TARGET = float(os.getenv("OZI_RATE_LATENCY_TARGET", "5"))
+# Unix socket of the scheduler's rate coordinator; empty means every process paces itself.
+RATE_COORDINATOR = os.getenv("OZI_RATE_COORDINATOR", "")
+RATE_COORDINATOR_AUTHKEY = b"ozi-rate-coordinator"
+
+# Starting rate, upper bound and default 429 pause per upstream.
+UPSTREAMS = {
+    "ripe": (RIPE_REQUESTS_PER_SECOND, RIPE_MAX_REQUESTS_PER_SECOND, RIPE_BACKOFF_SECONDS),
+    "cloudflare": (CLOUDFLARE_REQUESTS_PER_SECOND, CLOUDFLARE_MAX_REQUESTS_PER_SECOND, CLOUDFLARE_BACKOFF_SECONDS),
+}
+
+
+class AIMDRateLimiter:
+    """Adaptive request rate for one upstream (additive increase, multiplicative decrease).
+
+    reserve() hands out evenly spaced send slots at the current rate and
+    returns how long the caller has to wait for its slot. report() feeds the
+    outcome back: a fast success raises the rate by increase / rate (about
+    `increase` requests/s per second of clean traffic), a 429 multiplies it
+    by `decrease` and pauses every caller, and a slow or 5xx response trims it
+    by 10%. Cuts happen at most once per cooldown, so the 429s of requests
+    that were already in flight count once.
+    """
+
+    def __init__(self, rate, max_rate, backoff_seconds, min_rate=0.5, increase=1.0, decrease=0.5,
+                 latency_target=LATENCY_TARGET, cooldown=1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.backoff_seconds = backoff_seconds
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.requests = 0
+        self.throttled = 0
+        self._latency_total = 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._last_cut = float("-inf")
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + 1.0 / self.rate
+            return slot - now
+
+    def backoff(self, seconds=None):
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + (seconds or self.backoff_seconds))
+            self._next_slot = max(self._next_slot, self._paused_until)
+
+    def report(self, status, latency, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            self._latency_total += latency
+            if status == 429:
+                self.throttled += 1
+                self._paused_until = max(self._paused_until, now + (retry_after or self.backoff_seconds))
+                self._next_slot = max(self._next_slot, self._paused_until)
+                self._cut(now, self.decrease)
+            elif status >= 500 or latency > self.latency_target:
+                self._cut(now, 0.9)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def _cut(self, now, factor):
+        if now - self._last_cut >= self.cooldown:
+            self.rate = max(self.min_rate, self.rate * factor)
+            self._last_cut = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "avg_latency": round(self._latency_total / self.requests, 3) if self.requests else None,
+            }
+
+
+def build_limiter(upstream):
+    rate, max_rate, backoff_seconds = UPSTREAMS[upstream]
+    return AIMDRateLimiter(rate, max_rate, backoff_seconds)
+
+
+# Limiters living in the coordinator process, shared by every worker.
+_coordinator_limiters = {}
+_coordinator_lock = threading.Lock()
+
+
+def _coordinator_limiter(upstream):
+    with _coordinator_lock:
+        if upstream not in _coordinator_limiters:
+            _coordinator_limiters[upstream] = build_limiter(upstream)
+        return _coordinator_limiters[upstream]
+
+
+class RateCoordinator(BaseManager):
+    """Manager process that owns one AIMDRateLimiter per upstream."""
+
+
+RateCoordinator.register(
+    "limiter", callable=_coordinator_limiter, exposed=("reserve", "backoff", "report", "stats")
+)
+
+
+def start_rate_coordinator(address):
+    """Start the coordinator on a Unix socket; workers find it via OZI_RATE_COORDINATOR."""
+    coordinator = RateCoordinator(address=address, authkey=RATE_COORDINATOR_AUTHKEY)
+    coordinator.start()
+    return coordinator
+
+
+def connect_rate_coordinator(address):
+    coordinator = RateCoordinator(address=address, authkey=RATE_COORDINATOR_AUTHKEY)
+    coordinator.connect()
+    return coordinator
+
+
+class HostLimiter:
+    """Client side of a limiter; the limiter is either local or a coordinator proxy."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def acquire(self):
+        wait = self.limiter.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def _call_async(self, method, *args):
+        # A coordinator proxy makes a blocking round trip, keep it off the event loop
+        if isinstance(self.limiter, AIMDRateLimiter):
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def acquire_async(self):
+        wait = await self._call_async(self.limiter.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, seconds=None):
+        self.limiter.backoff(seconds)
+
+    def report(self, status, latency, retry_after=None):
+        self.limiter.report(status, latency, retry_after)
+
+    async def report_async(self, status, latency, retry_after=None):
+        await self._call_async(self.limiter.report, status, latency, retry_after)
+
+    def stats(self):
+        return self.limiter.stats()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_coordinator = None
+
+
+def get_limiter(upstream):
+    """Process-wide limiter for "ripe" or "cloudflare".
+
+    With OZI_RATE_COORDINATOR set the budget is shared with every other
+    worker of the scheduler, otherwise this process paces itself.
+    """
+    global _coordinator
+    if upstream not in _limiters:
+        with _limiters_lock:
+            if upstream not in _limiters:
+                limiter = None
+                if RATE_COORDINATOR:
+                    try:
+                        if _coordinator is None:
+                            _coordinator = connect_rate_coordinator(RATE_COORDINATOR)
+                        limiter = _coordinator.limiter(upstream)
+                    except (OSError, EOFError) as e:
+                        print(f"Rate coordinator at {RATE_COORDINATOR} unavailable ({e}), pacing locally")
+                if limiter is None:
+                    limiter = build_limiter(upstream)
+                _limiters[upstream] = HostLimiter(limiter)
+    return _limiters[upstream]
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header, or None for a missing or HTTP-date value."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
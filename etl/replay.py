@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import load_to_database
+from etl_jobs import parse_asn_neighbours, parse_country_asns
+from load_to_database import (
+    BATCH_SIZE,
+    attach_etl_load,
+    count_loaded_rows,
+    detach_etl_load,
+    finish_etl_load,
+    insert_country_asn_neighbours_to_db,
+    insert_country_asns_to_db,
+    insert_country_stats_to_db,
+    start_etl_load,
+)
+from response_archive import list_segments, read_segment
+from summaries import refresh_load_summaries
+
+REPLAY_WORKERS = int(os.getenv("OZI_REPLAY_WORKERS", str(os.cpu_count() or 4)))
+
+
+def data_call(url):
+    """RIPEstat data call name of an API URL, e.g. "asn-neighbours"."""
+    return url.rstrip("/").split("/")[-2]
+
+
+class SegmentReplayer:
+    """Feeds archived responses through the crawl parsers into the loaders, batching rows like a crawl."""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.asns = {}
+        self.neighbours = []
+        self.skipped = Counter()
+
+    def replay(self, record):
+        d = record["response"]
+        params = record["params"]
+        call = data_call(record["url"])
+        if not d or not d.get("data"):
+            self.skipped[call] += 1
+            return
+
+        if call == "country-asns":
+            iso2 = params["resource"]
+            batch = self.asns.setdefault(iso2, [])
+            batch.extend(parse_country_asns(d, str(params["query_time"])[:10]))
+            if len(batch) >= self.batch_size:
+                insert_country_asns_to_db(iso2, batch)
+                self.asns[iso2] = []
+        elif call == "asn-neighbours":
+            self.neighbours.extend(parse_asn_neighbours(d, params["resource"], str(params["query_time"])[:10]))
+            if len(self.neighbours) >= self.batch_size:
+                insert_country_asn_neighbours_to_db("replay", self.neighbours)
+                self.neighbours = []
+        elif call == "country-resource-stats":
+            stats = d["data"].get("stats")
+            if stats:
+                insert_country_stats_to_db(params["resource"], params["resolution"], stats)
+        else:
+            self.skipped[call] += 1
+
+    def flush(self):
+        for iso2, batch in self.asns.items():
+            if batch:
+                insert_country_asns_to_db(iso2, batch)
+        self.asns = {}
+        if self.neighbours:
+            insert_country_asn_neighbours_to_db("replay", self.neighbours)
+            self.neighbours = []
+
+
+def replay_segment(segment_path, load_id=None, load_mode=None):
+    """Load one archive segment; returns (rows written per table, skipped responses per data call).
+
+    Runs in a replay worker process, so the load is attached here and not
+    started: the parent registered it and adds up the row counts.
+    """
+    if load_mode:
+        load_to_database.LOAD_MODE = load_mode
+    attach_etl_load(load_id)
+    replayer = SegmentReplayer()
+    try:
+        for record in read_segment(segment_path):
+            replayer.replay(record)
+        replayer.flush()
+    finally:
+        row_counts = detach_etl_load()
+    return row_counts, dict(replayer.skipped)
+
+
+def replay_archive(path, load_id=None, workers=REPLAY_WORKERS):
+    """Replay every segment of an archive directory (or a single segment), one segment per worker.
+
+    Returns (rows written per table, skipped responses per data call) summed over all segments.
+    """
+    segments = list_segments(path)
+    row_counts = Counter()
+    skipped = Counter()
+    print(f"{'Replay:':<12} {len(segments)} segments from {path}")
+
+    def add(segment_path, result):
+        segment_rows, segment_skipped = result
+        row_counts.update(segment_rows)
+        skipped.update(segment_skipped)
+        print(f"{'Segment:':<12} {os.path.basename(segment_path)} {segment_rows}")
+
+    if workers <= 1 or len(segments) <= 1:
+        for segment_path in segments:
+            add(segment_path, replay_segment(segment_path, load_id, load_to_database.LOAD_MODE))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments)), mp_context=context) as executor:
+            results = executor.map(
+                replay_segment,
+                segments,
+                [load_id] * len(segments),
+                [load_to_database.LOAD_MODE] * len(segments),
+            )
+            for segment_path, result in zip(segments, results):
+                add(segment_path, result)
+    return dict(row_counts), dict(skipped)
+
+
+def run_replay(path, command, workers=REPLAY_WORKERS):
+    """Replay an archive as one data.etl_load load, like a crawl would have written it."""
+    load_id = start_etl_load(command)
+    # Rows are stamped by the segment replays, each attaching the load itself
+    detach_etl_load()
+    print(f"{'Load:':<12} {load_id}")
+    status = "failed"
+    row_counts = {}
+    try:
+        row_counts, skipped = replay_archive(path, load_id, workers)
+        if skipped:
+            print(f"{'Skipped:':<12} responses without data or loader: {skipped}")
+        status = "completed"
+    finally:
+        attach_etl_load(load_id)
+        for table, row_count in row_counts.items():
+            count_loaded_rows(table, row_count)
+        row_counts = finish_etl_load(status)
+        print(f"{'Load:':<12} {load_id} {status}, rows: {row_counts}")
+    refresh_load_summaries(load_id, row_counts)
+    return row_counts
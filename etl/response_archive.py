@@ -0,0 +1,235 @@
+import atexit
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+ARCHIVE_DIR = os.getenv("OZI_ARCHIVE_DIR", "archive")
+ARCHIVE_SEGMENT_MB = int(os.getenv("OZI_ARCHIVE_SEGMENT_MB", "64"))
+API_RESPONSE_BATCH_SIZE = int(os.getenv("OZI_API_RESPONSE_BATCH_SIZE", "500"))
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+
+# One file per response, written by save_mode="file" before the archive existed:
+# data/ripe_response_<time>_<url and params with punctuation replaced by "_">.json
+LEGACY_PATTERN = "ripe_response_*.json"
+LEGACY_URL = "https://stat.ripe.net/data/{}/data.json"
+LEGACY_CALL = re.compile(r"_data_([a-z-]+)_data_json_")
+LEGACY_PARAM = re.compile(
+    r"_(resource|query_time|starttime|endtime|resolution|lod)_{2,3}([A-Za-z0-9-]+(?:T\d\d_\d\d(?:_\d\d)?)?)"
+)
+LEGACY_DATETIME = re.compile(r"\d{4}-\d\d-\d\dT")
+
+_archive = None
+_sink = None
+_singleton_lock = threading.Lock()
+
+
+def archive_record(url, params, response):
+    return {
+        "url": url,
+        "params": params,
+        "fetched": datetime.now().isoformat(),
+        "response": response,
+    }
+
+
+class ResponseArchive:
+    """Appends API responses to rotating gzip-compressed JSON-lines segments.
+
+    Every record is its own gzip member, so a segment is a valid .jsonl.gz
+    file for zcat and gzip.open, and a single record can be read back by
+    offset. Next to each segment an index file has one JSON line per record
+    with url, params, offset and length. Segments are named after the
+    process id, so several processes can archive into one directory.
+    """
+
+    def __init__(self, directory, max_bytes, prefix="ripe"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.records = 0
+        self._sequence = 0
+        self._segment = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._sequence:04d}"
+        self.segment_path = os.path.join(self.directory, name + SEGMENT_SUFFIX)
+        self._segment = open(self.segment_path, "ab")
+        self._index = open(self.segment_path + INDEX_SUFFIX, "a", encoding="utf-8")
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    def append(self, url, params, response):
+        line = json.dumps(archive_record(url, params, response), separators=(",", ":"), default=str) + "\n"
+        member = gzip.compress(line.encode("utf-8"))
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            offset = self._segment.tell()
+            self._segment.write(member)
+            self._segment.flush()
+            entry = {"url": url, "params": params, "offset": offset, "length": len(member)}
+            self._index.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+            self._index.flush()
+            self.records += 1
+            if offset + len(member) >= self.max_bytes:
+                self._close_segment()
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+
+def list_segments(path):
+    """Segment files of an archive directory, oldest first, or [path] for a single segment.
+
+    A directory holding legacy response files is listed as one more segment of its own.
+    """
+    if os.path.isdir(path):
+        segments = sorted(glob.glob(os.path.join(path, "*" + SEGMENT_SUFFIX)))
+        if glob.glob(os.path.join(path, LEGACY_PATTERN)):
+            segments.append(path)
+        return segments
+    return [path]
+
+
+def legacy_record(path):
+    """Rebuild the archive record of a legacy response file, or None if its name has no data call.
+
+    The file only holds the response. The URL and parameters are read back from
+    the file name, which keeps them intact for the calls the extractors make.
+    """
+    name = os.path.basename(path)
+    call = LEGACY_CALL.search(name)
+    if not call:
+        return None
+    params = {}
+    for key, value in LEGACY_PARAM.findall(name):
+        if LEGACY_DATETIME.match(value):
+            value = value.replace("_", ":")
+        params[key] = int(value) if value.isdigit() else value
+    with open(path, encoding="utf-8") as f:
+        response = json.load(f)
+    return {"url": LEGACY_URL.format(call.group(1)), "params": params, "fetched": None, "response": response}
+
+
+def read_legacy_files(directory):
+    """Yield the records of the legacy response files of a directory, in file name (fetch time) order."""
+    for path in sorted(glob.glob(os.path.join(directory, LEGACY_PATTERN))):
+        try:
+            record = legacy_record(path)
+        except (OSError, json.JSONDecodeError):
+            record = None
+        if record is None:
+            print(f"Legacy response file {path} cannot be read, skipping it")
+            continue
+        yield record
+
+
+def read_segment(segment_path):
+    """Yield the records of one segment; a member cut short by a crash ends the segment."""
+    if os.path.isdir(segment_path):
+        yield from read_legacy_files(segment_path)
+        return
+    if segment_path.endswith(".json"):
+        record = legacy_record(segment_path)
+        if record:
+            yield record
+        return
+    with gzip.open(segment_path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            print(f"Archive segment {segment_path} is truncated, stopping at the last complete record")
+
+
+def read_archive(path):
+    for segment_path in list_segments(path):
+        yield from read_segment(segment_path)
+
+
+def read_index(segment_path):
+    with open(segment_path + INDEX_SUFFIX, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def read_record(segment_path, offset, length):
+    """Read a single record using the offset and length from the index."""
+    with open(segment_path, "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))
+
+
+class ApiResponseSink:
+    """Buffers responses and bulk-loads them into source.api_response."""
+
+    def __init__(self, batch_size=API_RESPONSE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._records = []
+        self._lock = threading.Lock()
+
+    def append(self, url, params, response):
+        with self._lock:
+            self._records.append(archive_record(url, params, response))
+            if len(self._records) < self.batch_size:
+                return
+            records, self._records = self._records, []
+        self._load(records)
+
+    def flush(self):
+        with self._lock:
+            records, self._records = self._records, []
+        if records:
+            self._load(records)
+
+    def _load(self, records):
+        # Imported here so the archive can be read without database drivers
+        from load_to_database import insert_api_responses_to_db
+
+        insert_api_responses_to_db(records)
+
+    def close(self):
+        self.flush()
+
+
+def get_response_archive():
+    """Process-wide archive in OZI_ARCHIVE_DIR, closed at exit."""
+    global _archive
+    if _archive is None:
+        with _singleton_lock:
+            if _archive is None:
+                _archive = ResponseArchive(ARCHIVE_DIR, ARCHIVE_SEGMENT_MB * 1024 * 1024)
+                atexit.register(_archive.close)
+    return _archive
+
+
+def get_api_response_sink():
+    """Process-wide source.api_response sink, flushed at exit."""
+    global _sink
+    if _sink is None:
+        with _singleton_lock:
+            if _sink is None:
+                _sink = ApiResponseSink()
+                atexit.register(_sink.close)
+    return _sink
+
+
+def flush_response_sinks():
+    """Write buffered source.api_response rows now, e.g. before a load is finished."""
+    if _sink is not None:
+        _sink.flush()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+# Anchored to this directory so the cache does not follow the working directory around
+RIPE_CACHE_PATH = os.getenv(
+    "OZI_RIPE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ripe_responses.sqlite")
+)
+RIPE_CACHE_MAX_MB = int(os.getenv("OZI_RIPE_CACHE_MAX_MB", "2048"))
+
+# Parameters holding the point in time a RIPEstat query is about.
+HISTORICAL_PARAMS = ("query_time", "endtime")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def canonical_params(params):
+    return json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(url, params):
+    return hashlib.sha256(f"{url}?{canonical_params(params)}".encode("utf-8")).hexdigest()
+
+
+def is_historical(params, today=None):
+    """True if the query is about a day before today, so its answer can no longer change."""
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    for name in HISTORICAL_PARAMS:
+        value = (params or {}).get(name)
+        if value:
+            return str(value)[:10] < today
+    return False
+
+
+class ResponseCache:
+    """SQLite-backed, zlib-compressed API response cache with LRU eviction by size."""
+
+    def __init__(self, path, max_bytes):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS response ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, params TEXT NOT NULL,"
+            " body BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_response_accessed ON response (accessed)")
+        self._db.commit()
+        self._size = self._total_size()
+
+    def _total_size(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM response").fetchone()[0]
+
+    def get(self, url, params):
+        key = cache_key(url, params)
+        with self._lock:
+            row = self._db.execute("SELECT body FROM response WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE response SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, params, data):
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        key = cache_key(url, params)
+        with self._lock:
+            # INSERT OR REPLACE drops the row it replaces, so its size no longer counts
+            replaced = self._db.execute("SELECT size FROM response WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO response (key, url, params, body, size, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, canonical_params(params), body, len(body), time.time()),
+            )
+            self._db.commit()
+            self._size += len(body) - (replaced[0] if replaced else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may share the file, so re-read the real size first.
+        self._size = self._total_size()
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM response ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM response WHERE key = ?", evicted)
+        self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM response").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self._size}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def get_ripe_cache():
+    """Process-wide RIPEstat cache, or None when OZI_RIPE_CACHE_PATH is empty."""
+    global _cache
+    if not RIPE_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(RIPE_CACHE_PATH, RIPE_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
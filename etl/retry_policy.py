@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from metrics import inc
+from rate_limiter import parse_retry_after
+
+RETRY_BASE_SECONDS = float(os.getenv("OZI_RETRY_BASE_SECONDS", "1"))
+RETRY_MAX_SECONDS = float(os.getenv("OZI_RETRY_MAX_SECONDS", "60"))
+BREAKER_THRESHOLD = int(os.getenv("OZI_BREAKER_THRESHOLD", "20"))
+BREAKER_RESET_SECONDS = float(os.getenv("OZI_BREAKER_RESET_SECONDS", "60"))
+
+
+def retry_after_from(error):
+    """Retry-After of the HTTP response attached to an exception, if any.
+
+    requests errors carry the response, aiohttp's ClientResponseError only its headers.
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else getattr(error, "headers", None)
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+def status_from(error):
+    """HTTP status of the response behind an exception, if any (requests or aiohttp)."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return getattr(response, "status_code", None)
+    return getattr(error, "status", None)
+
+
+def is_retryable(error):
+    """Client errors other than 408 and 429 fail the same way every time, so they are not retried."""
+    status = status_from(error)
+    return status is None or not 400 <= status < 500 or status in (408, 429)
+
+
+class CircuitBreaker:
+    """Stops all callers after `threshold` consecutive failures.
+
+    While open, wait_time() tells callers how long to hold off. After
+    reset_seconds the breaker lets requests through again (half-open); the
+    first success closes it, another failure re-opens it straight away.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS, on_open=None):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.on_open = on_open
+        self.failures = 0
+        self.opened = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait_time(self):
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            now = time.monotonic()
+            if now < self._open_until:
+                return
+            self._open_until = now + self.reset_seconds
+            self.opened += 1
+        inc("api_breaker_opened_total")
+        print(f"\n{self.failures} consecutive failures, pausing all requests for {self.reset_seconds:.0f} s")
+        if self.on_open:
+            self.on_open(self.reset_seconds)
+
+
+class RetryPolicy:
+    """Retries a call with exponential backoff and full jitter.
+
+    The delay before retry n is uniform in [0, min(max_delay, base * 2**n)],
+    or the server's Retry-After if that is longer. 4xx responses other than
+    408 and 429 are not retried. With a breaker attached, every attempt
+    first waits for the breaker and reports its outcome to it.
+    call() sleeps, acall() awaits a coroutine function and sleeps with
+    asyncio.sleep. When all attempts fail the last exception is raised.
+    """
+
+    def __init__(self, attempts, base_delay=RETRY_BASE_SECONDS, max_delay=RETRY_MAX_SECONDS, breaker=None, name="api"):
+        self.attempts = attempts
+        self.name = name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+
+    def delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _failed(self, attempt, error):
+        """Report a failed attempt; returns the delay before the next one, or None to give up.
+
+        Permanent client errors give up at once and do not count towards the breaker.
+        """
+        print(f"\nError during API request: {error}")
+        if not is_retryable(error):
+            print("... STOP, not retryable")
+            inc("api_given_up_total", upstream=self.name)
+            return None
+        if self.breaker:
+            self.breaker.record_failure()
+        attempts_left = self.attempts - attempt - 1
+        if attempts_left <= 0:
+            print("... STOP")
+            inc("api_given_up_total", upstream=self.name)
+            return None
+        print(f"... RETRYING ({attempts_left} attempts left)")
+        inc("api_retries_total", upstream=self.name)
+        return self.delay(attempt, retry_after_from(error))
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.attempts):
+            if self.breaker:
+                time.sleep(self.breaker.wait_time())
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if self.breaker:
+                self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, *args, **kwargs):
+        for attempt in range(self.attempts):
+            if self.breaker:
+                await asyncio.sleep(self.breaker.wait_time())
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if self.breaker:
+                self.breaker.record_success()
+            return result
+
+
+class FailedRequests:
+    """Requests that were given up on, so the work can be re-queued later."""
+
+    def __init__(self):
+        self._failed = []
+        self._lock = threading.Lock()
+
+    def record(self, url, params, error):
+        with self._lock:
+            self._failed.append({"url": url, "params": dict(params or {}), "error": str(error)})
+
+    def pop_all(self):
+        with self._lock:
+            failed, self._failed = self._failed, []
+        return failed
@@ -0,0 +1,94 @@
+from sqlalchemy import text
+
+from load_to_database import (
+    ASN_NEIGHBOUR_TABLE,
+    COUNTRY_INTERNET_QUALITY_TABLE,
+    COUNTRY_STAT_TABLE,
+    COUNTRY_TRAFFIC_TABLE,
+    db_transaction,
+    get_db_connection,
+)
+from metrics import timer
+
+# (date, country) pairs a load wrote to each fact table that has summaries. Neighbour
+# rows count for the current country of their ASN, which is what the summaries group by.
+SUMMARY_SCOPE_QUERIES = {
+    ASN_NEIGHBOUR_TABLE: (
+        "SELECT DISTINCT n.an_date, c.c_iso2 FROM data.asn_neighbour n"
+        " JOIN data.asn_current ac ON ac.ac_asn = n.an_asn JOIN data.country c ON c.c_id = ac.ac_country_id"
+        " WHERE n.load_id = :load_id"
+    ),
+    COUNTRY_STAT_TABLE: (
+        "SELECT DISTINCT date_trunc('day', cs_stats_timestamp), cs_country_iso2 FROM data.country_stat"
+        " WHERE load_id = :load_id"
+    ),
+    COUNTRY_TRAFFIC_TABLE: (
+        "SELECT DISTINCT date_trunc('day', cr_date), cr_country_iso2 FROM data.country_traffic"
+        " WHERE load_id = :load_id"
+    ),
+    COUNTRY_INTERNET_QUALITY_TABLE: (
+        "SELECT DISTINCT date_trunc('day', ci_date), ci_country_iso2 FROM data.country_internet_quality"
+        " WHERE load_id = :load_id"
+    ),
+}
+# Dates the connectivity index has rows of some ASNs for, on either side of a neighbour pair
+MOVED_ASN_DATES_QUERY = (
+    "SELECT DISTINCT an_date FROM data.asn_neighbour"
+    " WHERE an_asn = ANY(CAST(:asns AS bigint[])) OR an_neighbour = ANY(CAST(:asns AS bigint[]))"
+)
+# SQL functions recomputing the summaries of a table for lists of dates and countries
+SUMMARY_REFRESHES = {
+    ASN_NEIGHBOUR_TABLE: ("data.refresh_connectivity_index",),
+    COUNTRY_STAT_TABLE: ("data.refresh_country_stat_rollups",),
+    COUNTRY_TRAFFIC_TABLE: ("data.refresh_country_traffic_rollups",),
+    COUNTRY_INTERNET_QUALITY_TABLE: ("data.refresh_country_internet_quality_rollups",),
+}
+
+
+def get_load_dates(load_id, tables=None):
+    """Dates and countries each summarised table has rows of the load for, found through the load_id indexes.
+
+    Returns {table: (sorted dates, sorted countries)}.
+    """
+    scopes = {}
+    with get_db_connection() as c:
+        for table in tables or SUMMARY_SCOPE_QUERIES:
+            rows = list(c.execute(text(SUMMARY_SCOPE_QUERIES[table]), {"load_id": load_id}))
+            scopes[table] = (sorted({row[0] for row in rows}), sorted({row[1] for row in rows}))
+    return scopes
+
+
+def refresh_summaries(scopes):
+    """Recompute the summaries of the given dates and countries; each function runs in its own transaction."""
+    for table, (dates, countries) in scopes.items():
+        if not dates or not countries:
+            continue
+        params = {"dates": dates, "countries": countries}
+        for function in SUMMARY_REFRESHES[table]:
+            with timer("summary_refresh_seconds", function=function):
+                with db_transaction() as c:
+                    c.execute(
+                        text(f"SELECT {function}(CAST(:dates AS timestamp[]), CAST(:countries AS varchar[]))"),
+                        params,
+                    )
+            print(f"{'Summary:':<12} {function} refreshed for {len(dates)} dates of {len(countries)} countries")
+
+
+def refresh_load_summaries(load_id, row_counts):
+    """Post-load hook: refresh the summaries of the dates and countries a load wrote rows for."""
+    tables = [table for table in SUMMARY_REFRESHES if row_counts and row_counts.get(table)]
+    if tables:
+        refresh_summaries(get_load_dates(load_id, tables))
+
+
+def refresh_moved_asn_summaries(country_iso2, moved):
+    """Recompute the connectivity index after ASNs moved to country_iso2; moved is {asn: previous country}.
+
+    Their own rows and the foreign/local split of their neighbours change in the
+    old and the new country, on every date they have neighbour rows for.
+    """
+    with get_db_connection() as c:
+        dates = sorted(row[0] for row in c.execute(text(MOVED_ASN_DATES_QUERY), {"asns": sorted(moved)}))
+    countries = sorted(set(moved.values()) | {country_iso2})
+    print(f"{'Moved:':<12} {len(moved)} ASNs to {country_iso2} from {', '.join(sorted(set(moved.values())))}")
+    refresh_summaries({ASN_NEIGHBOUR_TABLE: (dates, countries)})
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+
+import yaml
+
+SNAPSHOT_INTERVAL = float(os.getenv("OZI_SCHEDULER_SNAPSHOT_SECONDS", "60"))
+
+
+def task_key(task):
+    """Stable identity of a TASKS_QUEUE entry, independent of key order."""
+    return json.dumps(task, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def journal_path(config_file):
+    return f"{config_file}.journal"
+
+
+def read_journal(path):
+    """Yield the records of a journal file; a torn last line from a crash is ignored."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
+
+
+def write_yaml_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        yaml.dump(data, f, default_flow_style=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class TaskJournal:
+    """Append-only record of finished scheduler tasks next to the job YAML.
+
+    record() appends one fsync'ed JSON line per finished task and updates the
+    in-memory queue; the YAML file itself is only rewritten, atomically, as a
+    compacted snapshot every snapshot_interval seconds and on close(). On
+    startup the journal left by an interrupted run is replayed, so tasks that
+    already finished are not queued again.
+    """
+
+    def __init__(self, config_file, config, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.config_file = config_file
+        self.path = journal_path(config_file)
+        self.snapshot_interval = snapshot_interval
+        self._config = config
+        self._queue = {task_key(task): task for task in config.get("TASKS_QUEUE") or []}
+        self._done = list(config.get("TASKS_DONE") or [])
+        self._lock = threading.Lock()
+
+        replayed = 0
+        for record in read_journal(self.path):
+            replayed += self._apply(record)
+        self.replayed = replayed
+        if replayed:
+            # Fold the previous run into the YAML before starting a fresh journal.
+            self.snapshot()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._last_snapshot = time.monotonic()
+
+    def _apply(self, record):
+        if self._queue.pop(record["key"], None) is None:
+            return 0
+        self._done.append(record["task_done"])
+        return 1
+
+    def pending(self):
+        with self._lock:
+            return list(self._queue.values())
+
+    def record(self, task, done_task):
+        record = {"key": task_key(task), "task_done": done_task}
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(record)
+            due = time.monotonic() - self._last_snapshot >= self.snapshot_interval
+        if due:
+            self.snapshot()
+
+    def to_config(self):
+        config = dict(self._config)
+        config["TASKS_QUEUE"] = list(self._queue.values())
+        config["TASKS_DONE"] = list(self._done)
+        return config
+
+    def snapshot(self):
+        with self._lock:
+            write_yaml_atomic(self.config_file, self.to_config())
+            self._last_snapshot = time.monotonic()
+
+    def close(self):
+        """Write the final snapshot and drop the journal it now contains."""
+        self.snapshot()
+        with self._lock:
+            self._file.close()
+            os.remove(self.path)
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from country_lists import ALL_COUNTRIES
+from date_ranges import iter_dates
+from load_to_database import LOADED_DATE_TASKS, get_asn_counts_from_db
+
+# Keys of a coarse task that only steer splitting and are not passed to main.py.
+SPLIT_KEYS = ("split",)
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def get_unit_weights(countries, date_from, date_to):
+    """ASN count per (country, date) from data.asn, or {} when the database is unreachable."""
+    try:
+        return get_asn_counts_from_db(countries, date_from, date_to)
+    except SQLAlchemyError as e:
+        print(f"Could not read ASN counts for task splitting ({e}), weighting all units equally")
+        return {}
+
+
+def split_task(task, weights=None):
+    """Expand a coarse task into one unit per (country, date), heaviest first.
+
+    Returns a list of (weight, unit) pairs. A unit is an ordinary task with
+    a single country and date-from == date-to. Its weight is the number of
+    ASNs the country had on that date. Dates that are not in data.asn yet get
+    the country's average, and countries without any data get 1.
+    """
+    countries = task["countries"]
+    if countries[0] == "all":
+        countries = list(ALL_COUNTRIES.keys())
+    date_from = datetime.strptime(task["date-from"], DATE_FORMAT)
+    date_to = datetime.strptime(task["date-to"], DATE_FORMAT)
+    if weights is None:
+        weights = get_unit_weights(countries, date_from, date_to)
+
+    country_totals = {}
+    for (iso2, _), count in weights.items():
+        total, days = country_totals.get(iso2, (0, 0))
+        country_totals[iso2] = (total + count, days + 1)
+
+    base = {name: value for name, value in task.items() if name not in SPLIT_KEYS}
+    units = []
+    for iso2 in countries:
+        total, days = country_totals.get(iso2, (1, 1))
+        default_weight = max(1, total // days)
+        for date in iter_dates(date_from, date_to, task["date-resolution"]):
+            unit = dict(base)
+            unit["countries"] = [iso2]
+            unit["date-from"] = unit["date-to"] = date.strftime(DATE_FORMAT)
+            units.append((weights.get((iso2, date), default_weight), unit))
+    # Longest processing time first: big units start early, small ones fill the gaps at the end.
+    units.sort(key=lambda pair: pair[0], reverse=True)
+    return units
+
+
+def expand_tasks(tasks, split=True):
+    """Replace every task marked `split: true` by its weighted units.
+
+    Unsplit tasks keep their position at the front of the queue, the units of
+    all split tasks follow in one LPT-ordered block so workers that run out of
+    work pick up the remaining heaviest units. With split=False the tasks are
+    returned as they are. Only tasks that load per date are split: the others
+    fetch the same whole range for every date they get. Returns (tasks, split_count).
+    """
+    kept = []
+    units = []
+    split_count = 0
+    for task in tasks:
+        if split and task.get("split") and task["task"] not in LOADED_DATE_TASKS:
+            print(f"Task {task['task']} does not load per date, running it unsplit")
+            kept.append(task)
+        elif split and task.get("split"):
+            units.extend(split_task(task))
+            split_count += 1
+        else:
+            kept.append(task)
+    units.sort(key=lambda pair: pair[0], reverse=True)
+    return kept + [unit for _, unit in units], split_count
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime
+
+from aiohttp import web
+
+import async_extract
+from async_extract import AsyncExtractor, iterate_async
+from etl_jobs import get_list_of_asn_neighbours_for_country_async, resolve_country_asns_async
+from rate_limiter import AIMDRateLimiter, HostLimiter
+
+
+def fast_limiter(upstream):
+    return HostLimiter(AIMDRateLimiter(1000, 1000, 1))
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/data.json", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/data.json"
+
+
+def test_semaphore_bounds_requests_in_flight(monkeypatch):
+    monkeypatch.setattr(async_extract, "get_limiter", fast_limiter)
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.02)
+        in_flight["now"] -= 1
+        return web.json_response({"data": {"resource": request.query["resource"]}})
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            async with AsyncExtractor(concurrency=5) as extractor:
+                return await asyncio.gather(
+                    *(extractor.ripe_api_call(url, {"resource": str(i)}) for i in range(30))
+                )
+        finally:
+            await runner.cleanup()
+
+    results = asyncio.run(run())
+    assert [d["data"]["resource"] for d in results] == [str(i) for i in range(30)]
+    assert in_flight["max"] == 5
+
+
+def test_neighbours_crawl_keeps_sync_order(monkeypatch):
+    date = datetime(2025, 1, 1)
+    monkeypatch.setattr("etl_jobs.get_country_asns_from_db", lambda country, dates: {date: [3, 1, 2]})
+
+    class FakeExtractor:
+        async def get_asn_neighbours(self, asn, date):
+            await asyncio.sleep(0.01 * asn)
+            return {"data": {"neighbours": [{"asn": asn * 10}]}}
+
+    async def run():
+        return [
+            batch
+            async for batch in get_list_of_asn_neighbours_for_country_async(
+                FakeExtractor(), "CZ", [date], 1000, verbose=False
+            )
+        ]
+
+    batches = asyncio.run(run())
+    assert [(row["asn_req"], row["asn"]) for row in batches[0]] == [(3, 30), (1, 10), (2, 20)]
+
+
+def test_unknown_asn_lists_are_fetched_through_the_extractor(monkeypatch):
+    stored, missing = datetime(2025, 2, 1), datetime(2025, 2, 8)
+    monkeypatch.setattr("etl_jobs.get_country_asns_from_db", lambda country, dates: {stored: [10]})
+    monkeypatch.setattr("etl_jobs.get_country_asns", None)
+
+    class FakeExtractor:
+        async def get_country_asns(self, country_iso2, date):
+            return {"data": {"countries": [{"routed": "{AsnSingle(30)}", "non_routed": "{AsnSingle(40)}"}]}}
+
+    asns = asyncio.run(resolve_country_asns_async(FakeExtractor(), "MN", [stored, missing]))
+
+    assert asns == {stored: [10], missing: [30, 40]}
+
+
+def test_iterate_async_drives_async_generator():
+    closed = []
+
+    async def numbers():
+        try:
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield i
+        finally:
+            closed.append(True)
+
+    assert list(iterate_async(numbers())) == [0, 1, 2]
+    assert closed == [True]
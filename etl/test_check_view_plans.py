@@ -0,0 +1,36 @@
+from check_view_plans import offending_scans, parent_table, seq_scans
+
+PLAN = {
+    "Node Type": "Aggregate",
+    "Plans": [
+        {
+            "Node Type": "Append",
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "asn_y2025m05"},
+                {"Node Type": "Index Scan", "Relation Name": "asn_y2025m06", "Index Name": "asn_y2025m06_a_date_idx"},
+            ],
+        },
+        {
+            "Node Type": "Result",
+            "Subplan Name": "SubPlan 1",
+            "Plans": [{"Node Type": "Seq Scan", "Relation Name": "country"}],
+        },
+    ],
+}
+
+
+def test_seq_scans_include_partitions_and_subplans():
+    assert sorted(seq_scans(PLAN)) == ["asn_y2025m05", "country"]
+
+
+def test_partitions_map_to_their_table():
+    assert parent_table("asn_neighbour_y2025m05") == "asn_neighbour"
+    assert parent_table("country_stat") == "country_stat"
+
+
+def test_only_large_checked_tables_fail():
+    estimates = {"asn_y2025m05": 50000, "country": 250}
+
+    assert offending_scans(PLAN, ("asn", "country"), estimates, min_rows=10000) == ["asn_y2025m05"]
+    assert offending_scans(PLAN, ("asn_neighbour",), estimates, min_rows=10000) == []
+    assert offending_scans(PLAN, ("asn",), estimates, min_rows=100000) == []
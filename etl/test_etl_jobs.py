@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock, ANY
 from datetime import datetime
 
 from main import (
+    complete_dates,
     etl_load_asns,
     etl_load_stats_1d,
     etl_load_stats_5m,
@@ -11,6 +12,9 @@ from main import (
     etl_load_internet_quality,
 )
 
+import etl_jobs
+from date_ranges import DateRange, iter_dates
+
 MODULE_DB = "main"
 MODULE_JOBS = "main"
 
@@ -109,5 +113,134 @@ class TestETLJobs(unittest.TestCase):
         )
 
 
+class TestNeighbourFetcher(unittest.TestCase):
+    def setUp(self):
+        etl_jobs._country_asns_memo.clear()
+
+    @patch("etl_jobs.get_country_asns_from_db", return_value={})
+    @patch("etl_jobs.get_asn_neighbours")
+    @patch("etl_jobs.get_country_asns")
+    def test_concurrent_fetch_keeps_asn_order(self, mock_get_asns, mock_get_neighbours, mock_db):
+        date = datetime(2023, 1, 1)
+        routed = ", ".join(f"AsnSingle({asn})" for asn in range(1, 21))
+        mock_get_asns.return_value = {"data": {"countries": [{"routed": f"{{{routed}}}", "non_routed": "{}"}]}}
+        mock_get_neighbours.side_effect = lambda asn, d: {
+            "data": {"neighbours": [{"asn": int(asn) * 100}]}
+        }
+
+        batches = list(
+            etl_jobs.get_list_of_asn_neighbours_for_country(
+                "RU", [date], 8, verbose=False, concurrency=4
+            )
+        )
+
+        self.assertEqual([len(batch) for batch in batches], [8, 8, 4])
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual([row["asn_req"] for row in rows], list(range(1, 21)))
+        self.assertEqual(rows[0], {"asn": 100, "asn_req": 1, "date": "2023-01-01"})
+
+    @patch("etl_jobs.get_country_asns")
+    @patch("etl_jobs.get_country_asns_from_db")
+    def test_resolve_country_asns_prefers_database(self, mock_db, mock_get_asns):
+        stored_date, missing_date = datetime(2023, 1, 1), datetime(2023, 1, 8)
+        mock_db.return_value = {stored_date: [10, 20]}
+        mock_get_asns.return_value = {"data": {"countries": [{"routed": "{AsnSingle(30)}", "non_routed": "{}"}]}}
+
+        asns = etl_jobs.resolve_country_asns("KG", [stored_date, missing_date])
+
+        self.assertEqual(asns, {stored_date: [10, 20], missing_date: [30]})
+        mock_db.assert_called_once_with("KG", [stored_date, missing_date])
+        mock_get_asns.assert_called_once_with("KG", missing_date, save_mode=None)
+
+        etl_jobs.resolve_country_asns("KG", [stored_date, missing_date])
+        self.assertEqual(mock_db.call_count, 1)
+        self.assertEqual(mock_get_asns.call_count, 1)
+
+    @patch("etl_jobs.get_country_asns")
+    @patch("etl_jobs.get_country_asns_from_db", return_value={})
+    def test_failed_country_asns_calls_are_not_memoised(self, mock_db, mock_get_asns):
+        date = datetime(2023, 1, 1)
+        mock_get_asns.return_value = None
+
+        self.assertEqual(etl_jobs.resolve_country_asns("KG", [date]), {date: []})
+
+        mock_get_asns.return_value = {"data": {"countries": [{"routed": "{AsnSingle(30)}", "non_routed": "{}"}]}}
+        self.assertEqual(etl_jobs.resolve_country_asns("KG", [date]), {date: [30]})
+        self.assertEqual(mock_get_asns.call_count, 2)
+
+        etl_jobs.clear_country_asns_memo()
+        self.assertEqual(etl_jobs._country_asns_memo, {})
+
+
+class TestCountryAsnsParser(unittest.TestCase):
+    def test_parse_country_asns(self):
+        d = {
+            "data": {
+                "countries": [
+                    {
+                        "routed": "{AsnSingle(3216), AsnRange(100-200), AsnSingle(8359)}",
+                        "non_routed": "{AsnSingle(65000)}",
+                    }
+                ]
+            }
+        }
+
+        self.assertEqual(
+            list(etl_jobs.parse_country_asns(d, "2024-01-01")),
+            [(3216, "2024-01-01", True), (8359, "2024-01-01", True), (65000, "2024-01-01", False)],
+        )
+
+    def test_parse_country_asns_empty_lists(self):
+        d = {"data": {"countries": [{"routed": "{}", "non_routed": "{}"}]}}
+        self.assertEqual(list(etl_jobs.parse_country_asns(d, "2024-01-01")), [])
+
+
+class TestDateRange(unittest.TestCase):
+    def test_len_matches_iteration(self):
+        for resolution in ("D", "W", "M"):
+            for date_to in (datetime(2023, 1, 1), datetime(2023, 3, 31), datetime(2024, 12, 31)):
+                dates = DateRange(datetime(2023, 1, 1), date_to, resolution)
+                self.assertEqual(len(dates), len(list(dates)), (resolution, date_to))
+
+    def test_weekly_and_monthly_alignment(self):
+        self.assertEqual(
+            list(DateRange(datetime(2023, 1, 4), datetime(2023, 1, 20), "W")),
+            [datetime(2023, 1, 9), datetime(2023, 1, 16)],
+        )
+        self.assertEqual(
+            list(DateRange(datetime(2023, 1, 15), datetime(2023, 3, 1), "M")),
+            [datetime(2023, 2, 1), datetime(2023, 3, 1)],
+        )
+
+    def test_unbounded_range_is_lazy(self):
+        dates = iter_dates(datetime(2023, 1, 1), None, "D")
+        self.assertEqual(next(dates), datetime(2023, 1, 1))
+        self.assertEqual(next(dates), datetime(2023, 1, 2))
+
+    @patch("etl_jobs.get_country_asns")
+    def test_asns_generator_accepts_plain_iterables(self, mock_get_country_asns):
+        mock_get_country_asns.return_value = {
+            "data": {"countries": [{"routed": "{AsnSingle(1)}", "non_routed": "{}"}]}
+        }
+        dates = iter_dates(datetime(2023, 1, 1), datetime(2023, 1, 3), "D")
+
+        batches = list(etl_jobs.get_list_of_asns_for_country("GE", dates, 1000, verbose=False))
+
+        self.assertEqual(
+            batches,
+            [[(1, "2023-01-01", True), (1, "2023-01-02", True), (1, "2023-01-03", True)]],
+        )
+
+
+class TestCompleteDates(unittest.TestCase):
+    def test_dates_with_failed_requests_are_not_complete(self):
+        dates = [datetime(2025, 1, 1), datetime(2025, 1, 8)]
+        failed = [{"params": {"resource": 3333, "query_time": "2025-01-08T00:00:00"}}]
+
+        self.assertEqual(complete_dates(dates, failed), [datetime(2025, 1, 1)])
+        self.assertEqual(complete_dates(dates, []), dates)
+        self.assertEqual(complete_dates(dates, [{"params": {"resource": "RU"}}]), [])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
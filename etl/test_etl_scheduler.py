@@ -0,0 +1,17 @@
+import etl_scheduler
+import load_to_database
+import main
+
+
+def test_pool_worker_restores_the_load_mode_after_a_task(tmp_path, monkeypatch):
+    modes = []
+    monkeypatch.setattr(main, "run_task", lambda *args, **kwargs: modes.append(load_to_database.LOAD_MODE))
+    monkeypatch.setattr(etl_scheduler, "task_log_file", lambda task: str(tmp_path / f"{task['task']}.log"))
+    monkeypatch.setattr(load_to_database, "LOAD_MODE", "skip")
+    task = {"task": "ASNS", "countries": ["AM"], "date-from": "2025-05-01", "date-to": "2025-05-01", "date-resolution": "D"}
+
+    assert etl_scheduler.run_task_in_pool_worker(dict(task, **{"load-mode": "update"}))["status"] == "completed"
+    assert etl_scheduler.run_task_in_pool_worker(dict(task, task="STATS_1D"))["status"] == "completed"
+
+    assert modes == ["update", "skip"]
+    assert load_to_database.LOAD_MODE == "skip"
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+import export_rollups
+
+
+class FakeResult:
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self._rows = rows
+
+    def keys(self):
+        return self._keys
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+def fake_connection(statements, result):
+    class FakeConnection:
+        def execute(self, statement, params):
+            statements.append((str(statement), params))
+            return result
+
+    @contextmanager
+    def connect():
+        yield FakeConnection()
+
+    return connect
+
+
+def test_one_query_writes_a_file_per_country(monkeypatch, tmp_path):
+    keys = ["cs_country_iso2", "date_trunc", "avg_cs_asns_ris"]
+    rows = [
+        ("AM", date(2025, 5, 5), Decimal("12")),
+        ("AM", date(2025, 5, 12), Decimal("13")),
+        ("GE", date(2025, 5, 5), Decimal("40")),
+    ]
+    statements = []
+    monkeypatch.setattr(export_rollups, "get_db_connection", fake_connection(statements, FakeResult(keys, rows)))
+
+    written = export_rollups.export_rollups("stats", "week", ["am", "ge", "md"], str(tmp_path))
+
+    ((query, params),) = statements
+    assert "FROM data.country_stat_rollup WHERE csr_period = :period AND csr_country_iso2 = ANY(:countries)" in query
+    assert params == {"period": "week", "countries": ["AM", "GE", "MD"]}
+    assert written == {"AM": 2, "GE": 1, "MD": 0}
+    assert (tmp_path / "am_stats_weekly.csv").read_text().splitlines() == [
+        "date_trunc,avg_cs_asns_ris",
+        "2025-05-05,12",
+        "2025-05-12,13",
+    ]
+    assert (tmp_path / "md_stats_weekly.csv").read_text().splitlines() == ["date_trunc,avg_cs_asns_ris"]
+
+
+def test_all_countries_are_not_filtered():
+    query = str(export_rollups.export_query("traffic", all_countries=True))
+    assert "ANY(:countries)" not in query
+    assert query.endswith("FROM data.country_traffic_rollup WHERE crr_period = :period ORDER BY crr_country_iso2, crr_date")
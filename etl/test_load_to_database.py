@@ -0,0 +1,217 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import text
+
+import load_to_database
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    load_to_database.dispose_engine()
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    with patch.object(load_to_database, "get_connection_string", return_value=url):
+        yield load_to_database.get_engine()
+    load_to_database.dispose_engine()
+
+
+def test_get_engine_is_shared(sqlite_engine):
+    assert load_to_database.get_engine() is sqlite_engine
+
+
+def test_connections_are_reused(sqlite_engine):
+    before = load_to_database.get_pool_stats()
+
+    for _ in range(5):
+        with load_to_database.get_db_connection() as c:
+            assert c.execute(text("SELECT 1")).scalar() == 1
+
+    after = load_to_database.get_pool_stats()
+    assert after["checkouts"] - before["checkouts"] == 5
+    assert after["opened"] - before["opened"] == 1
+
+
+def test_db_transaction_rolls_back_on_error(sqlite_engine):
+    with load_to_database.db_transaction() as c:
+        c.execute(text("CREATE TABLE t (x integer)"))
+
+    with pytest.raises(RuntimeError):
+        with load_to_database.db_transaction() as c:
+            c.execute(text("INSERT INTO t VALUES (1)"))
+            raise RuntimeError("boom")
+
+    with load_to_database.get_db_connection() as c:
+        assert c.execute(text("SELECT count(*) FROM t")).scalar() == 0
+
+
+def test_build_copy_payload_escapes_and_nulls():
+    payload = load_to_database.build_copy_payload(
+        [("RU", "2024-01-01", 42, True), ("a\tb", "x\\y", None, False)]
+    )
+    assert payload.read() == "RU\t2024-01-01\t42\tt\na\\tb\tx\\\\y\t\\N\tf\n"
+
+
+def test_insert_country_asn_neighbours_uses_copy():
+    neighbours = [
+        {"asn_req": 1, "asn": 2, "date": "2024-01-01", "type": "left", "power": 5, "v4_peers": 3, "v6_peers": 0},
+    ]
+    with patch.object(load_to_database, "copy_rows_to_db") as mock_copy, \
+            patch.object(load_to_database, "ensure_partitions") as mock_partitions:
+        load_to_database.insert_country_asn_neighbours_to_db("RU", neighbours)
+
+    mock_partitions.assert_called_once_with("data.asn_neighbour", {"2024-01-01"})
+
+    table, columns, payload = mock_copy.call_args.args
+    assert table == "data.asn_neighbour"
+    assert columns == load_to_database.ASN_NEIGHBOUR_COLUMNS
+    assert payload.read() == "1\t2\t2024-01-01\tleft\t5\t3\t0\n"
+
+
+def test_save_sql_to_file_writes_psql_copy_script(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(load_to_database, "LOAD_MODE", "insert")
+    traffic = {"timestamps": ["2024-01-01T00:00:00Z"], "values": ["0.5"]}
+
+    load_to_database.insert_traffic_for_country_to_db("KZ", traffic, save_sql_to_file=True, load_to_database=False)
+
+    files = list((tmp_path / "sql").glob("country_traffic_KZ_*.sql"))
+    assert len(files) == 1
+    assert files[0].read_text() == (
+        "COPY data.country_traffic (cr_country_iso2, cr_date, cr_traffic) FROM STDIN;\n"
+        "KZ\t2024-01-01T00:00:00Z\t0.5\n"
+        "\\.\n"
+    )
+
+
+def test_upsert_load_goes_through_staging_table():
+    before, copy_sql, after = load_to_database.load_statements(
+        "data.country_traffic", load_to_database.COUNTRY_TRAFFIC_COLUMNS, "update"
+    )
+
+    assert before == [
+        "CREATE TEMP TABLE staging_country_traffic ON COMMIT DROP AS "
+        "SELECT cr_country_iso2, cr_date, cr_traffic FROM data.country_traffic WITH NO DATA"
+    ]
+    assert copy_sql == "COPY staging_country_traffic (cr_country_iso2, cr_date, cr_traffic) FROM STDIN"
+    assert after == [
+        "INSERT INTO data.country_traffic (cr_country_iso2, cr_date, cr_traffic)\n"
+        "SELECT DISTINCT ON (cr_country_iso2, cr_date) cr_country_iso2, cr_date, cr_traffic "
+        "FROM staging_country_traffic\n"
+        "ON CONFLICT (cr_country_iso2, cr_date) DO UPDATE SET cr_traffic = EXCLUDED.cr_traffic"
+    ]
+
+
+def test_update_keeps_the_load_id_of_existing_rows():
+    columns = load_to_database.COUNTRY_TRAFFIC_COLUMNS + ("load_id",)
+    sql = load_to_database.upsert_statement("data.country_traffic", columns, "update")
+
+    assert sql.endswith("DO UPDATE SET cr_traffic = EXCLUDED.cr_traffic")
+
+
+def test_unknown_load_mode_is_rejected():
+    with pytest.raises(ValueError):
+        load_to_database.load_statements("data.asn", load_to_database.ASN_COLUMNS, "replace")
+
+
+def test_rows_are_stamped_with_current_load_id(monkeypatch):
+    monkeypatch.setitem(load_to_database._current_load, "load_id", 7)
+    with patch.object(load_to_database, "copy_rows_to_db") as mock_copy, \
+            patch.object(load_to_database, "ensure_partitions"), \
+            patch.object(load_to_database, "update_asn_current", return_value={}) as mock_current:
+        load_to_database.insert_country_asns_to_db("AM", [(1, "2024-01-01", True)])
+
+    mock_current.assert_called_once_with("AM", [(1, "2024-01-01", True)])
+
+    table, columns, payload = mock_copy.call_args.args
+    assert columns == load_to_database.ASN_COLUMNS + ("load_id",)
+    assert payload.read() == "AM\t2024-01-01\t1\tt\t7\n"
+
+
+def test_asns_that_moved_country_refresh_the_connectivity_index():
+    with patch.object(load_to_database, "copy_rows_to_db"), \
+            patch.object(load_to_database, "ensure_partitions"), \
+            patch.object(load_to_database, "update_asn_current", return_value={1: "GE"}), \
+            patch("summaries.refresh_moved_asn_summaries") as mock_refresh:
+        load_to_database.insert_country_asns_to_db("AM", [(1, "2024-01-01", True)])
+
+    mock_refresh.assert_called_once_with("AM", {1: "GE"})
+
+
+def test_month_start_accepts_dates_and_strings():
+    assert load_to_database.month_start("2025-05-19") == date(2025, 5, 1)
+    assert load_to_database.month_start(datetime(2025, 12, 31, 23, 59)) == date(2025, 12, 1)
+
+
+def test_ensure_partitions_creates_each_month_once(monkeypatch):
+    monkeypatch.setattr(load_to_database, "_known_partitions", set())
+    calls = []
+
+    class FakeConnection:
+        def execute(self, statement, params):
+            calls.append((params["table"], params["month"]))
+            return MagicMock(scalar=MagicMock(return_value=params["month"].month == 5))
+
+    @contextmanager
+    def fake_transaction():
+        yield FakeConnection()
+
+    monkeypatch.setattr(load_to_database, "db_transaction", fake_transaction)
+
+    created = load_to_database.ensure_partitions("data.asn", ["2025-05-01", "2025-05-31", datetime(2025, 6, 2)])
+    load_to_database.ensure_partitions("data.asn", ["2025-05-02", "2025-06-30"])
+
+    assert created == [date(2025, 5, 1)]
+    assert calls == [("data.asn", date(2025, 5, 1)), ("data.asn", date(2025, 6, 1))]
+
+
+def test_asn_current_gets_the_newest_date_of_each_asn(monkeypatch):
+    calls = []
+
+    class FakeConnection:
+        def execute(self, statement, params):
+            calls.append(params)
+            return iter([(2, "GE")])
+
+    @contextmanager
+    def fake_transaction():
+        yield FakeConnection()
+
+    monkeypatch.setattr(load_to_database, "db_transaction", fake_transaction)
+
+    rows = [(1, "2025-05-01", True), (2, "2025-05-01", True), (1, "2025-05-15", False)]
+    assert load_to_database.update_asn_current("AM", rows) == {2: "GE"}
+    assert load_to_database.update_asn_current("AM", []) == {}
+
+    assert calls == [{"country": "AM", "asns": [1, 2], "dates": ["2025-05-15", "2025-05-01"]}]
+
+
+def test_rollback_recomputes_asn_current_in_the_asn_delete_transaction(monkeypatch):
+    transactions = []
+
+    class FakeConnection:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement, params):
+            self.statements.append(str(statement))
+            rows = [(3,), (1,), (3,)] if str(statement).startswith("DELETE FROM data.asn WHERE") else []
+            return MagicMock(rowcount=len(rows), __iter__=lambda self: iter(rows))
+
+    @contextmanager
+    def fake_transaction():
+        c = FakeConnection()
+        transactions.append(c.statements)
+        yield c
+
+    monkeypatch.setattr(load_to_database, "db_transaction", fake_transaction)
+
+    deleted = load_to_database.rollback_etl_load(7, batch_size=10)
+
+    assert deleted[load_to_database.ASN_TABLE] == 3
+    asn_delete, current_delete, current_insert = transactions[0]
+    assert asn_delete.endswith("RETURNING a_ripe_id")
+    assert current_delete.startswith("DELETE FROM data.asn_current")
+    assert current_insert == load_to_database.ASN_CURRENT_RECOMPUTE
+    assert all(len(statements) == 1 for statements in transactions[1:])
@@ -0,0 +1,87 @@
+import json
+
+from metrics import (
+    MetricsRegistry,
+    endpoint_label,
+    merge_snapshots,
+    read_run_snapshots,
+    summarize,
+    to_prometheus,
+    write_metrics,
+)
+
+
+def test_histogram_counts_each_value_in_its_bucket():
+    registry = MetricsRegistry()
+    for value in (0.005, 0.3, 0.3, 100):
+        registry.observe("api_request_seconds", value, buckets=(0.01, 0.5, 1), endpoint="asn-neighbours")
+
+    (h,) = registry.snapshot()["histograms"]
+    assert h["counts"] == [1, 2, 0]
+    assert h["count"] == 4
+    assert round(h["sum"], 3) == 100.605
+
+
+def test_merge_adds_counters_and_histograms_with_the_same_labels():
+    a, b = MetricsRegistry(), MetricsRegistry()
+    a.inc("db_rows_total", 10, table="data.asn")
+    b.inc("db_rows_total", 5, table="data.asn")
+    b.inc("db_rows_total", 7, table="data.asn_neighbour")
+    a.observe("db_copy_seconds", 0.2, table="data.asn")
+    b.observe("db_copy_seconds", 0.3, table="data.asn")
+
+    merged = merge_snapshots([a.snapshot(), b.snapshot()])
+
+    counters = {c["labels"]["table"]: c["value"] for c in merged["counters"]}
+    assert counters == {"data.asn": 15, "data.asn_neighbour": 7}
+    (h,) = merged["histograms"]
+    assert h["count"] == 2
+    assert round(h["sum"], 3) == 0.5
+
+
+def test_prometheus_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    registry.observe("db_batch_rows", 5, buckets=(1, 10), table="data.asn")
+    registry.observe("db_batch_rows", 50, buckets=(1, 10), table="data.asn")
+    registry.inc("api_requests_total", endpoint="country-asns", status=200)
+
+    text = to_prometheus(registry.snapshot(), load_id=7)
+
+    assert 'ozi_etl_api_requests_total{endpoint="country-asns",load_id="7",status="200"} 1' in text
+    assert 'ozi_etl_db_batch_rows_bucket{le="1",load_id="7",table="data.asn"} 0' in text
+    assert 'ozi_etl_db_batch_rows_bucket{le="10",load_id="7",table="data.asn"} 1' in text
+    assert 'ozi_etl_db_batch_rows_bucket{le="+Inf",load_id="7",table="data.asn"} 2' in text
+    assert text.count("# TYPE ozi_etl_db_batch_rows histogram") == 1
+
+
+def test_summary_splits_time_by_stage():
+    registry = MetricsRegistry()
+    registry.observe("api_request_seconds", 2.0, endpoint="asn-neighbours")
+    registry.observe("api_request_seconds", 4.0, endpoint="asn-neighbours")
+    registry.observe("parse_seconds", 0.5, endpoint="asn-neighbours")
+    registry.observe("db_copy_seconds", 2.0, table="data.asn_neighbour")
+    registry.inc("db_rows_total", 1000, table="data.asn_neighbour")
+
+    summary = summarize(registry.snapshot())
+
+    assert summary["seconds"] == {"api_request": 6.0, "parse": 0.5, "db_copy": 2.0}
+    assert summary["db_rows_per_second"] == {"data.asn_neighbour": 500}
+    assert summary["api_mean_latency"] == {"asn-neighbours": 3.0}
+
+
+def test_scheduler_merges_the_run_files_of_its_directory(tmp_path):
+    for load_id in (1, 2):
+        registry = MetricsRegistry()
+        registry.inc("db_rows_total", 3, table="data.asn")
+        write_metrics(registry.snapshot(), f"run_{load_id}_100", str(tmp_path), load_id=load_id)
+    write_metrics(merge_snapshots(read_run_snapshots(str(tmp_path))), "scheduler", str(tmp_path))
+
+    with open(tmp_path / "scheduler.json") as f:
+        assert json.load(f)["summary"]["rows"] == {"data.asn": 6}
+    assert (tmp_path / "scheduler.prom").exists()
+    assert len(read_run_snapshots(str(tmp_path))) == 2
+
+
+def test_endpoint_label():
+    assert endpoint_label("https://stat.ripe.net/data/asn-neighbours/data.json") == "asn-neighbours"
+    assert endpoint_label("https://api.cloudflare.com/client/v4/radar/netflows/timeseries") == "netflows/timeseries"
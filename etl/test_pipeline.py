@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import run_pipeline
+
+
+def test_batches_are_loaded_in_order_on_the_calling_thread():
+    loaded = []
+    threads = set()
+
+    def load(batch):
+        threads.add(threading.current_thread())
+        loaded.append(batch)
+
+    stats = run_pipeline(([i] * 3 for i in range(10)), load, queue_size=2)
+
+    assert loaded == [[i] * 3 for i in range(10)]
+    assert threads == {threading.current_thread()}
+    assert (stats["batches"], stats["rows"]) == (10, 30)
+    assert stats["queue_depth_max"] <= 2
+
+
+def test_slow_loader_applies_backpressure():
+    fetched = []
+
+    def batches():
+        for i in range(6):
+            fetched.append(i)
+            yield [i]
+
+    def load(batch):
+        # The fetcher may run at most queue_size + 1 batches ahead
+        assert len(fetched) <= batch[0] + 3
+        time.sleep(0.02)
+
+    stats = run_pipeline(batches(), load, queue_size=1)
+    assert stats["fetch_blocked_s"] >= 0
+
+
+def test_fetch_error_is_raised_to_the_caller():
+    def batches():
+        yield [1]
+        raise ValueError("fetch failed")
+
+    with pytest.raises(ValueError, match="fetch failed"):
+        run_pipeline(batches(), lambda batch: None)
+
+
+def test_load_error_stops_the_fetcher():
+    fetched = []
+
+    def batches():
+        for i in range(1000):
+            fetched.append(i)
+            yield [i]
+
+    def load(batch):
+        raise RuntimeError("copy failed")
+
+    with pytest.raises(RuntimeError, match="copy failed"):
+        run_pipeline(batches(), load, queue_size=2)
+    assert len(fetched) < 1000
@@ -0,0 +1,34 @@
+from rate_limiter import AIMDRateLimiter, parse_retry_after
+
+
+def test_reserve_spaces_requests_at_the_current_rate():
+    limiter = AIMDRateLimiter(rate=4, max_rate=10, backoff_seconds=10)
+    waits = [limiter.reserve() for _ in range(3)]
+    assert waits[0] == 0
+    assert abs(waits[2] - 0.5) < 0.05
+
+
+def test_rate_grows_additively_and_halves_on_429():
+    limiter = AIMDRateLimiter(rate=4, max_rate=10, backoff_seconds=10)
+    for _ in range(8):
+        limiter.report(200, 0.1)
+    assert 5.5 < limiter.rate < 6.5
+
+    rate = limiter.rate
+    limiter.report(429, 0.1, retry_after=2)
+    limiter.report(429, 0.1, retry_after=2)  # in-flight request, same congestion event
+    assert limiter.rate == rate / 2
+    assert limiter.stats()["throttled"] == 2
+    assert 1.9 < limiter.reserve() <= 2
+
+
+def test_slow_responses_trim_the_rate():
+    limiter = AIMDRateLimiter(rate=4, max_rate=10, backoff_seconds=10, latency_target=1)
+    limiter.report(200, 3)
+    assert limiter.rate == 4 * 0.9
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
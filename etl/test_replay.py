@@ -0,0 +1,81 @@
+import replay
+from extract_from_ripe_api import save_api_response
+from replay import replay_archive
+from response_archive import ResponseArchive
+
+RIPE = "https://stat.ripe.net/data/{}/data.json"
+
+
+def test_replay_routes_responses_to_the_loaders(tmp_path, monkeypatch):
+    loaded = {"asns": [], "neighbours": [], "stats": []}
+    monkeypatch.setattr(replay, "insert_country_asns_to_db", lambda iso2, rows: loaded["asns"].append((iso2, list(rows))))
+    monkeypatch.setattr(
+        replay, "insert_country_asn_neighbours_to_db", lambda iso2, rows: loaded["neighbours"].append(list(rows))
+    )
+    monkeypatch.setattr(
+        replay, "insert_country_stats_to_db", lambda iso2, resolution, stats: loaded["stats"].append((iso2, resolution))
+    )
+
+    archive = ResponseArchive(str(tmp_path), max_bytes=1024 * 1024)
+    archive.append(
+        RIPE.format("country-asns"),
+        {"resource": "CZ", "query_time": "2024-01-01T00:00:00", "lod": 1},
+        {"data": {"countries": [{"routed": "{AsnSingle(5), AsnSingle(7)}", "non_routed": "{AsnSingle(9)}"}]}},
+    )
+    archive.append(
+        RIPE.format("asn-neighbours"),
+        {"resource": 5, "query_time": "2024-01-01T00:00:00"},
+        {"data": {"neighbours": [{"asn": 7, "type": "left", "power": 1, "v4_peers": 1, "v6_peers": 0}]}},
+    )
+    archive.append(
+        RIPE.format("country-resource-stats"),
+        {"resource": "CZ", "starttime": "2024-01-01T00:00:00", "endtime": "2024-01-01T00:00:00", "resolution": "1d"},
+        {"data": {"stats": [{"timeline": []}]}},
+    )
+    archive.append(RIPE.format("asn-neighbours"), {"resource": 6, "query_time": "2024-01-01T00:00:00"}, {"data": {}})
+    archive.close()
+
+    row_counts, skipped = replay_archive(str(tmp_path), workers=1)
+
+    assert loaded["asns"] == [("CZ", [(5, "2024-01-01", True), (7, "2024-01-01", True), (9, "2024-01-01", False)])]
+    assert [(row["asn_req"], row["asn"], row["date"]) for row in loaded["neighbours"][0]] == [(5, 7, "2024-01-01")]
+    assert loaded["stats"] == [("CZ", "1d")]
+    assert skipped == {"asn-neighbours": 1}
+
+
+def test_replay_reads_legacy_response_files(tmp_path, monkeypatch):
+    loaded = {"asns": [], "neighbours": [], "stats": []}
+    monkeypatch.setattr(replay, "insert_country_asns_to_db", lambda iso2, rows: loaded["asns"].append((iso2, list(rows))))
+    monkeypatch.setattr(
+        replay, "insert_country_asn_neighbours_to_db", lambda iso2, rows: loaded["neighbours"].append(list(rows))
+    )
+    monkeypatch.setattr(
+        replay, "insert_country_stats_to_db", lambda iso2, resolution, stats: loaded["stats"].append((iso2, resolution))
+    )
+    monkeypatch.chdir(tmp_path)
+
+    save_api_response(
+        RIPE.format("country-asns"),
+        {"resource": "TR", "query_time": "2024-01-01T00:00:00", "lod": 1},
+        {"data": {"countries": [{"routed": "{AsnSingle(5)}", "non_routed": "{}"}]}},
+        save_mode="file",
+    )
+    save_api_response(
+        RIPE.format("asn-neighbours"),
+        {"resource": 5, "query_time": "2024-01-02"},
+        {"data": {"neighbours": [{"asn": 7, "type": "left", "power": 1, "v4_peers": 1, "v6_peers": 0}]}},
+        save_mode="file",
+    )
+    save_api_response(
+        RIPE.format("country-resource-stats"),
+        {"resource": "TR", "starttime": "2024-01-01T00:00:00", "endtime": "2024-01-01T00:00:00", "resolution": "1d"},
+        {"data": {"stats": [{"timeline": []}]}},
+        save_mode="file",
+    )
+    (tmp_path / "data" / "ripe_response_broken.json").write_text("{}")
+
+    replay_archive(str(tmp_path / "data"), workers=1)
+
+    assert loaded["asns"] == [("TR", [(5, "2024-01-01", True)])]
+    assert [(row["asn_req"], row["asn"], row["date"]) for row in loaded["neighbours"][0]] == [(5, 7, "2024-01-02")]
+    assert loaded["stats"] == [("TR", "1d")]
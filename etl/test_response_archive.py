@@ -0,0 +1,56 @@
+import load_to_database
+from response_archive import (
+    ApiResponseSink,
+    ResponseArchive,
+    list_segments,
+    read_archive,
+    read_index,
+    read_record,
+)
+
+URL = "https://stat.ripe.net/data/asn-neighbours/data.json"
+
+
+def test_archive_round_trip_and_rotation(tmp_path):
+    archive = ResponseArchive(str(tmp_path), max_bytes=400)
+    for asn in range(10):
+        archive.append(URL, {"resource": asn, "query_time": "2024-01-01T00:00:00"}, {"data": {"neighbours": [asn]}})
+    archive.close()
+
+    segments = list_segments(str(tmp_path))
+    assert len(segments) > 1
+    records = list(read_archive(str(tmp_path)))
+    assert [record["params"]["resource"] for record in records] == list(range(10))
+    assert records[3]["response"] == {"data": {"neighbours": [3]}}
+
+    entry = list(read_index(segments[0]))[1]
+    record = read_record(segments[0], entry["offset"], entry["length"])
+    assert record["params"] == entry["params"]
+
+
+def test_truncated_segment_keeps_complete_records(tmp_path):
+    archive = ResponseArchive(str(tmp_path), max_bytes=1024 * 1024)
+    archive.append(URL, {"resource": 1}, {"data": 1})
+    archive.append(URL, {"resource": 2}, {"data": 2})
+    archive.close()
+
+    segment = list_segments(str(tmp_path))[0]
+    last = list(read_index(segment))[-1]
+    with open(segment, "r+b") as f:
+        f.truncate(last["offset"] + last["length"] // 2)
+
+    assert [record["response"] for record in read_archive(segment)] == [{"data": 1}]
+
+
+def test_api_response_sink_loads_in_batches(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(load_to_database, "insert_api_responses_to_db", loaded.append)
+    sink = ApiResponseSink(batch_size=2)
+
+    for asn in range(3):
+        sink.append(URL, {"resource": asn}, {"data": asn})
+    assert [len(batch) for batch in loaded] == [2]
+
+    sink.flush()
+    assert [len(batch) for batch in loaded] == [2, 1]
+    assert loaded[1][0]["params"] == {"resource": 2}
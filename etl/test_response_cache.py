@@ -0,0 +1,47 @@
+from response_cache import ResponseCache, cache_key, is_historical
+
+URL = "https://stat.ripe.net/data/asn-neighbours/data.json"
+
+
+def test_cache_round_trip_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), 1024 * 1024)
+    params = {"resource": 3333, "query_time": "2024-01-01T00:00:00"}
+
+    assert cache.get(URL, params) is None
+    cache.put(URL, params, {"data": {"neighbours": [1, 2, 3]}})
+
+    assert cache.get(URL, dict(reversed(list(params.items())))) == {"data": {"neighbours": [1, 2, 3]}}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), 300)
+    payload = {"data": "".join(chr(33 + (i * 7) % 90) for i in range(150))}
+
+    cache.put(URL, {"resource": 1}, payload)
+    cache.put(URL, {"resource": 2}, payload)
+    cache.get(URL, {"resource": 1})
+    cache.put(URL, {"resource": 3}, payload)
+
+    assert cache.get(URL, {"resource": 2}) is None
+    assert cache.get(URL, {"resource": 3}) == payload
+    assert cache.stats()["bytes"] <= 300
+
+
+def test_rewriting_a_key_does_not_grow_the_size(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), 1024 * 1024)
+    for _ in range(3):
+        cache.put(URL, {"resource": 1}, {"data": [1, 2, 3]})
+
+    assert cache.stats()["bytes"] == cache._total_size()
+
+
+def test_cache_key_is_order_independent():
+    assert cache_key(URL, {"a": 1, "b": 2}) == cache_key(URL, {"b": 2, "a": 1})
+
+
+def test_only_past_queries_are_historical():
+    assert is_historical({"query_time": "2024-01-01T00:00:00"}, today="2024-06-01")
+    assert not is_historical({"query_time": "2024-06-01T00:00:00"}, today="2024-06-01")
+    assert not is_historical({"resource": "RU"}, today="2024-06-01")
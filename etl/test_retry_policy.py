@@ -0,0 +1,104 @@
+import asyncio
+
+import aiohttp
+import pytest
+import requests
+
+from retry_policy import CircuitBreaker, RetryPolicy, is_retryable, retry_after_from
+
+
+class Flaky:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ValueError("boom")
+        return "ok"
+
+
+def test_delay_is_capped_full_jitter_and_honours_retry_after():
+    policy = RetryPolicy(5, base_delay=1, max_delay=8)
+    assert all(0 <= policy.delay(10) <= 8 for _ in range(100))
+    assert policy.delay(0, retry_after=3) >= 3
+
+
+def test_call_retries_until_success():
+    fn = Flaky(2)
+    assert RetryPolicy(3, base_delay=0).call(fn) == "ok"
+    assert fn.calls == 3
+
+
+def test_call_raises_after_last_attempt():
+    fn = Flaky(5)
+    with pytest.raises(ValueError):
+        RetryPolicy(3, base_delay=0).call(fn)
+    assert fn.calls == 3
+
+
+def test_acall_retries_coroutines():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        if len(calls) < 2:
+            raise ValueError("boom")
+        return "ok"
+
+    assert asyncio.run(RetryPolicy(3, base_delay=0).acall(fetch)) == "ok"
+    assert len(calls) == 2
+
+
+def test_breaker_opens_after_threshold_and_success_resets():
+    opened = []
+    breaker = CircuitBreaker(threshold=3, reset_seconds=30, on_open=opened.append)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.wait_time() == 0
+
+    breaker.record_failure()
+    assert opened == [30]
+    assert 29 < breaker.wait_time() <= 30
+
+    breaker.record_success()
+    assert breaker.failures == 0
+
+
+def test_retry_after_from_http_error():
+    response = requests.Response()
+    response.headers["Retry-After"] = "7"
+    assert retry_after_from(requests.exceptions.HTTPError(response=response)) == 7
+    assert retry_after_from(ValueError()) is None
+
+
+def test_retry_after_from_aiohttp_error():
+    error = aiohttp.ClientResponseError(None, (), status=429, headers={"Retry-After": "5"})
+    assert retry_after_from(error) == 5
+
+
+def test_client_errors_are_not_retried_or_counted_by_the_breaker():
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.exceptions.HTTPError(response=response)
+
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise http_error(404)
+
+    breaker = CircuitBreaker(threshold=1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        RetryPolicy(3, base_delay=0, breaker=breaker).call(fn)
+
+    assert len(calls) == 1
+    assert breaker.failures == 0
+    assert not is_retryable(http_error(400))
+    assert is_retryable(http_error(408))
+    assert is_retryable(http_error(429))
+    assert is_retryable(http_error(503))
+    assert not is_retryable(aiohttp.ClientResponseError(None, (), status=404))
+    assert is_retryable(ValueError())
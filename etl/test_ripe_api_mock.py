@@ -3,7 +3,14 @@ import requests_mock
 import time
 import requests
 from datetime import datetime
-from etl.extract_from_ripe_api import ripe_api_call, API_URL, RETRIES
+from etl.extract_from_ripe_api import ripe_api_call, ripe_retry_policy, failed_requests, API_URL, RETRIES
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    """Retry at once and start from a closed breaker, so the retry tests do not sleep."""
+    monkeypatch.setattr(ripe_retry_policy, "delay", lambda attempt, retry_after=None: 0)
+    ripe_retry_policy.breaker.record_success()
 
 # Mock data for successful response
 SUCCESS_DATA = {
@@ -88,3 +95,28 @@ def test_ripe_api_call_network_error_max_retries_fail():
         end_time = time.time()
 
         assert result is None
+
+def test_ripe_api_call_records_failed_request(monkeypatch):
+    """Requests that exhaust their retries are kept for re-queueing"""
+    # A past query_time would go through the on-disk response cache
+    monkeypatch.setattr("etl.extract_from_ripe_api.get_ripe_cache", lambda: None)
+    failed_requests.pop_all()
+    with requests_mock.Mocker() as m:
+        m.get(API_URL.format("test-call"), json=ERROR_500_DATA, status_code=500)
+        result = ripe_api_call(API_URL.format("test-call"), {"resource": "CZ", "query_time": "2025-01-01T00:00:00"})
+
+    assert result is None
+    failed = failed_requests.pop_all()
+    assert len(failed) == 1
+    assert failed[0]["params"]["query_time"] == "2025-01-01T00:00:00"
+
+
+def test_ripe_api_call_does_not_retry_client_errors():
+    """A 404 for a bad resource fails the same way on every attempt"""
+    with requests_mock.Mocker() as m:
+        m.get(API_URL.format("test-call"), json=ERROR_500_DATA, status_code=404)
+        result = ripe_api_call(API_URL.format("test-call"), {})
+
+        assert result is None
+        assert m.call_count == 1
+    assert ripe_retry_policy.breaker.failures == 0
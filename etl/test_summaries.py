@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import summaries
+
+
+class FakeConnection:
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        return iter(self.rows)
+
+
+def fake_connection(connection):
+    @contextmanager
+    def connect():
+        yield connection
+
+    return connect
+
+
+def test_refresh_runs_only_for_the_dates_and_countries_of_the_load(monkeypatch):
+    dates = [datetime(2025, 5, 5), datetime(2025, 5, 12)]
+    reads = FakeConnection(rows=[(dates[1], "GE"), (dates[0], "AM"), (dates[0], "GE")])
+    writes = FakeConnection()
+    monkeypatch.setattr(summaries, "get_db_connection", fake_connection(reads))
+    monkeypatch.setattr(summaries, "db_transaction", fake_connection(writes))
+
+    summaries.refresh_load_summaries(42, {"data.asn": 10, "data.asn_neighbour": 500})
+
+    ((query, params),) = reads.statements
+    assert "JOIN data.asn_current ac ON ac.ac_asn = n.an_asn" in query
+    assert "WHERE n.load_id = :load_id" in query
+    assert params == {"load_id": 42}
+    assert writes.statements == [(
+        "SELECT data.refresh_connectivity_index(CAST(:dates AS timestamp[]), CAST(:countries AS varchar[]))",
+        {"dates": dates, "countries": ["AM", "GE"]},
+    )]
+
+
+def test_loads_without_summarised_rows_do_not_touch_the_database(monkeypatch):
+    def fail():
+        raise AssertionError("no query expected")
+
+    monkeypatch.setattr(summaries, "get_db_connection", fail)
+    monkeypatch.setattr(summaries, "db_transaction", fail)
+
+    summaries.refresh_load_summaries(42, {"data.asn": 10, "data.asn_neighbour": 0})
+    summaries.refresh_load_summaries(43, None)
+    summaries.refresh_summaries({"data.asn_neighbour": ([], [])})
+
+
+def test_country_stat_loads_refresh_their_rollups(monkeypatch):
+    dates = [datetime(2025, 5, 5), datetime(2025, 5, 6)]
+    reads = FakeConnection(rows=[(d, "MN") for d in dates])
+    writes = FakeConnection()
+    monkeypatch.setattr(summaries, "get_db_connection", fake_connection(reads))
+    monkeypatch.setattr(summaries, "db_transaction", fake_connection(writes))
+
+    summaries.refresh_load_summaries(42, {"data.country_stat": 30, "data.asn_neighbour": 0})
+
+    ((query, _),) = reads.statements
+    assert "date_trunc('day', cs_stats_timestamp), cs_country_iso2 FROM data.country_stat" in query
+    assert writes.statements == [(
+        "SELECT data.refresh_country_stat_rollups(CAST(:dates AS timestamp[]), CAST(:countries AS varchar[]))",
+        {"dates": dates, "countries": ["MN"]},
+    )]
+
+
+def test_moved_asns_refresh_their_old_and_new_country_on_all_their_dates(monkeypatch):
+    dates = [datetime(2025, 5, 5), datetime(2025, 5, 12)]
+    reads = FakeConnection(rows=[(dates[1],), (dates[0],)])
+    writes = FakeConnection()
+    monkeypatch.setattr(summaries, "get_db_connection", fake_connection(reads))
+    monkeypatch.setattr(summaries, "db_transaction", fake_connection(writes))
+
+    summaries.refresh_moved_asn_summaries("AM", {64500: "GE", 64501: "GE"})
+
+    ((query, params),) = reads.statements
+    assert "an_asn = ANY(CAST(:asns AS bigint[])) OR an_neighbour = ANY(CAST(:asns AS bigint[]))" in query
+    assert params == {"asns": [64500, 64501]}
+    assert writes.statements == [(
+        "SELECT data.refresh_connectivity_index(CAST(:dates AS timestamp[]), CAST(:countries AS varchar[]))",
+        {"dates": dates, "countries": ["AM", "GE"]},
+    )]
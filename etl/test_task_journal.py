@@ -0,0 +1,47 @@
+import os
+
+import yaml
+
+from task_journal import TaskJournal, journal_path
+
+TASK_AM = {"task": "ASNS", "countries": ["AM"], "date-from": "2025-01-01", "date-to": "2025-01-31", "date-resolution": "D"}
+TASK_AZ = {"task": "ASNS", "countries": ["AZ"], "date-from": "2025-01-01", "date-to": "2025-01-31", "date-resolution": "D"}
+
+
+def write_job(path):
+    with open(path, "w") as f:
+        yaml.dump({"TASKS_QUEUE": [TASK_AM, TASK_AZ]}, f)
+
+
+def test_resume_skips_tasks_finished_before_a_crash(tmp_path):
+    config_file = str(tmp_path / "job.yaml")
+    write_job(config_file)
+
+    journal = TaskJournal(config_file, {"TASKS_QUEUE": [TASK_AM, TASK_AZ]}, snapshot_interval=3600)
+    journal.record(dict(reversed(list(TASK_AM.items()))), dict(TASK_AM, status="completed"))
+    # Simulate a crash: the YAML was never rewritten and the journal has a torn line.
+    with open(journal_path(config_file), "a") as f:
+        f.write('{"key": "trunc')
+
+    with open(config_file) as f:
+        config = yaml.safe_load(f)
+    assert config["TASKS_QUEUE"] == [TASK_AM, TASK_AZ]
+
+    resumed = TaskJournal(config_file, config)
+    assert resumed.replayed == 1
+    assert resumed.pending() == [TASK_AZ]
+
+
+def test_close_writes_compacted_snapshot(tmp_path):
+    config_file = str(tmp_path / "job.yaml")
+    write_job(config_file)
+
+    journal = TaskJournal(config_file, {"TASKS_QUEUE": [TASK_AM, TASK_AZ]}, snapshot_interval=3600)
+    journal.record(TASK_AZ, dict(TASK_AZ, status="failed"))
+    journal.close()
+
+    with open(config_file) as f:
+        config = yaml.safe_load(f)
+    assert config["TASKS_QUEUE"] == [TASK_AM]
+    assert config["TASKS_DONE"] == [dict(TASK_AZ, status="failed")]
+    assert not os.path.exists(journal_path(config_file))
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from etl_scheduler import build_command
+from task_splitter import expand_tasks, split_task
+
+COARSE = {
+    "task": "ASN_NEIGHBOURS",
+    "countries": ["RU", "KG"],
+    "date-from": "2025-01-01",
+    "date-to": "2025-01-03",
+    "date-resolution": "D",
+    "split": True,
+}
+
+
+def test_split_task_weights_units_by_asn_count():
+    weights = {
+        ("RU", datetime(2025, 1, 1)): 6000,
+        ("RU", datetime(2025, 1, 2)): 6100,
+        ("KG", datetime(2025, 1, 1)): 40,
+    }
+    units = split_task(COARSE, weights)
+
+    assert len(units) == 6
+    assert [weight for weight, _ in units] == [6100, 6050, 6000, 40, 40, 40]
+    weight, unit = units[0]
+    assert unit == {
+        "task": "ASN_NEIGHBOURS",
+        "countries": ["RU"],
+        "date-from": "2025-01-02",
+        "date-to": "2025-01-02",
+        "date-resolution": "D",
+    }
+
+
+def test_expand_tasks_keeps_unsplit_tasks_first(monkeypatch):
+    monkeypatch.setattr("task_splitter.get_asn_counts_from_db", lambda *args: {})
+    plain = {"task": "TRAFFIC", "countries": ["CZ"], "date-from": "2025-01-01", "date-to": "2025-01-01", "date-resolution": "D"}
+
+    tasks, split_count = expand_tasks([COARSE, plain])
+
+    assert split_count == 1
+    assert tasks[0] == plain
+    assert len(tasks) == 7
+    assert all("split" not in task for task in tasks)
+
+
+def test_expand_tasks_leaves_tasks_whole_without_split():
+    tasks, split_count = expand_tasks([COARSE], split=False)
+
+    assert split_count == 0
+    assert tasks == [COARSE]
+
+
+def test_expand_tasks_keeps_tasks_without_per_date_loads_whole():
+    traffic = dict(COARSE, task="TRAFFIC")
+    stats_5m = dict(COARSE, task="STATS_5M")
+
+    tasks, split_count = expand_tasks([traffic, stats_5m])
+
+    assert split_count == 0
+    assert tasks == [traffic, stats_5m]
+
+
+def test_build_command_skips_split_key():
+    assert "--split" not in build_command(COARSE)
@@ -1,51 +1,17 @@
 #!/bin/bash
 
+# Weekly country_stat averages of the report countries, one CSV per country
+# in ./exports. All countries are read from data.country_stat_rollup with a
+# single query by etl/export_rollups.py; extra arguments are passed on to it,
+# e.g. --period month, --dataset traffic, --format parquet or -c ALL.
+
 # DB connection
-HOST="localhost"
-USER="ozi"
-DB="ozi_db"
+export OZI_DATABASE_HOST="${OZI_DATABASE_HOST:-localhost}"
+export OZI_DATABASE_USER="${OZI_DATABASE_USER:-ozi}"
+export OZI_DATABASE_NAME="${OZI_DATABASE_NAME:-ozi_db}"
+export OZI_DATABASE_PASSWORD="${OZI_DATABASE_PASSWORD:-$PGPASSWORD}"
 
 # Output directory (optional)
-OUTDIR="./exports"
-mkdir -p "$OUTDIR"
-
-# List of countries
-declare -A COUNTRIES=(
-    ["AM"]="Armenia"
-    ["AZ"]="Azerbaijan"
-    ["BY"]="Belarus"
-    ["EE"]="Estonia"
-    ["GE"]="Georgia"
-    ["KZ"]="Kazakhstan"
-    ["KG"]="Kyrgyzstan"
-    ["LV"]="Latvia"
-    ["LT"]="Lithuania"
-    ["MD"]="Moldova"
-    ["RU"]="Russia"
-    ["TJ"]="Tajikistan"
-    ["TM"]="Turkmenistan"
-    ["UA"]="Ukraine"
-    ["UZ"]="Uzbekistan"
-    ["PL"]="Poland"
-    ["MN"]="Mongolia"
-    ["CZ"]="Czechia"
-)
-
-for ISO2 in "${!COUNTRIES[@]}"; do
-    OUTFILE="${OUTDIR}/${ISO2,,}_stats_weekly.csv"
-
-    echo "Exporting data for ${COUNTRIES[$ISO2]} ($ISO2)..."
-
-    psql -h "$HOST" -U "$USER" "$DB" --csv -o "$OUTFILE" <<EOF
-select date_trunc('week', cs_stats_timestamp)::date,
-       round(avg(cs_v4_prefixes_ris)) as avg_cs_v4_prefixes_ris,
-       round(avg(cs_v6_prefixes_ris)) as avg_cs_v6_prefixes_ris,
-       round(avg(cs_asns_ris)) as avg_cs_asns_ris,
-       round(avg(cs_asns_stats)) as avg_cs_asns_stats
-from data.country_stat
-where cs_country_iso2 = '$ISO2' and cs_stats_resolution = '1d'
-group by date_trunc('week', cs_stats_timestamp)::date
-order by date_trunc('week', cs_stats_timestamp)::date;
-EOF
+OUTDIR="${OUTDIR:-$PWD/exports}"
 
-done
\ No newline at end of file
+cd "$(dirname "$0")/etl" && exec python3 export_rollups.py --outdir "$OUTDIR" "$@"
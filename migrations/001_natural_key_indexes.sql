@@ -0,0 +1,61 @@
+-- Natural-key unique indexes for the fact tables.
+--
+-- They back the ON CONFLICT upserts of the ETL (--load-mode skip/update) and
+-- the pre-flight "already loaded" lookups (--skip-loaded). Duplicate rows left
+-- behind by earlier re-runs are removed first, keeping the oldest copy.
+--
+-- Usage: psql -d ozi_db2 -f migrations/001_natural_key_indexes.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+DELETE FROM data.asn a
+ USING data.asn b
+ WHERE a.a_id > b.a_id
+   AND a.a_country_iso2 = b.a_country_iso2
+   AND a.a_date = b.a_date
+   AND a.a_ripe_id = b.a_ripe_id;
+
+DELETE FROM data.asn_neighbour a
+ USING data.asn_neighbour b
+ WHERE a.an_id > b.an_id
+   AND a.an_asn = b.an_asn
+   AND a.an_date = b.an_date
+   AND a.an_neighbour = b.an_neighbour;
+
+DELETE FROM data.country_stat a
+ USING data.country_stat b
+ WHERE a.cs_id > b.cs_id
+   AND a.cs_country_iso2 = b.cs_country_iso2
+   AND a.cs_stats_resolution = b.cs_stats_resolution
+   AND a.cs_stats_timestamp = b.cs_stats_timestamp;
+
+DELETE FROM data.country_traffic a
+ USING data.country_traffic b
+ WHERE a.cr_id > b.cr_id
+   AND a.cr_country_iso2 = b.cr_country_iso2
+   AND a.cr_date = b.cr_date;
+
+DELETE FROM data.country_internet_quality a
+ USING data.country_internet_quality b
+ WHERE a.ci_id > b.ci_id
+   AND a.ci_country_iso2 = b.ci_country_iso2
+   AND a.ci_date = b.ci_date;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_asn_country_date_ripe_id
+    ON data.asn USING btree (a_country_iso2, a_date, a_ripe_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_asn_neighbour_asn_date_neighbour
+    ON data.asn_neighbour USING btree (an_asn, an_date, an_neighbour);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_country_stat_country_resolution_timestamp
+    ON data.country_stat USING btree (cs_country_iso2, cs_stats_resolution, cs_stats_timestamp);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_country_traffic_country_date
+    ON data.country_traffic USING btree (cr_country_iso2, cr_date);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_country_internet_quality_country_date
+    ON data.country_internet_quality USING btree (ci_country_iso2, ci_date);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- Load tracking: per-table row counts on data.etl_load and load_id indexes.
+--
+-- main.py registers every run in data.etl_load and stamps the rows it writes
+-- with that load_id; `main.py --rollback <load_id>` deletes them again in
+-- batches, which needs an index on load_id in every fact table.
+--
+-- Usage: psql -d ozi_db2 -f migrations/002_etl_load_tracking.sql
+
+\set ON_ERROR_STOP on
+
+ALTER TABLE data.etl_load ADD COLUMN IF NOT EXISTS row_counts jsonb;
+
+CREATE INDEX IF NOT EXISTS idx_asn_load_id ON data.asn USING btree (load_id);
+CREATE INDEX IF NOT EXISTS idx_asn_neighbour_load_id ON data.asn_neighbour USING btree (load_id);
+CREATE INDEX IF NOT EXISTS idx_country_stat_load_id ON data.country_stat USING btree (load_id);
+CREATE INDEX IF NOT EXISTS idx_country_traffic_load_id ON data.country_traffic USING btree (load_id);
+CREATE INDEX IF NOT EXISTS idx_country_internet_quality_load_id ON data.country_internet_quality USING btree (load_id);
@@ -0,0 +1,389 @@
+-- Monthly range partitioning of data.asn (by a_date) and data.asn_neighbour (by an_date).
+--
+-- Dashboard queries are bounded by date, so with partitions they only scan
+-- the months they ask for, and old periods can be removed with DROP TABLE on
+-- a partition instead of a bulk DELETE. The ETL creates the partition of a
+-- new month itself (data.create_month_partition) before it loads rows.
+--
+-- The tables are rebuilt: the old ones are renamed, their rows copied into
+-- the partitioned tables month by month and then dropped. Row ids, load ids
+-- and timestamps are kept. The views on top of the tables are dropped and
+-- recreated unchanged. This rewrites both tables in one transaction, so run
+-- it in a maintenance window with no ETL jobs running.
+--
+-- Usage: psql -d ozi_db2 -f migrations/003_partition_asn_tables.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+-- Runs as its owner, so ETL users that do not own the tables can still add partitions
+CREATE OR REPLACE FUNCTION data.create_month_partition(parent regclass, month date) RETURNS boolean
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path = pg_catalog, pg_temp
+    AS $$
+DECLARE
+    first_day date := date_trunc('month', month)::date;
+    parent_schema name;
+    parent_name name;
+    partition_name text;
+BEGIN
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+      FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+     WHERE c.oid = parent;
+    partition_name := format('%I.%I', parent_schema, parent_name || to_char(first_day, '"_y"YYYY"m"MM'));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, first_day, (first_day + interval '1 month')::date
+    );
+    RETURN true;
+EXCEPTION WHEN duplicate_table THEN
+    -- Another loader created it first
+    RETURN false;
+END;
+$$;
+
+DROP MATERIALIZED VIEW data.vm_connectivity_index_by_country;
+DROP MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10;
+DROP MATERIALIZED VIEW data.vm_asn_neighbour;
+DROP VIEW data.v_neighbours_by_country;
+DROP VIEW data.v_connectivity_index_by_country;
+DROP VIEW data.v_connectivity_index_by_asn_top10;
+DROP VIEW data.v_connectivity_index_by_asn;
+DROP VIEW data.v_asn_neighbour;
+DROP MATERIALIZED VIEW data.vm_current_asn;
+DROP VIEW data.v_current_asn;
+DROP VIEW data.v_asn_with_neighbours;
+DROP VIEW data.v_data_overview;
+DROP VIEW data.v_asn_count;
+
+ALTER TABLE data.asn RENAME TO asn_unpartitioned;
+ALTER TABLE data.asn_neighbour RENAME TO asn_neighbour_unpartitioned;
+ALTER SEQUENCE data.asn_a_id_seq OWNED BY NONE;
+ALTER SEQUENCE data."asn_neighbour_an_id_seq" OWNED BY NONE;
+
+CREATE TABLE data.asn (
+    created timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    updated timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    a_id integer DEFAULT nextval('data.asn_a_id_seq'::regclass) NOT NULL,
+    a_date timestamp without time zone NOT NULL,
+    a_country_iso2 character varying(2) NOT NULL,
+    a_ripe_id integer NOT NULL,
+    a_is_routed boolean NOT NULL,
+    load_id integer
+)
+PARTITION BY RANGE (a_date);
+
+CREATE TABLE data.asn_neighbour (
+    created timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    updated timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    "an_id" integer DEFAULT nextval('data."asn_neighbour_an_id_seq"'::regclass) NOT NULL,
+    an_asn bigint NOT NULL,
+    an_neighbour bigint NOT NULL,
+    an_date timestamp without time zone NOT NULL,
+    an_type character varying(32),
+    an_power integer NOT NULL,
+    an_v4_peers integer,
+    an_v6_peers integer,
+    load_id integer
+)
+PARTITION BY RANGE (an_date);
+
+ALTER SEQUENCE data.asn_a_id_seq OWNED BY data.asn.a_id;
+ALTER SEQUENCE data."asn_neighbour_an_id_seq" OWNED BY data.asn_neighbour."an_id";
+
+SELECT data.create_month_partition('data.asn', month::date)
+  FROM generate_series(
+           (SELECT date_trunc('month', min(a_date)) FROM data.asn_unpartitioned),
+           (SELECT max(a_date) FROM data.asn_unpartitioned),
+           interval '1 month') AS month;
+
+SELECT data.create_month_partition('data.asn_neighbour', month::date)
+  FROM generate_series(
+           (SELECT date_trunc('month', min(an_date)) FROM data.asn_neighbour_unpartitioned),
+           (SELECT max(an_date) FROM data.asn_neighbour_unpartitioned),
+           interval '1 month') AS month;
+
+-- Copied before the triggers exist, so created/updated keep their values
+INSERT INTO data.asn (created, updated, a_id, a_date, a_country_iso2, a_ripe_id, a_is_routed, load_id)
+SELECT created, updated, a_id, a_date, a_country_iso2, a_ripe_id, a_is_routed, load_id
+  FROM data.asn_unpartitioned;
+
+INSERT INTO data.asn_neighbour (
+    created, updated, "an_id", an_asn, an_neighbour, an_date, an_type, an_power, an_v4_peers, an_v6_peers, load_id
+)
+SELECT created, updated, "an_id", an_asn, an_neighbour, an_date, an_type, an_power, an_v4_peers, an_v6_peers, load_id
+  FROM data.asn_neighbour_unpartitioned;
+
+DROP TABLE data.asn_unpartitioned;
+DROP TABLE data.asn_neighbour_unpartitioned;
+
+-- Primary and unique keys of a partitioned table have to include the partition column
+ALTER TABLE data.asn ADD CONSTRAINT asn_pkey PRIMARY KEY (a_id, a_date);
+ALTER TABLE data.asn_neighbour ADD CONSTRAINT asn_neighbour_pkey PRIMARY KEY ("an_id", an_date);
+
+CREATE INDEX idx_asn_country ON data.asn USING btree (a_country_iso2);
+CREATE INDEX idx_asn_date ON data.asn USING btree (a_date);
+CREATE INDEX idx_asn_load_id ON data.asn USING btree (load_id);
+CREATE INDEX idx_asn_ripe_date ON data.asn USING btree (a_ripe_id, a_date DESC);
+CREATE INDEX idx_asn_ripe_id ON data.asn USING btree (a_ripe_id);
+CREATE UNIQUE INDEX uq_asn_country_date_ripe_id ON data.asn USING btree (a_country_iso2, a_date, a_ripe_id);
+CREATE INDEX idx_asn_neighbour_load_id ON data.asn_neighbour USING btree (load_id);
+CREATE UNIQUE INDEX uq_asn_neighbour_asn_date_neighbour ON data.asn_neighbour USING btree (an_asn, an_date, an_neighbour);
+
+CREATE TRIGGER trigger_set_timestamps_asn BEFORE INSERT OR UPDATE ON data.asn FOR EACH ROW EXECUTE FUNCTION data.set_timestamps();
+
+ALTER TABLE data.asn
+    ADD CONSTRAINT asn_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id);
+ALTER TABLE data.asn_neighbour
+    ADD CONSTRAINT asn_neighbour_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id);
+
+CREATE VIEW data.v_asn_count AS
+ SELECT a_date,
+    a_country_iso2,
+    count(a_ripe_id) AS asn_count
+   FROM data.asn
+  GROUP BY a_date, a_country_iso2;
+
+CREATE VIEW data.v_current_asn AS
+ SELECT DISTINCT ON (a_ripe_id) a_ripe_id AS asn_id,
+    a_date AS last_updated,
+    a_country_iso2 AS asn_country
+   FROM data.asn
+  ORDER BY a_ripe_id, a_date DESC;
+
+CREATE MATERIALIZED VIEW data.vm_current_asn AS
+ SELECT asn_id,
+    last_updated,
+    asn_country
+   FROM data.v_current_asn
+  WITH NO DATA;
+
+CREATE VIEW data.v_asn_neighbour AS
+ SELECT n.an_date,
+    n.an_asn,
+    a1.asn_country,
+    n.an_neighbour,
+    COALESCE(a2.asn_country, 'UNKNOWN'::character varying) AS neighbour_country,
+        CASE
+            WHEN ((a1.asn_country)::text <> (COALESCE(a2.asn_country, 'UNKNOWN'::character varying))::text) THEN true
+            ELSE false
+        END AS is_foreign_neighbour,
+    n.an_type,
+    n.an_power,
+    n.an_v4_peers,
+    n.an_v6_peers
+   FROM ((data.asn_neighbour n
+     LEFT JOIN data.vm_current_asn a1 ON ((a1.asn_id = n.an_asn)))
+     LEFT JOIN data.vm_current_asn a2 ON ((a2.asn_id = n.an_neighbour)))
+  WHERE ((n.an_type)::text = ANY (ARRAY[('left'::character varying)::text, ('right'::character varying)::text]));
+
+CREATE VIEW data.v_asn_with_neighbours AS
+ WITH asn_with_neighbours AS (
+         SELECT asn.a_id,
+            asn.a_date,
+            asn.a_country_iso2,
+            (EXISTS ( SELECT 1
+                   FROM data.asn_neighbour
+                  WHERE ((asn_neighbour.an_asn = asn.a_id) AND (asn_neighbour.an_date = asn.a_date)))) AS has_neighbours
+           FROM data.asn
+        )
+ SELECT a_country_iso2,
+    a_date,
+    count(*) AS total_asns,
+    count(has_neighbours) AS asns_with_neighbours,
+    ((count(has_neighbours))::double precision / (count(*))::double precision) AS share_asns_with_neighbours
+   FROM asn_with_neighbours
+  GROUP BY a_country_iso2, a_date;
+
+CREATE VIEW data.v_connectivity_index_by_asn AS
+ SELECT an_asn,
+    an_date,
+    asn_country,
+    sum(
+        CASE
+            WHEN is_foreign_neighbour THEN 1
+            ELSE 0
+        END) AS foreign_neighbour_count,
+    sum(
+        CASE
+            WHEN (NOT is_foreign_neighbour) THEN 1
+            ELSE 0
+        END) AS local_neighbour_count,
+    count(*) AS total_neighbour_count,
+    ((sum(
+        CASE
+            WHEN is_foreign_neighbour THEN 1
+            ELSE 0
+        END))::double precision / (count(*))::double precision) AS foreign_neighbours_share
+   FROM data.v_asn_neighbour
+  WHERE (asn_country IS NOT NULL)
+  GROUP BY an_asn, an_date, asn_country;
+
+CREATE VIEW data.v_connectivity_index_by_asn_top10 AS
+ SELECT an_asn,
+    an_date,
+    asn_country,
+    foreign_neighbour_count,
+    local_neighbour_count,
+    total_neighbour_count,
+    foreign_neighbours_share,
+    rn
+   FROM ( SELECT v_connectivity_index_by_asn.an_asn,
+            v_connectivity_index_by_asn.an_date,
+            v_connectivity_index_by_asn.asn_country,
+            v_connectivity_index_by_asn.foreign_neighbour_count,
+            v_connectivity_index_by_asn.local_neighbour_count,
+            v_connectivity_index_by_asn.total_neighbour_count,
+            v_connectivity_index_by_asn.foreign_neighbours_share,
+            row_number() OVER (PARTITION BY v_connectivity_index_by_asn.asn_country, v_connectivity_index_by_asn.an_date ORDER BY v_connectivity_index_by_asn.total_neighbour_count DESC) AS rn
+           FROM data.v_connectivity_index_by_asn) sub
+  WHERE (rn <= 10);
+
+CREATE VIEW data.v_connectivity_index_by_country AS
+ SELECT asn_country,
+    an_date AS date,
+    count(DISTINCT an_asn) AS asn_count,
+    sum(
+        CASE
+            WHEN is_foreign_neighbour THEN 1
+            ELSE 0
+        END) AS foreign_neighbour_count,
+    sum(
+        CASE
+            WHEN (NOT is_foreign_neighbour) THEN 1
+            ELSE 0
+        END) AS local_neighbour_count,
+    count(*) AS total_neighbour_count,
+    ((sum(
+        CASE
+            WHEN is_foreign_neighbour THEN 1
+            ELSE 0
+        END))::double precision / (count(*))::double precision) AS foreign_neighbours_share
+   FROM data.v_asn_neighbour
+  WHERE (asn_country IS NOT NULL)
+  GROUP BY asn_country, an_date;
+
+CREATE VIEW data.v_data_overview AS
+ WITH date_range AS (
+         SELECT date_trunc('day'::text, min(asn.a_date)) AS start_date,
+            date_trunc('day'::text, max(asn.a_date)) AS end_date
+           FROM data.asn
+        ), dates AS (
+         SELECT generate_series(date_range.start_date, date_range.end_date, '1 day'::interval) AS date
+           FROM date_range
+        ), countries AS (
+         SELECT DISTINCT asn.a_country_iso2 AS country_iso2
+           FROM data.asn
+        )
+ SELECT d.date,
+    c.country_iso2,
+        CASE
+            WHEN (a.cnt > 0) THEN true
+            ELSE false
+        END AS has_asn_records,
+        CASE
+            WHEN (n.cnt > 0) THEN true
+            ELSE false
+        END AS has_neighbour_records,
+        CASE
+            WHEN (q.cnt > 0) THEN true
+            ELSE false
+        END AS has_quality_records,
+        CASE
+            WHEN (cs.cnt > 0) THEN true
+            ELSE false
+        END AS has_country_stat_records,
+        CASE
+            WHEN (ct.cnt > 0) THEN true
+            ELSE false
+        END AS has_country_traffic_records
+   FROM ((((((dates d
+     CROSS JOIN countries c)
+     LEFT JOIN ( SELECT asn.a_date,
+            count(*) AS cnt
+           FROM data.asn
+          GROUP BY asn.a_date) a ON ((d.date = a.a_date)))
+     LEFT JOIN ( SELECT asn_neighbour.an_date,
+            count(*) AS cnt
+           FROM data.asn_neighbour
+          GROUP BY asn_neighbour.an_date) n ON ((d.date = n.an_date)))
+     LEFT JOIN ( SELECT country_internet_quality.ci_date,
+            country_internet_quality.ci_country_iso2,
+            count(*) AS cnt
+           FROM data.country_internet_quality
+          GROUP BY country_internet_quality.ci_date, country_internet_quality.ci_country_iso2) q ON (((d.date = q.ci_date) AND ((c.country_iso2)::text = (q.ci_country_iso2)::text))))
+     LEFT JOIN ( SELECT (country_stat.cs_stats_timestamp)::date AS cs_stats_timestamp,
+            country_stat.cs_country_iso2,
+            count(*) AS cnt
+           FROM data.country_stat
+          GROUP BY ((country_stat.cs_stats_timestamp)::date), country_stat.cs_country_iso2) cs ON (((d.date = cs.cs_stats_timestamp) AND ((c.country_iso2)::text = (cs.cs_country_iso2)::text))))
+     LEFT JOIN ( SELECT country_traffic.cr_date,
+            country_traffic.cr_country_iso2,
+            count(*) AS cnt
+           FROM data.country_traffic
+          GROUP BY country_traffic.cr_date, country_traffic.cr_country_iso2) ct ON (((d.date = ct.cr_date) AND ((c.country_iso2)::text = (ct.cr_country_iso2)::text))))
+  ORDER BY d.date, c.country_iso2;
+
+CREATE VIEW data.v_neighbours_by_country AS
+ SELECT asn_country,
+    neighbour_country,
+    count(*) AS neighbours_count
+   FROM data.v_asn_neighbour
+  GROUP BY asn_country, neighbour_country;
+
+CREATE MATERIALIZED VIEW data.vm_asn_neighbour AS
+ SELECT an_date,
+    an_asn,
+    asn_country,
+    an_neighbour,
+    neighbour_country,
+    is_foreign_neighbour,
+    an_type,
+    an_power,
+    an_v4_peers,
+    an_v6_peers
+   FROM data.v_asn_neighbour
+  WITH NO DATA;
+
+CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10 AS
+ SELECT an_asn,
+    an_date,
+    asn_country,
+    foreign_neighbour_count,
+    local_neighbour_count,
+    total_neighbour_count,
+    foreign_neighbours_share,
+    rn
+   FROM data.v_connectivity_index_by_asn_top10
+  WITH NO DATA;
+
+CREATE MATERIALIZED VIEW data.vm_connectivity_index_by_country AS
+ SELECT asn_country,
+    date,
+    asn_count,
+    foreign_neighbour_count,
+    local_neighbour_count,
+    total_neighbour_count,
+    foreign_neighbours_share
+   FROM data.v_connectivity_index_by_country
+  WITH NO DATA;
+
+GRANT SELECT ON TABLE data.asn TO looker_user;
+GRANT SELECT ON TABLE data.v_asn_count TO looker_user;
+GRANT SELECT ON TABLE data.v_connectivity_index_by_asn TO looker_user;
+GRANT SELECT ON TABLE data.v_connectivity_index_by_asn_top10 TO looker_user;
+GRANT ALL ON TABLE data.vm_connectivity_index_by_country TO looker_user;
+
+COMMIT;
+
+ANALYZE data.asn;
+ANALYZE data.asn_neighbour;
+
+REFRESH MATERIALIZED VIEW data.vm_current_asn;
+REFRESH MATERIALIZED VIEW data.vm_asn_neighbour;
+REFRESH MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10;
+REFRESH MATERIALIZED VIEW data.vm_connectivity_index_by_country;
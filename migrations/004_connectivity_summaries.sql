@@ -0,0 +1,150 @@
+-- Connectivity index summary tables, refreshed per date instead of by full REFRESH.
+--
+-- data.connectivity_index_by_asn and data.connectivity_index_by_country hold
+-- what the vm_connectivity_index_by_asn_top10 and
+-- vm_connectivity_index_by_country materialized views computed, keyed by
+-- country and date. After a load the ETL calls
+-- data.refresh_connectivity_index() with the dates it wrote neighbours for
+-- and the countries of those ASNs, so only those (country, date) pairs are
+-- recomputed. Loads refreshing the same pair wait for each other on an
+-- advisory lock. Each call also refreshes vm_current_asn, which gives every
+-- ASN its country.
+-- The two materialized views are replaced by plain views with the same
+-- names and columns over the summary tables.
+--
+-- The summary tables are filled for all existing dates at the end, which
+-- takes about as long as refreshing the old materialized views once.
+--
+-- Usage: psql -d ozi_db2 -f migrations/004_connectivity_summaries.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE TABLE data.connectivity_index_by_asn (
+    an_asn bigint NOT NULL,
+    an_date timestamp without time zone NOT NULL,
+    asn_country character varying(2) NOT NULL,
+    foreign_neighbour_count bigint NOT NULL,
+    local_neighbour_count bigint NOT NULL,
+    total_neighbour_count bigint NOT NULL,
+    foreign_neighbours_share double precision NOT NULL,
+    rn bigint NOT NULL
+);
+
+ALTER TABLE data.connectivity_index_by_asn
+    ADD CONSTRAINT connectivity_index_by_asn_pkey PRIMARY KEY (an_date, an_asn);
+
+CREATE INDEX idx_connectivity_index_by_asn_country_date
+    ON data.connectivity_index_by_asn USING btree (asn_country, an_date, rn);
+
+CREATE TABLE data.connectivity_index_by_country (
+    asn_country character varying(2) NOT NULL,
+    date timestamp without time zone NOT NULL,
+    asn_count bigint NOT NULL,
+    foreign_neighbour_count bigint NOT NULL,
+    local_neighbour_count bigint NOT NULL,
+    total_neighbour_count bigint NOT NULL,
+    foreign_neighbours_share double precision NOT NULL
+);
+
+ALTER TABLE data.connectivity_index_by_country
+    ADD CONSTRAINT connectivity_index_by_country_pkey PRIMARY KEY (asn_country, date);
+
+CREATE INDEX idx_connectivity_index_by_country_date ON data.connectivity_index_by_country USING btree (date);
+
+CREATE OR REPLACE FUNCTION data.refresh_connectivity_index(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, date) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || d::text) FROM unnest(countries) AS c, unnest(dates) AS d ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_connectivity_index'), lock_key);
+    END LOOP;
+
+    -- v_asn_neighbour takes the country of each ASN from vm_current_asn, which ASN loads leave stale
+    REFRESH MATERIALIZED VIEW data.vm_current_asn;
+
+    DELETE FROM data.connectivity_index_by_asn WHERE an_date = ANY (dates) AND asn_country = ANY (countries);
+    -- An ASN that moved here from a country not refreshed now still has its row under the old country
+    INSERT INTO data.connectivity_index_by_asn (
+        an_asn, an_date, asn_country, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share, rn
+    )
+    SELECT an_asn,
+        an_date,
+        asn_country,
+        foreign_neighbour_count,
+        local_neighbour_count,
+        total_neighbour_count,
+        foreign_neighbours_share,
+        row_number() OVER (PARTITION BY asn_country, an_date ORDER BY total_neighbour_count DESC)
+      FROM data.v_connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+    ON CONFLICT (an_date, an_asn) DO UPDATE
+       SET asn_country = EXCLUDED.asn_country,
+           foreign_neighbour_count = EXCLUDED.foreign_neighbour_count,
+           local_neighbour_count = EXCLUDED.local_neighbour_count,
+           total_neighbour_count = EXCLUDED.total_neighbour_count,
+           foreign_neighbours_share = EXCLUDED.foreign_neighbours_share,
+           rn = EXCLUDED.rn;
+
+    -- Country totals are added up from the ASN rows instead of scanning the neighbours again
+    DELETE FROM data.connectivity_index_by_country WHERE date = ANY (dates) AND asn_country = ANY (countries);
+    INSERT INTO data.connectivity_index_by_country (
+        asn_country, date, asn_count, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share
+    )
+    SELECT asn_country,
+        an_date,
+        count(*),
+        sum(foreign_neighbour_count),
+        sum(local_neighbour_count),
+        sum(total_neighbour_count),
+        (sum(foreign_neighbour_count))::double precision / (sum(total_neighbour_count))::double precision
+      FROM data.connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+     GROUP BY asn_country, an_date;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+DROP MATERIALIZED VIEW data.vm_connectivity_index_by_asn_top10;
+DROP MATERIALIZED VIEW data.vm_connectivity_index_by_country;
+
+CREATE VIEW data.vm_connectivity_index_by_asn_top10 AS
+ SELECT an_asn,
+    an_date,
+    asn_country,
+    foreign_neighbour_count,
+    local_neighbour_count,
+    total_neighbour_count,
+    foreign_neighbours_share,
+    rn
+   FROM data.connectivity_index_by_asn
+  WHERE (rn <= 10);
+
+CREATE VIEW data.vm_connectivity_index_by_country AS
+ SELECT asn_country,
+    date,
+    asn_count,
+    foreign_neighbour_count,
+    local_neighbour_count,
+    total_neighbour_count,
+    foreign_neighbours_share
+   FROM data.connectivity_index_by_country;
+
+GRANT SELECT ON TABLE data.connectivity_index_by_asn TO looker_user;
+GRANT SELECT ON TABLE data.connectivity_index_by_country TO looker_user;
+GRANT ALL ON TABLE data.vm_connectivity_index_by_country TO looker_user;
+
+SELECT data.refresh_connectivity_index(
+    ARRAY(SELECT DISTINCT an_date FROM data.asn_neighbour), ARRAY(SELECT DISTINCT a_country_iso2 FROM data.asn)
+);
+
+COMMIT;
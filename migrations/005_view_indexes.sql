@@ -0,0 +1,121 @@
+-- Indexes and view rewrites for the analytic views.
+--
+-- v_asn_with_neighbours looked neighbours up by the surrogate a_id instead
+-- of the ASN number, so no index could help and the result was wrong, and it
+-- counted every ASN as having neighbours. It now probes
+-- uq_asn_neighbour_asn_date_neighbour, whose (an_asn, an_date) prefix
+-- serves that lookup.
+-- v_country_stat_last reads the latest 1d row of each country with one
+-- backward scan of uq_country_stat_country_resolution_timestamp instead of
+-- aggregating the whole table.
+-- v_data_overview answers every (date, country) cell with index probes
+-- instead of grouping five full tables, and finds its countries with a
+-- skip scan over idx_asn_country. has_asn_records is now per country, like
+-- the other columns; it used to be true for every country on a date any
+-- country had ASNs for.
+--
+-- etl/check_view_plans.py checks that these views keep using the indexes.
+--
+-- Usage: psql -d ozi_db2 -f migrations/005_view_indexes.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_asn_neighbour_date ON data.asn_neighbour USING btree (an_date);
+CREATE INDEX IF NOT EXISTS idx_country_stat_country_timestamp
+    ON data.country_stat USING btree (cs_country_iso2, cs_stats_timestamp);
+
+CREATE OR REPLACE VIEW data.v_asn_with_neighbours AS
+ WITH asn_with_neighbours AS (
+         SELECT asn.a_date,
+            asn.a_country_iso2,
+            (EXISTS ( SELECT 1
+                   FROM data.asn_neighbour
+                  WHERE ((asn_neighbour.an_asn = asn.a_ripe_id) AND (asn_neighbour.an_date = asn.a_date)))) AS has_neighbours
+           FROM data.asn
+        )
+ SELECT a_country_iso2,
+    a_date,
+    count(*) AS total_asns,
+    count(*) FILTER (WHERE has_neighbours) AS asns_with_neighbours,
+    ((count(*) FILTER (WHERE has_neighbours))::double precision / (count(*))::double precision) AS share_asns_with_neighbours
+   FROM asn_with_neighbours
+  GROUP BY a_country_iso2, a_date;
+
+CREATE OR REPLACE VIEW data.v_country_stat_last AS
+ SELECT country.c_name,
+    last_stat.created,
+    last_stat.updated,
+    last_stat.cs_id,
+    last_stat.cs_country_iso2,
+    last_stat.cs_stats_timestamp,
+    last_stat.cs_stats_resolution,
+    last_stat.cs_v4_prefixes_ris,
+    last_stat.cs_v6_prefixes_ris,
+    last_stat.cs_asns_ris,
+    last_stat.cs_v4_prefixes_stats,
+    last_stat.cs_v6_prefixes_stats,
+    last_stat.cs_asns_stats
+   FROM (data.country
+     CROSS JOIN LATERAL ( SELECT country_stat.created,
+            country_stat.updated,
+            country_stat.cs_id,
+            country_stat.cs_country_iso2,
+            country_stat.cs_stats_timestamp,
+            country_stat.cs_stats_resolution,
+            country_stat.cs_v4_prefixes_ris,
+            country_stat.cs_v6_prefixes_ris,
+            country_stat.cs_asns_ris,
+            country_stat.cs_v4_prefixes_stats,
+            country_stat.cs_v6_prefixes_stats,
+            country_stat.cs_asns_stats
+           FROM data.country_stat
+          WHERE (((country_stat.cs_country_iso2)::text = (country.c_iso2)::text) AND ((country_stat.cs_stats_resolution)::text = '1d'::text))
+          ORDER BY country_stat.cs_stats_timestamp DESC
+         LIMIT 1) last_stat);
+
+CREATE OR REPLACE VIEW data.v_data_overview AS
+ WITH RECURSIVE date_range AS (
+         SELECT date_trunc('day'::text, min(asn.a_date)) AS start_date,
+            date_trunc('day'::text, max(asn.a_date)) AS end_date
+           FROM data.asn
+        ), dates AS (
+         SELECT generate_series(date_range.start_date, date_range.end_date, '1 day'::interval) AS date
+           FROM date_range
+        ), countries AS (
+         SELECT min((asn.a_country_iso2)::text) AS country_iso2
+           FROM data.asn
+        UNION ALL
+         SELECT ( SELECT min((asn.a_country_iso2)::text) AS min
+                   FROM data.asn
+                  WHERE ((asn.a_country_iso2)::text > countries_1.country_iso2)) AS country_iso2
+           FROM countries countries_1
+          WHERE (countries_1.country_iso2 IS NOT NULL)
+        )
+ SELECT d.date,
+    (c.country_iso2)::character varying(2) AS country_iso2,
+    (EXISTS ( SELECT 1
+           FROM data.asn
+          WHERE (((asn.a_country_iso2)::text = c.country_iso2) AND (asn.a_date = d.date)))) AS has_asn_records,
+    (EXISTS ( SELECT 1
+           FROM data.asn_neighbour
+          WHERE (asn_neighbour.an_date = d.date))) AS has_neighbour_records,
+    (EXISTS ( SELECT 1
+           FROM data.country_internet_quality
+          WHERE (((country_internet_quality.ci_country_iso2)::text = c.country_iso2) AND (country_internet_quality.ci_date = d.date)))) AS has_quality_records,
+    (EXISTS ( SELECT 1
+           FROM data.country_stat
+          WHERE (((country_stat.cs_country_iso2)::text = c.country_iso2) AND (country_stat.cs_stats_timestamp >= d.date) AND (country_stat.cs_stats_timestamp < (d.date + '1 day'::interval))))) AS has_country_stat_records,
+    (EXISTS ( SELECT 1
+           FROM data.country_traffic
+          WHERE (((country_traffic.cr_country_iso2)::text = c.country_iso2) AND (country_traffic.cr_date = d.date)))) AS has_country_traffic_records
+   FROM (dates d
+     CROSS JOIN countries c)
+  WHERE (c.country_iso2 IS NOT NULL)
+  ORDER BY d.date, c.country_iso2;
+
+COMMIT;
+
+ANALYZE data.asn_neighbour;
+ANALYZE data.country_stat;
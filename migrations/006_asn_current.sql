@@ -0,0 +1,133 @@
+-- Maintained ASN-to-country dimension instead of DISTINCT ON over data.asn.
+--
+-- data.asn_current holds one row per ASN: the country of its newest data.asn
+-- row, as a data.country id, and that row's date. The ETL upserts it after
+-- every ASN load, so it never needs a refresh. v_current_asn now reads it,
+-- and v_asn_neighbour looks both ends of each neighbour pair up by primary
+-- key instead of joining vm_current_asn, which is dropped.
+--
+-- ASNs registered in a country missing from data.country are left out, the
+-- neighbour views show them as 'UNKNOWN' like ASNs never seen in data.asn.
+--
+-- Usage: psql -d ozi_db2 -f migrations/006_asn_current.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_country_iso2 ON data.country USING btree (c_iso2);
+
+CREATE TABLE data.asn_current (
+    ac_asn integer NOT NULL,
+    ac_country_id smallint NOT NULL,
+    ac_date timestamp without time zone NOT NULL
+);
+
+ALTER TABLE data.asn_current
+    ADD CONSTRAINT asn_current_pkey PRIMARY KEY (ac_asn);
+
+ALTER TABLE data.asn_current
+    ADD CONSTRAINT asn_current_ac_country_id_fkey FOREIGN KEY (ac_country_id) REFERENCES data.country(c_id);
+
+-- The connectivity index is refreshed per country, starting from that country's ASNs
+CREATE INDEX idx_asn_current_country ON data.asn_current USING btree (ac_country_id);
+
+INSERT INTO data.asn_current (ac_asn, ac_country_id, ac_date)
+SELECT DISTINCT ON (a.a_ripe_id) a.a_ripe_id, c.c_id, a.a_date
+  FROM data.asn a
+  JOIN data.country c ON c.c_iso2 = a.a_country_iso2
+ ORDER BY a.a_ripe_id, a.a_date DESC;
+
+CREATE OR REPLACE VIEW data.v_current_asn AS
+ SELECT ac.ac_asn AS asn_id,
+    ac.ac_date AS last_updated,
+    country.c_iso2 AS asn_country
+   FROM (data.asn_current ac
+     JOIN data.country ON ((country.c_id = ac.ac_country_id)));
+
+CREATE OR REPLACE VIEW data.v_asn_neighbour AS
+ SELECT n.an_date,
+    n.an_asn,
+    c1.c_iso2 AS asn_country,
+    n.an_neighbour,
+    COALESCE(c2.c_iso2, 'UNKNOWN'::character varying) AS neighbour_country,
+        CASE
+            WHEN ((c1.c_iso2)::text <> (COALESCE(c2.c_iso2, 'UNKNOWN'::character varying))::text) THEN true
+            ELSE false
+        END AS is_foreign_neighbour,
+    n.an_type,
+    n.an_power,
+    n.an_v4_peers,
+    n.an_v6_peers
+   FROM ((((data.asn_neighbour n
+     LEFT JOIN data.asn_current a1 ON ((a1.ac_asn = n.an_asn)))
+     LEFT JOIN data.country c1 ON ((c1.c_id = a1.ac_country_id)))
+     LEFT JOIN data.asn_current a2 ON ((a2.ac_asn = n.an_neighbour)))
+     LEFT JOIN data.country c2 ON ((c2.c_id = a2.ac_country_id)))
+  WHERE ((n.an_type)::text = ANY (ARRAY[('left'::character varying)::text, ('right'::character varying)::text]));
+
+DROP MATERIALIZED VIEW data.vm_current_asn;
+
+CREATE OR REPLACE FUNCTION data.refresh_connectivity_index(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, date) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || d::text) FROM unnest(countries) AS c, unnest(dates) AS d ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_connectivity_index'), lock_key);
+    END LOOP;
+
+    DELETE FROM data.connectivity_index_by_asn WHERE an_date = ANY (dates) AND asn_country = ANY (countries);
+    -- An ASN that moved here from a country not refreshed now still has its row under the old country
+    INSERT INTO data.connectivity_index_by_asn (
+        an_asn, an_date, asn_country, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share, rn
+    )
+    SELECT an_asn,
+        an_date,
+        asn_country,
+        foreign_neighbour_count,
+        local_neighbour_count,
+        total_neighbour_count,
+        foreign_neighbours_share,
+        row_number() OVER (PARTITION BY asn_country, an_date ORDER BY total_neighbour_count DESC)
+      FROM data.v_connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+    ON CONFLICT (an_date, an_asn) DO UPDATE
+       SET asn_country = EXCLUDED.asn_country,
+           foreign_neighbour_count = EXCLUDED.foreign_neighbour_count,
+           local_neighbour_count = EXCLUDED.local_neighbour_count,
+           total_neighbour_count = EXCLUDED.total_neighbour_count,
+           foreign_neighbours_share = EXCLUDED.foreign_neighbours_share,
+           rn = EXCLUDED.rn;
+
+    -- Country totals are added up from the ASN rows instead of scanning the neighbours again
+    DELETE FROM data.connectivity_index_by_country WHERE date = ANY (dates) AND asn_country = ANY (countries);
+    INSERT INTO data.connectivity_index_by_country (
+        asn_country, date, asn_count, foreign_neighbour_count, local_neighbour_count, total_neighbour_count,
+        foreign_neighbours_share
+    )
+    SELECT asn_country,
+        an_date,
+        count(*),
+        sum(foreign_neighbour_count),
+        sum(local_neighbour_count),
+        sum(total_neighbour_count),
+        (sum(foreign_neighbour_count))::double precision / (sum(total_neighbour_count))::double precision
+      FROM data.connectivity_index_by_asn
+     WHERE an_date = ANY (dates) AND asn_country = ANY (countries)
+     GROUP BY asn_country, an_date;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+GRANT SELECT ON TABLE data.asn_current TO looker_user;
+
+COMMIT;
+
+ANALYZE data.asn_current;
@@ -0,0 +1,217 @@
+-- Weekly and monthly rollups of country_stat, country_traffic and country_internet_quality.
+--
+-- The rollup tables hold the average of each country per week and per month,
+-- keyed by (period, country, first day of the period). After a load the ETL
+-- calls the refresh_*_rollups() function of every table it wrote rows to,
+-- with the loaded dates and countries, and only the weeks and months of
+-- those countries containing those dates are recomputed, under an advisory
+-- lock per (country, period). country_stat is rolled up from its 1d rows only.
+--
+-- Reports read the rollups instead of grouping the raw rows per country:
+-- etl/export_rollups.py writes the files of all countries from one query.
+--
+-- The rollup tables are filled for all existing dates at the end.
+--
+-- Usage: psql -d ozi_db2 -f migrations/007_country_rollups.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_country_stat_timestamp ON data.country_stat USING btree (cs_stats_timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_country_traffic_date ON data.country_traffic USING btree (cr_date);
+
+CREATE INDEX IF NOT EXISTS idx_country_internet_quality_date ON data.country_internet_quality USING btree (ci_date);
+
+CREATE TABLE data.country_stat_rollup (
+    csr_period character varying(5) NOT NULL,
+    csr_country_iso2 character varying(2) NOT NULL,
+    csr_date timestamp without time zone NOT NULL,
+    csr_days integer NOT NULL,
+    csr_v4_prefixes_ris numeric,
+    csr_v6_prefixes_ris numeric,
+    csr_asns_ris numeric,
+    csr_v4_prefixes_stats numeric,
+    csr_v6_prefixes_stats numeric,
+    csr_asns_stats numeric
+);
+
+ALTER TABLE data.country_stat_rollup
+    ADD CONSTRAINT country_stat_rollup_pkey PRIMARY KEY (csr_period, csr_country_iso2, csr_date);
+
+CREATE TABLE data.country_traffic_rollup (
+    crr_period character varying(5) NOT NULL,
+    crr_country_iso2 character varying(2) NOT NULL,
+    crr_date timestamp without time zone NOT NULL,
+    crr_samples integer NOT NULL,
+    crr_traffic_avg numeric,
+    crr_traffic_min numeric,
+    crr_traffic_max numeric
+);
+
+ALTER TABLE data.country_traffic_rollup
+    ADD CONSTRAINT country_traffic_rollup_pkey PRIMARY KEY (crr_period, crr_country_iso2, crr_date);
+
+CREATE TABLE data.country_internet_quality_rollup (
+    cir_period character varying(5) NOT NULL,
+    cir_country_iso2 character varying(2) NOT NULL,
+    cir_date timestamp without time zone NOT NULL,
+    cir_samples integer NOT NULL,
+    cir_p75 numeric,
+    cir_p50 numeric,
+    cir_p25 numeric
+);
+
+ALTER TABLE data.country_internet_quality_rollup
+    ADD CONSTRAINT country_internet_quality_rollup_pkey PRIMARY KEY (cir_period, cir_country_iso2, cir_date);
+
+CREATE OR REPLACE FUNCTION data.refresh_country_stat_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_stat_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_stat_rollup WHERE csr_period = rollup_period AND csr_date = ANY (starts)
+           AND csr_country_iso2 = ANY (countries);
+        INSERT INTO data.country_stat_rollup (
+            csr_period, csr_country_iso2, csr_date, csr_days,
+            csr_v4_prefixes_ris, csr_v6_prefixes_ris, csr_asns_ris, csr_v4_prefixes_stats, csr_v6_prefixes_stats, csr_asns_stats
+        )
+        SELECT rollup_period,
+            cs_country_iso2,
+            p.start,
+            count(*),
+            avg(cs_v4_prefixes_ris),
+            avg(cs_v6_prefixes_ris),
+            avg(cs_asns_ris),
+            avg(cs_v4_prefixes_stats),
+            avg(cs_v6_prefixes_stats),
+            avg(cs_asns_stats)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_stat
+            ON cs_stats_timestamp >= p.start AND cs_stats_timestamp < p.start + ('1 ' || rollup_period)::interval
+         WHERE cs_stats_resolution = '1d' AND cs_country_iso2 = ANY (countries)
+         GROUP BY cs_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION data.refresh_country_traffic_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_traffic_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_traffic_rollup WHERE crr_period = rollup_period AND crr_date = ANY (starts)
+           AND crr_country_iso2 = ANY (countries);
+        INSERT INTO data.country_traffic_rollup (
+            crr_period, crr_country_iso2, crr_date, crr_samples,
+            crr_traffic_avg, crr_traffic_min, crr_traffic_max
+        )
+        SELECT rollup_period,
+            cr_country_iso2,
+            p.start,
+            count(*),
+            avg(cr_traffic),
+            min(cr_traffic),
+            max(cr_traffic)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_traffic
+            ON cr_date >= p.start AND cr_date < p.start + ('1 ' || rollup_period)::interval
+         WHERE cr_country_iso2 = ANY (countries)
+         GROUP BY cr_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION data.refresh_country_internet_quality_rollups(dates timestamp without time zone[], countries character varying[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    rollup_period text;
+    starts timestamp without time zone[];
+    lock_key integer;
+BEGIN
+    -- Concurrent loads refreshing the same (country, period) wait for each other; sorted keys avoid deadlocks
+    FOR lock_key IN
+        SELECT DISTINCT hashtext(c || ' ' || date_trunc(p, d)::text || ' ' || p)
+          FROM unnest(countries) AS c, unnest(dates) AS d, unnest(ARRAY['week', 'month']) AS p
+         ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('data.refresh_country_internet_quality_rollups'), lock_key);
+    END LOOP;
+
+    FOREACH rollup_period IN ARRAY ARRAY['week', 'month'] LOOP
+        starts := ARRAY(SELECT DISTINCT date_trunc(rollup_period, d) FROM unnest(dates) AS d);
+        DELETE FROM data.country_internet_quality_rollup WHERE cir_period = rollup_period AND cir_date = ANY (starts)
+           AND cir_country_iso2 = ANY (countries);
+        INSERT INTO data.country_internet_quality_rollup (
+            cir_period, cir_country_iso2, cir_date, cir_samples, cir_p75, cir_p50, cir_p25
+        )
+        SELECT rollup_period,
+            ci_country_iso2,
+            p.start,
+            count(*),
+            avg(ci_p75),
+            avg(ci_p50),
+            avg(ci_p25)
+          FROM unnest(starts) AS p(start)
+          JOIN data.country_internet_quality
+            ON ci_date >= p.start AND ci_date < p.start + ('1 ' || rollup_period)::interval
+         WHERE ci_country_iso2 = ANY (countries)
+         GROUP BY ci_country_iso2, p.start;
+    END LOOP;
+
+    RETURN cardinality(dates);
+END;
+$$;
+
+GRANT SELECT ON TABLE data.country_stat_rollup TO looker_user;
+GRANT SELECT ON TABLE data.country_traffic_rollup TO looker_user;
+GRANT SELECT ON TABLE data.country_internet_quality_rollup TO looker_user;
+
+SELECT data.refresh_country_stat_rollups(
+    ARRAY(SELECT DISTINCT date_trunc('day', cs_stats_timestamp) FROM data.country_stat),
+    ARRAY(SELECT DISTINCT cs_country_iso2 FROM data.country_stat)
+);
+SELECT data.refresh_country_traffic_rollups(
+    ARRAY(SELECT DISTINCT date_trunc('day', cr_date) FROM data.country_traffic),
+    ARRAY(SELECT DISTINCT cr_country_iso2 FROM data.country_traffic)
+);
+SELECT data.refresh_country_internet_quality_rollups(
+    ARRAY(SELECT DISTINCT date_trunc('day', ci_date) FROM data.country_internet_quality),
+    ARRAY(SELECT DISTINCT ci_country_iso2 FROM data.country_internet_quality)
+);
+
+COMMIT;
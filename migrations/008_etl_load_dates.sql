@@ -0,0 +1,49 @@
+-- Per-date completion markers for --skip-loaded.
+--
+-- --skip-loaded used to treat a (country, date) as loaded as soon as one row
+-- existed. Rows are committed batch by batch, so a run that crashed halfway
+-- through a date left it partial, and it was then skipped forever. main.py
+-- now records every (task, country, date) it finished without failed
+-- requests in data.etl_load_date, and --skip-loaded only skips those.
+-- Rolling a load back removes its markers with it (ON DELETE CASCADE).
+--
+-- The markers are filled from the rows already stored, which is what
+-- --skip-loaded assumed so far. Delete the markers of dates you suspect to
+-- be partial to have them fetched again.
+--
+-- Usage: psql -d ozi_db2 -f migrations/008_etl_load_dates.sql
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE TABLE data.etl_load_date (
+    ld_task character varying(32) NOT NULL,
+    ld_country_iso2 character varying(2) NOT NULL,
+    ld_date timestamp without time zone NOT NULL,
+    load_id integer
+);
+
+ALTER TABLE data.etl_load_date
+    ADD CONSTRAINT etl_load_date_pkey PRIMARY KEY (ld_task, ld_country_iso2, ld_date);
+
+ALTER TABLE data.etl_load_date
+    ADD CONSTRAINT etl_load_date_load_id_fkey FOREIGN KEY (load_id) REFERENCES data.etl_load(load_id) ON DELETE CASCADE;
+
+CREATE INDEX idx_etl_load_date_load_id ON data.etl_load_date USING btree (load_id);
+
+INSERT INTO data.etl_load_date (ld_task, ld_country_iso2, ld_date)
+SELECT DISTINCT 'ASNS', a_country_iso2, a_date
+  FROM data.asn;
+
+INSERT INTO data.etl_load_date (ld_task, ld_country_iso2, ld_date)
+SELECT DISTINCT 'ASN_NEIGHBOURS', a.a_country_iso2, a.a_date
+  FROM data.asn a
+ WHERE EXISTS (SELECT 1 FROM data.asn_neighbour n WHERE n.an_asn = a.a_ripe_id AND n.an_date = a.a_date);
+
+INSERT INTO data.etl_load_date (ld_task, ld_country_iso2, ld_date)
+SELECT DISTINCT 'STATS_1D', cs_country_iso2, date_trunc('day', cs_stats_timestamp)
+  FROM data.country_stat
+ WHERE cs_stats_resolution = '1d';
+
+COMMIT;
@@ -5,4 +5,13 @@ SELECT
      pg_size_pretty(pg_total_relation_size(relid) - pg_relation_size(relid)) AS index_size
  FROM pg_catalog.pg_statio_user_tables
  WHERE schemaname = 'data'
- ORDER BY pg_total_relation_size(relid) DESC;
\ No newline at end of file
+ ORDER BY pg_total_relation_size(relid) DESC;
+
+-- Partitioned tables (data.asn, data.asn_neighbour) summed over their partitions
+SELECT
+     i.inhparent::regclass AS table_name,
+     count(*) AS partitions,
+     pg_size_pretty(sum(pg_total_relation_size(i.inhrelid))) AS total_size
+ FROM pg_catalog.pg_inherits i
+ GROUP BY i.inhparent
+ ORDER BY sum(pg_total_relation_size(i.inhrelid)) DESC;